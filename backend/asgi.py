@@ -0,0 +1,267 @@
+"""
+Asyncio-native serving mode for the insights backend.
+
+Exposes the same /generate-insights (including multi-perspective requests)
+and /analysis-types contract as the Flask app in main.py, but awaits the
+Gemini call instead of holding a worker thread for its whole duration.
+Cache lookups, scoring and logging are CPU-bound or blocking, so they run on
+a bounded thread pool. Responses are encoded and compressed like the Flask
+app's (see serialization.py).
+
+Run with:
+    cd backend
+    uvicorn asgi:app --host 0.0.0.0 --port 8000
+"""
+
+import asyncio
+import contextvars
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, Callable, Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+import main
+import metrics
+import serialization
+from metrics import ERRORS, REQUEST_SECONDS, span
+from query_engine import agenerate_insights
+from response_cache import cache_key
+
+# Upper bound on requests waiting on Gemini at once in this process
+MAX_PENDING_LLM_CALLS = int(os.getenv("MAX_PENDING_LLM_CALLS", "2000"))
+
+# Threads used for scoring, cache lookups and logging
+SCORING_THREADS = int(os.getenv("SCORING_THREADS", str(min(32, (os.cpu_count() or 1) + 4))))
+
+_executor = None
+_llm_slots = asyncio.Semaphore(MAX_PENDING_LLM_CALLS)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=SCORING_THREADS, thread_name_prefix="scoring")
+    return _executor
+
+
+async def run_blocking(func: Callable, *args: Any) -> Any:
+    """Run a blocking function on the scoring thread pool."""
+    # Copy the context so stage timings recorded by ``func`` reach this request
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        _get_executor(), partial(context.run, func, *args)
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _executor
+    # Load scikit-learn, the relevance model and the LLM client while the
+    # server starts accepting connections
+    main.start_warmup()
+    yield
+    # Requests still in flight have been drained by the server at this point;
+    # stop cache warming, finish queued scoring work and flush the engagement log.
+    main.cache_warmer.close()
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+    main.log_writer.flush(timeout=10)
+
+
+async def generate_with_slot(query: str, analysis_type: str) -> Dict[str, Any]:
+    """Call Gemini once a pending-call slot is free."""
+    async with _llm_slots:
+        return await agenerate_insights(query, analysis_type)
+
+
+async def answer_perspective(query: str, analysis_type: str, bypass_cache: bool) -> Dict[str, Any]:
+    """One analysis of a multi-perspective request, unscored (see ``main.generate_insights_batch``)."""
+    result = {"query": query, "analysis_type": analysis_type}
+    response, matched_query, stale = await run_blocking(
+        main.lookup_cached_insights, query, analysis_type, bypass_cache
+    )
+    cached = response is not None
+    if not cached:
+        response = await main.single_flight.do_async(
+            cache_key(query, analysis_type),
+            lambda: generate_with_slot(query, analysis_type)
+        )
+        if "error" in response:
+            error = response["error"]
+            if response.get("unavailable"):
+                response, matched_query = await run_blocking(main.stale_insights, query, analysis_type)
+            else:
+                response = None
+            if response is None:
+                return dict(result, status="error", error=error)
+            cached = stale = True
+        else:
+            await run_blocking(main.cache_insights, query, analysis_type, response)
+    return dict(result, status="success", insights=response, cached=cached,
+                matched_query=matched_query, stale=stale)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with the shared fast encoder."""
+
+    def render(self, content: Any) -> bytes:
+        return serialization.dumps(content)
+
+
+app = FastAPI(title="AI Business Insights Assistant", lifespan=lifespan,
+              default_response_class=FastJSONResponse)
+
+
+@app.middleware("http")
+async def compress_response(request: Request, call_next: Callable) -> Response:
+    """Compress large JSON and text bodies with the best coding the client accepts."""
+    response = await call_next(request)
+    content_type = response.headers.get("content-type", "").split(";")[0].strip()
+    if (not main.COMPRESS_RESPONSES or response.status_code < 200 or response.status_code in (204, 304)
+            or "content-encoding" in response.headers
+            or content_type not in serialization.COMPRESSIBLE_TYPES):
+        return response
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    headers = dict(response.headers)
+    headers.pop("content-length", None)
+    if len(body) >= main.COMPRESS_MIN_BYTES:
+        headers["vary"] = "Accept-Encoding"
+        encoding = serialization.negotiate_encoding(request.headers.get("accept-encoding"))
+        if encoding is not None:
+            body = serialization.compress(body, encoding)
+            headers["content-encoding"] = encoding
+    return Response(body, status_code=response.status_code, headers=headers)
+
+
+def timed_response(payload: Dict[str, Any], status_code: int = 200,
+                   analysis_type: str = "") -> JSONResponse:
+    """Record the request latency and add the Server-Timing header if enabled."""
+    response = FastJSONResponse(payload, status_code=status_code)
+    timings = metrics.current_timings()
+    if timings is not None:
+        REQUEST_SECONDS.observe(timings.elapsed(), endpoint="/generate-insights",
+                                analysis_type=analysis_type, status=str(status_code))
+        if main.SERVER_TIMING:
+            response.headers["Server-Timing"] = timings.header()
+    return response
+
+
+def error_response(message: str, status_code: int, analysis_type: str = "",
+                   kind: str = "bad_request") -> JSONResponse:
+    ERRORS.inc(endpoint="/generate-insights", kind=kind)
+    return timed_response({"error": message}, status_code, analysis_type)
+
+
+@app.post("/generate-insights")
+async def get_insights(request: Request):
+    """Handles user queries and returns AI-generated business insights with scores."""
+    metrics.start_request()
+    try:
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        if not data:
+            return error_response("No JSON data provided", 400)
+
+        query = data.get("query", "").strip()
+        if not query:
+            return error_response("No query provided", 400)
+
+        analysis_type = data.get("analysis_type", "general")
+        bypass_cache = bool(data.get("bypass_cache", False))
+        try:
+            analysis_types = main.parse_analysis_types(analysis_type)
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        # Several perspectives of the same query, generated concurrently and
+        # scored and logged together
+        if analysis_types is not None:
+            results = await asyncio.gather(*(
+                answer_perspective(query, analysis_type, bypass_cache) for analysis_type in analysis_types
+            ))
+            await run_blocking(main.score_and_log_results, results, "/generate-insights")
+            payload, status_code = main.multi_analysis_response(query, results)
+            return timed_response(payload, status_code, "multi")
+
+        if analysis_type not in main.ANALYSIS_TYPE_IDS:
+            return error_response("Invalid analysis type", 400)
+
+        # Serve repeated questions from the cache
+        with span("cache", analysis_type):
+            response, matched_query, stale = await run_blocking(
+                main.lookup_cached_insights, query, analysis_type, bypass_cache
+            )
+        cached = response is not None
+
+        if not cached:
+            # Generate AI insights, sharing the call with identical requests in flight
+            with span("generate", analysis_type):
+                response = await main.single_flight.do_async(
+                    cache_key(query, analysis_type),
+                    lambda: generate_with_slot(query, analysis_type)
+                )
+
+            # Check for error in response
+            if "error" in response:
+                if not response.get("unavailable"):
+                    return error_response(response["error"], 500, analysis_type, "llm")
+                # Gemini is unavailable: fall back to an earlier answer if there is one
+                error = response["error"]
+                response, matched_query = await run_blocking(main.stale_insights, query, analysis_type)
+                if response is None:
+                    return error_response(error, 503, analysis_type, "unavailable")
+                cached = stale = True
+            else:
+                await run_blocking(main.cache_insights, query, analysis_type, response)
+
+        brs, rcs = await run_blocking(main.score_and_log, query, response, analysis_type)
+
+        return timed_response({
+            "status": "success",
+            "query": query,
+            "analysis_type": analysis_type,
+            "insights": response,
+            "BRS": brs,
+            "RCS": rcs,
+            "cached": cached,
+            "matched_query": matched_query,
+            "stale": stale
+        }, analysis_type=analysis_type)
+
+    except Exception as e:
+        ERRORS.inc(endpoint="/generate-insights", kind="exception")
+        print(f"Error in get_insights: {str(e)}\n{traceback.format_exc()}")
+        return timed_response({"error": f"An error occurred: {str(e)}"}, 500)
+    finally:
+        metrics.end_request()
+
+
+@app.get("/metrics")
+async def get_metrics() -> Response:
+    """Exposes request, stage, cache, token and error metrics in the Prometheus text format."""
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/analysis-types")
+async def get_analysis_types(request: Request) -> Response:
+    """Returns available analysis types and their descriptions."""
+    body = serialization.dumps({"analysis_types": main.ANALYSIS_TYPES})
+    tag = serialization.etag(body)
+    headers = {"ETag": tag, "Cache-Control": f"public, max-age={main.ANALYSIS_TYPES_MAX_AGE}"}
+    if serialization.etag_matches(request.headers.get("if-none-match"), tag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=8000, timeout_graceful_shutdown=30)
@@ -0,0 +1,8 @@
+"""
+Benchmarks for the insights pipeline.
+
+Run from the ``backend`` directory:
+    python -m benchmarks.micro          # parsing, scoring and logging
+    python -m benchmarks.load           # end-to-end load against the Flask app
+    python -m benchmarks.compare A B    # compare two result files
+"""
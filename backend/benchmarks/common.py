@@ -0,0 +1,141 @@
+"""
+Timing helpers and the JSON result format shared by the benchmarks.
+
+A result file holds the benchmark name, the commit it was measured on, the
+run configuration and one statistics dict per measured case, so runs on two
+commits can be compared with ``python -m benchmarks.compare``.
+"""
+
+import datetime
+import json
+import math
+import os
+import platform
+import subprocess
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Building blocks of the synthetic queries
+TOPICS = [
+    "subscription pricing", "market expansion in Europe", "customer churn", "AI adoption",
+    "supply chain costs", "competitor product launches", "brand awareness", "B2B sales cycles",
+    "remote work tools", "sustainability regulation", "mobile payments", "retail foot traffic",
+]
+QUESTIONS = [
+    "What are the growth opportunities for {}?", "How should we respond to {}?",
+    "Analyze the risks of {}", "What trends are shaping {}?", "How do competitors handle {}?",
+]
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """Return the ``fraction`` percentile of already sorted values (nearest rank)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    """Return count, mean, min, max, p50, p95 and p99 of millisecond samples."""
+    values = sorted(samples_ms)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values), 4),
+        "min_ms": round(values[0], 4),
+        "p50_ms": round(percentile(values, 0.50), 4),
+        "p95_ms": round(percentile(values, 0.95), 4),
+        "p99_ms": round(percentile(values, 0.99), 4),
+        "max_ms": round(values[-1], 4),
+    }
+
+
+def measure(fn: Callable[[], Any], repeat: int = 200, warmup: int = 5,
+            min_time: float = 0.0) -> Dict[str, float]:
+    """
+    Time repeated calls of ``fn``.
+
+    Args:
+        fn (Callable[[], Any]): Function to time
+        repeat (int): Timed calls
+        warmup (int): Untimed calls made first
+        min_time (float): Keep timing beyond ``repeat`` until this many
+            seconds have been spent
+
+    Returns:
+        Dict[str, float]: ``summarize`` of the per-call times
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < repeat or time.perf_counter() - started < min_time:
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return summarize(samples)
+
+
+def git_commit() -> Optional[str]:
+    """Return the abbreviated commit of the working tree, if in a git checkout."""
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, timeout=10, cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.stdout.strip() or None
+
+
+def write_results(benchmark: str, results: Dict[str, Any], config: Dict[str, Any],
+                  path: Optional[str] = None) -> str:
+    """
+    Write a result file.
+
+    Args:
+        benchmark (str): Benchmark name, e.g. 'micro' or 'load'
+        results (Dict[str, Any]): Statistics per measured case
+        config (Dict[str, Any]): Parameters of the run
+        path (Optional[str]): Output file; defaults to
+            ``results/<benchmark>-<commit>-<timestamp>.json``
+
+    Returns:
+        str: The path written
+    """
+    commit = git_commit()
+    now = datetime.datetime.now()
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{benchmark}-{commit or 'nogit'}-{now:%Y%m%d-%H%M%S}.json")
+    document = {
+        "benchmark": benchmark,
+        "commit": commit,
+        "timestamp": now.isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    return path
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def print_table(results: Dict[str, Dict[str, float]]) -> None:
+    """Print one line per case with its latency percentiles."""
+    width = max((len(name) for name in results), default=10)
+    print(f"{'case':<{width}}  {'count':>8}  {'p50 ms':>10}  {'p95 ms':>10}  {'p99 ms':>10}")
+    for name, stats in results.items():
+        if "p50_ms" not in stats:
+            # Single measurement
+            print(f"{name:<{width}}  {stats['count']:>8}  {stats.get('mean_ms', 0):>10.4f}")
+            continue
+        print(f"{name:<{width}}  {stats['count']:>8}  {stats['p50_ms']:>10.4f}  "
+              f"{stats['p95_ms']:>10.4f}  {stats['p99_ms']:>10.4f}")
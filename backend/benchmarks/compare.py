@@ -0,0 +1,59 @@
+"""
+Compare two benchmark result files.
+
+    python -m benchmarks.compare results/micro-abc123-....json results/micro-def456-....json
+
+Prints the change of every case's p50 (mean for single measurements) and
+exits with status 1 when a case got slower than ``--threshold`` (default
+10%), so the command can gate a CI job.
+"""
+
+import argparse
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.common import load_results
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any],
+            threshold: float = 0.10) -> List[Tuple[str, float, float, float, bool]]:
+    """
+    Compare the cases present in both result documents.
+
+    Returns:
+        List[Tuple[str, float, float, float, bool]]: ``(case, baseline p50,
+        current p50, relative change, regressed)`` per case
+    """
+    rows = []
+    for name, old in baseline["results"].items():
+        new = current["results"].get(name)
+        if new is None:
+            continue
+        key = "p50_ms" if "p50_ms" in old and "p50_ms" in new else "mean_ms"
+        if not old.get(key) or key not in new:
+            continue
+        change = (new[key] - old[key]) / old[key]
+        rows.append((name, old[key], new[key], change, change > threshold))
+    return rows
+
+
+def main_cli(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline", help="Result file of the reference commit")
+    parser.add_argument("current", help="Result file to check")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative slowdown counted as a regression")
+    args = parser.parse_args(argv)
+
+    baseline, current = load_results(args.baseline), load_results(args.current)
+    rows = compare(baseline, current, args.threshold)
+    print(f"{baseline.get('commit')} -> {current.get('commit')}")
+    width = max((len(row[0]) for row in rows), default=10)
+    for name, old, new, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<{width}}  {old:>10.4f} -> {new:>10.4f} ms  {change:+7.1%}{flag}")
+    return 1 if any(row[4] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,181 @@
+"""
+End-to-end load generator for POST /generate-insights.
+
+By default the Flask app is served in-process on an ephemeral port with the
+offline fake LLM backend, isolated caches and a temporary engagement log, so
+the numbers cover routing, caching, parsing, scoring and logging. Pass
+``--url`` to load an already running server instead.
+
+    cd backend
+    python -m benchmarks.load --clients 16 --duration 30 --llm-latency-ms 800
+"""
+
+import argparse
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from benchmarks.common import QUESTIONS, TOPICS, print_table, summarize, write_results
+
+ANALYSIS_TYPES = ["general", "competitive", "trend"]
+
+
+def start_local_server(llm_latency_ms: float, llm_error_rate: float):
+    """
+    Serve the Flask app in a background thread with the fake LLM backend.
+
+    Returns:
+        Tuple[str, Callable[[], None]]: Base URL and a function stopping the server
+    """
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_LATENCY_MS"] = str(llm_latency_ms)
+    os.environ["FAKE_LLM_ERROR_RATE"] = str(llm_error_rate)
+    # Background refreshes would add calls the load generator did not make
+    os.environ["CACHE_WARM"] = "false"
+
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    import main
+    from engagement_log import EngagementLog
+    from log_writer import AsyncLogWriter
+    from relevance import RelevanceModel
+    from response_cache import MemoryCache
+    from semantic_cache import SemanticCache
+    from single_flight import SingleFlight
+
+    log_dir = tempfile.mkdtemp(prefix="insights-load-")
+    log = EngagementLog(log_dir)
+    main.CACHE_WARM = False
+    main.engagement_log = log
+    main.log_writer = AsyncLogWriter(log)
+    main.response_cache = MemoryCache()
+    main.semantic_cache = SemanticCache()
+    main.single_flight = SingleFlight()
+    main.relevance_model = RelevanceModel(entries_source=log.iter_entries)
+
+    server = make_server("127.0.0.1", 0, main.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name="load-server", daemon=True)
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        main.log_writer.close()
+        log.close()
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+    return f"http://127.0.0.1:{server.server_port}", stop
+
+
+def make_query(rng: random.Random, repeat_ratio: float, sequence: int) -> Dict[str, Any]:
+    """Return a request body; ``repeat_ratio`` of them reuse a small pool of hot questions."""
+    analysis_type = rng.choice(ANALYSIS_TYPES)
+    if rng.random() < repeat_ratio:
+        query = rng.choice(QUESTIONS).format(rng.choice(TOPICS[:4]))
+    else:
+        query = f"{rng.choice(QUESTIONS).format(rng.choice(TOPICS))} (variant {sequence})"
+    return {"query": query, "analysis_type": analysis_type}
+
+
+def run_load(url: str, clients: int = 8, duration: float = 10.0, max_requests: Optional[int] = None,
+             repeat_ratio: float = 0.3, timeout: float = 60.0, seed: int = 0) -> Dict[str, Any]:
+    """
+    Issue requests from ``clients`` threads until ``duration`` seconds have
+    passed or ``max_requests`` were sent.
+
+    Returns:
+        Dict[str, Any]: Latency percentiles, throughput, status and cache counts
+    """
+    endpoint = url.rstrip("/") + "/generate-insights"
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    cached = [0]
+    sent = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(index: int):
+        rng = random.Random(seed * 1000 + index)
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            with lock:
+                if max_requests is not None and sent[0] >= max_requests:
+                    return
+                sent[0] += 1
+                sequence = sent[0]
+            body = make_query(rng, repeat_ratio, sequence)
+            t0 = time.perf_counter()
+            try:
+                response = session.post(endpoint, json=body, timeout=timeout)
+                status = response.status_code
+                hit = status == 200 and response.json().get("cached", False)
+            except requests.RequestException:
+                status, hit = "connection_error", False
+            elapsed = (time.perf_counter() - t0) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] += 1
+                cached[0] += hit
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    stats = summarize(latencies)
+    stats.update(
+        throughput_rps=round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        errors=sum(count for status, count in statuses.items() if status != "200"),
+        cached=cached[0],
+        statuses=dict(statuses),
+    )
+    return stats
+
+
+def main_cli(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Load test POST /generate-insights")
+    parser.add_argument("--url", help="Target server; default serves the app in-process")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent client threads")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run")
+    parser.add_argument("--requests", type=int, help="Stop after this many requests")
+    parser.add_argument("--repeat-ratio", type=float, default=0.3,
+                        help="Share of requests repeating a hot question (cacheable)")
+    parser.add_argument("--llm-latency-ms", type=float, default=500,
+                        help="Median fake LLM latency (in-process server only)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0,
+                        help="Share of fake LLM calls failing (in-process server only)")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/...)")
+    args = parser.parse_args(argv)
+
+    stop = None
+    url = args.url
+    if url is None:
+        url, stop = start_local_server(args.llm_latency_ms, args.llm_error_rate)
+    try:
+        stats = run_load(url, args.clients, args.duration, args.requests, args.repeat_ratio)
+    finally:
+        if stop is not None:
+            stop()
+
+    results = {"POST /generate-insights": stats}
+    print_table(results)
+    print(f"throughput: {stats['throughput_rps']} req/s, errors: {stats['errors']}, "
+          f"cached: {stats['cached']}")
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    path = write_results("load", results, config, args.output)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,177 @@
+"""
+Micro-benchmarks for parsing, scoring and logging.
+
+Response parsing is measured once per analysis type. Scoring and logging are
+measured against engagement logs of each requested size (10, 10k and 1M
+entries by default), since the relevance model is fitted on the log and
+interactions are appended to it.
+
+    cd backend
+    python -m benchmarks.micro --sizes 10,10000,1000000
+
+The 1M-entry log takes about 1 GB of disk; pass ``--log-dir`` to keep the
+generated logs and reuse them in later runs.
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+
+import main
+from engagement_log import EngagementLog
+from llm_backends import FakeBackend
+from log_writer import AsyncLogWriter
+from query_engine import SECTION_HEADERS, build_prompt, extract_section, format_response
+from relevance import RelevanceModel
+
+from benchmarks.common import QUESTIONS, TOPICS, measure, print_table, write_results
+
+
+def sample_interactions(count: int = 200) -> List[Tuple[str, str, Dict[str, Any], str]]:
+    """Return ``(query, analysis_type, response, raw_text)`` tuples answered by the fake backend."""
+    backend = FakeBackend()
+    types = sorted(SECTION_HEADERS)
+    samples = []
+    for i in range(count):
+        query = QUESTIONS[i % len(QUESTIONS)].format(TOPICS[i % len(TOPICS)])
+        analysis_type = types[i % len(types)]
+        text = backend.answer(build_prompt(f"{query} ({i})", analysis_type))
+        samples.append((query, analysis_type, format_response(text, analysis_type), text))
+    return samples
+
+
+def generate_log(directory: str, size: int, samples: List[Tuple[str, str, Dict[str, Any], str]],
+                 chunk: int = 10000) -> EngagementLog:
+    """Fill an engagement log with ``size`` entries cycling through ``samples``."""
+    log = EngagementLog(directory, fsync="never")
+    written = 0
+    while written < size:
+        entries = []
+        for i in range(written, min(size, written + chunk)):
+            query, analysis_type, response, _ = samples[i % len(samples)]
+            entries.append({"query": query, "response": response, "BRS": 50.0, "RCS": 100,
+                            "analysis_type": analysis_type, "timestamp": "2025-01-01 00:00:00"})
+        written += log.append_many(entries)
+    log.flush()
+    return log
+
+
+def open_log(root: str, size: int, samples) -> EngagementLog:
+    """Reuse the log of this size under ``root`` if complete, otherwise (re)generate it."""
+    directory = os.path.join(root, f"entries-{size}")
+    marker = os.path.join(directory, ".complete")
+    if os.path.exists(marker):
+        return EngagementLog(directory, fsync="never")
+    shutil.rmtree(directory, ignore_errors=True)
+    log = generate_log(directory, size, samples)
+    open(marker, "w").close()
+    return log
+
+
+def bench_parsing(samples, repeat: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for analysis_type in sorted(SECTION_HEADERS):
+        texts = [text for _, t, _, text in samples if t == analysis_type]
+        header = SECTION_HEADERS[analysis_type][1][1]
+        state = {"i": 0}
+
+        def next_text():
+            state["i"] += 1
+            return texts[state["i"] % len(texts)]
+
+        results[f"format_response[{analysis_type}]"] = measure(
+            lambda: format_response(next_text(), analysis_type), repeat)
+        results[f"extract_section[{analysis_type}]"] = measure(
+            lambda: extract_section(next_text(), header), repeat)
+    return results
+
+
+def bench_log_size(log: EngagementLog, size: int, samples, repeat: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+
+    # Fitting the relevance model reads the whole log; timed once
+    model = RelevanceModel()
+    started = time.perf_counter()
+    model.bootstrap(log.iter_entries())
+    results[f"relevance_bootstrap[{size}]"] = {
+        "count": 1, "mean_ms": round((time.perf_counter() - started) * 1000, 4)
+    }
+    main.relevance_model = model
+
+    state = {"i": 0}
+
+    def next_sample():
+        state["i"] += 1
+        return samples[state["i"] % len(samples)]
+
+    def brs():
+        query, _, response, _ = next_sample()
+        main.calculate_business_relevance(query, response)
+
+    def rcs():
+        _, analysis_type, response, _ = next_sample()
+        main.calculate_response_consistency(response, analysis_type)
+
+    def save():
+        query, analysis_type, response, _ = next_sample()
+        main.save_user_interaction(query, response, 50.0, 100, analysis_type)
+
+    results[f"calculate_business_relevance[{size}]"] = measure(brs, repeat)
+    results[f"calculate_response_consistency[{size}]"] = measure(rcs, repeat)
+
+    # Request path cost: handing the entry to the background writer
+    main.engagement_log = log
+    main.log_writer = AsyncLogWriter(log)
+    results[f"save_user_interaction[{size}]"] = measure(save, repeat)
+    main.log_writer.close()
+
+    # Cost of the write itself
+    main.log_writer = AsyncLogWriter(log, synchronous=True)
+    results[f"save_user_interaction_sync[{size}]"] = measure(save, repeat)
+    log.close()
+    return results
+
+
+def run(sizes: List[int], repeat: int = 200, log_dir: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """Run every micro-benchmark and return the statistics per case."""
+    samples = sample_interactions()
+    results = bench_parsing(samples, repeat)
+
+    root = log_dir or tempfile.mkdtemp(prefix="insights-bench-")
+    # The scoring and logging functions use main's module-level objects
+    saved = (main.engagement_log, main.log_writer, main.relevance_model)
+    try:
+        for size in sizes:
+            print(f"Preparing a log with {size} entries...")
+            log = open_log(root, size, samples)
+            results.update(bench_log_size(log, size, samples, repeat))
+    finally:
+        main.engagement_log, main.log_writer, main.relevance_model = saved
+        if log_dir is None:
+            shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def main_cli(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for parsing, scoring and logging")
+    parser.add_argument("--sizes", default="10,10000,1000000",
+                        help="Comma-separated engagement log sizes")
+    parser.add_argument("--repeat", type=int, default=200, help="Timed calls per case")
+    parser.add_argument("--log-dir", help="Keep generated logs here and reuse them")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/...)")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    results = run(sizes, args.repeat, args.log_dir)
+    print_table(results)
+    path = write_results("micro", results, {"sizes": sizes, "repeat": args.repeat}, args.output)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main_cli()
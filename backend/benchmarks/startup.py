@@ -0,0 +1,106 @@
+"""
+Cold-start benchmark: time to import the backend in a fresh interpreter.
+
+Each run starts a new Python process that imports ``main`` (or ``asgi``),
+then runs the warmup the server would do in the background. Fails when the
+median import time exceeds the budget or when a heavy dependency is
+imported eagerly again, so CI can guard the cold-start budget.
+
+    cd backend
+    python -m benchmarks.startup --repeat 10 --budget-ms 1000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+from benchmarks.common import print_table, summarize, write_results
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be loaded on first use or by the warmup
+HEAVY_MODULES = ("sklearn", "scipy", "google.generativeai")
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module} as app_module
+imported = time.perf_counter() - started
+heavy = [name for name in {heavy!r} if name in sys.modules]
+import main
+warmup = main.warmup()
+print(json.dumps({{"import": imported, "warmup": warmup, "heavy": heavy}}))
+"""
+
+
+def probe(module: str = "main") -> Dict[str, Any]:
+    """Import ``module`` in a fresh interpreter and return its import and warmup times."""
+    env = dict(os.environ)
+    env.setdefault("LLM_BACKEND", "fake")
+    # Warmup is timed explicitly, not started in the background
+    env["STARTUP_MODE"] = "lazy"
+    env["CACHE_WARM"] = "false"
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120, check=True
+    )
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def run(repeat: int = 5, module: str = "main") -> Dict[str, Any]:
+    """
+    Probe ``repeat`` cold starts.
+
+    Returns:
+        Dict[str, Any]: Import and warmup statistics, plus the heavy modules
+        found loaded right after the import
+    """
+    imports: List[float] = []
+    warmups: List[float] = []
+    heavy = set()
+    for _ in range(repeat):
+        result = probe(module)
+        imports.append(result["import"] * 1000)
+        warmups.append(result["warmup"] * 1000)
+        heavy.update(result["heavy"])
+    return {
+        f"import_{module}": summarize(imports),
+        "warmup": summarize(warmups),
+        "eager_heavy_modules": sorted(heavy),
+    }
+
+
+def main_cli(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Cold-start import benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters to start")
+    parser.add_argument("--module", default="main", choices=["main", "asgi"],
+                        help="Entry point to import")
+    parser.add_argument("--budget-ms", type=float, default=1000,
+                        help="Fail if the median import takes longer")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/...)")
+    args = parser.parse_args(argv)
+
+    stats = run(args.repeat, args.module)
+    heavy = stats.pop("eager_heavy_modules")
+    print_table(stats)
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    path = write_results("startup", stats, config, args.output)
+    print(f"Results written to {path}")
+
+    import_p50 = stats[f"import_{args.module}"]["p50_ms"]
+    failed = False
+    if heavy:
+        print(f"Imported eagerly: {', '.join(heavy)}")
+        failed = True
+    if import_p50 > args.budget_ms:
+        print(f"Median import {import_p50:.0f} ms exceeds the {args.budget_ms:.0f} ms budget")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
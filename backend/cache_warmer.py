@@ -0,0 +1,171 @@
+"""
+Cache warming and stale-while-revalidate refreshes for hot queries.
+
+A scheduler thread refreshes the answers to the most frequently asked
+queries before they expire (and once at startup for those not cached yet),
+so their askers never wait on the LLM. Requests that find an expired answer
+serve it stale and hand the query to ``refresh_async``; refreshes of the same
+query are never queued twice.
+"""
+
+import atexit
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+try:
+    from .response_cache import cache_key
+except ImportError:
+    from response_cache import cache_key
+
+
+class CacheWarmer:
+    """
+    Background refresher of cached answers.
+
+    Args:
+        refresh (Callable[[str, str], bool]): Generates and caches the answer
+            to a query of an analysis type; returns False if that failed
+        hot_queries (Callable[[], Iterable[Tuple[str, str]]]): Returns the
+            (query, analysis_type) pairs to keep warm
+        expires_in (Callable[[str, str], Optional[float]]): Seconds until the
+            cached answer expires, None if there is none
+        interval (float): Seconds between warming rounds; answers expiring
+            before the next round are refreshed. 0 warms once at start only.
+        max_workers (int): Refreshes running at once
+    """
+
+    def __init__(self, refresh: Callable[[str, str], bool],
+                 hot_queries: Callable[[], Iterable[Tuple[str, str]]],
+                 expires_in: Callable[[str, str], Optional[float]],
+                 interval: float = 900, max_workers: int = 2):
+        self.refresh = refresh
+        self.hot_queries = hot_queries
+        self.expires_in = expires_in
+        self.interval = interval
+        self.max_workers = max_workers
+
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending: Set[str] = set()
+        self._executor = None
+        self._executor_pid = None
+        self._scheduler = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._counters = {"rounds": 0, "scheduled": 0, "refreshed": 0, "failed": 0, "already_pending": 0}
+        atexit.register(self.close)
+
+    def start(self) -> None:
+        """Start the warming rounds once per process (again after ``close``)."""
+        with self._lock:
+            if self._scheduler is not None and self._pid == os.getpid():
+                return
+            # A scheduler inherited across fork() is not running in this process.
+            # Each scheduler has its own stop event, so one stopped by close()
+            # never resumes.
+            self._stop = threading.Event()
+            self._scheduler = threading.Thread(target=self._run, args=(self._stop,),
+                                               name="cache-warmer", daemon=True)
+            self._pid = os.getpid()
+            self._scheduler.start()
+
+    def warm(self) -> int:
+        """
+        Run one warming round: refresh every hot query that is not cached or
+        expires before the next round.
+
+        Returns:
+            int: Number of refreshes scheduled
+        """
+        scheduled = 0
+        for query, analysis_type in self.hot_queries():
+            remaining = self.expires_in(query, analysis_type)
+            if remaining is None or remaining <= self.interval:
+                scheduled += self.refresh_async(query, analysis_type)
+        self._count("rounds")
+        return scheduled
+
+    def refresh_async(self, query: str, analysis_type: str) -> bool:
+        """
+        Refresh an answer in the background unless that is already queued.
+
+        Returns:
+            bool: True if a refresh was scheduled
+        """
+        key = cache_key(query, analysis_type)
+        with self._lock:
+            if key in self._pending:
+                self._counters["already_pending"] += 1
+                return False
+            self._pending.add(key)
+            self._counters["scheduled"] += 1
+            executor = self._get_executor()
+        executor.submit(self._refresh, key, query, analysis_type)
+        return True
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until no refresh is pending.
+
+        Returns:
+            bool: False if the timeout expired first
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._pending, timeout)
+
+    def close(self) -> None:
+        """
+        Stop scheduling rounds and drop queued refreshes; refreshes already
+        running are abandoned. ``start`` may be called again afterwards.
+        """
+        with self._idle:
+            self._stop.set()
+            self._scheduler = None
+            executor = self._executor if self._executor_pid == os.getpid() else None
+            self._executor = None
+            # Cancelled refreshes never run, so they would stay pending forever
+            self._pending.clear()
+            self._idle.notify_all()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, int]:
+        """Return warming counters and the number of pending refreshes."""
+        with self._lock:
+            snapshot = dict(self._counters)
+            snapshot["pending"] = len(self._pending)
+        return snapshot
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Caller holds the lock."""
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="cache-refresh")
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def _refresh(self, key: str, query: str, analysis_type: str) -> None:
+        try:
+            ok = self.refresh(query, analysis_type)
+        except Exception as e:
+            print(f"Error refreshing cached insights: {str(e)}")
+            ok = False
+        with self._idle:
+            self._pending.discard(key)
+            self._counters["refreshed" if ok else "failed"] += 1
+            self._idle.notify_all()
+
+    def _run(self, stop: threading.Event) -> None:
+        while not stop.is_set():
+            try:
+                self.warm()
+            except Exception as e:
+                print(f"Error warming the response cache: {str(e)}")
+            if self.interval <= 0 or stop.wait(self.interval):
+                return
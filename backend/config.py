@@ -7,5 +7,14 @@ load_dotenv()
 # Google Gemini API Key
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-if not GOOGLE_API_KEY:
-    raise ValueError("GOOGLE_API_KEY is not set! Please add it to your .env file.")
+
+def require_google_api_key() -> str:
+    """
+    Return the Gemini API key.
+
+    Checked when the key is needed rather than on import, so tools and tests
+    that never call Gemini can import the configuration without one.
+    """
+    if not GOOGLE_API_KEY:
+        raise ValueError("GOOGLE_API_KEY is not set! Please add it to your .env file.")
+    return GOOGLE_API_KEY
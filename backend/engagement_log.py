@@ -0,0 +1,374 @@
+"""
+Append-only, segment-based storage for user engagement logs.
+
+Entries are written as JSON lines into numbered segment files
+(``segment-000001.jsonl``, ``segment-000002.jsonl``, ...). Appends never
+read existing history, so the per-request cost does not grow with the size
+of the log. Writers in different processes are serialized with an advisory
+lock on a ``.lock`` file inside the log directory.
+
+Response bodies are kept out of the segments: each is stored once as a
+compressed, content-addressed blob under ``blobs/`` and entries hold its
+hash in ``response_ref``. Readers load a body only when asked for it.
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from . import serialization
+    from .response_store import ResponseStore
+except ImportError:
+    import serialization
+    from response_store import ResponseStore
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to O_APPEND atomicity only
+    fcntl = None
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".jsonl"
+BLOB_DIRECTORY = "blobs"
+DEFAULT_SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+
+FSYNC_ALWAYS = "always"
+FSYNC_INTERVAL = "interval"
+FSYNC_NEVER = "never"
+FSYNC_POLICIES = (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER)
+
+
+def segment_name(index: int) -> str:
+    """Return the file name of the segment with the given index."""
+    return f"{SEGMENT_PREFIX}{index:06d}{SEGMENT_SUFFIX}"
+
+
+def list_segments(directory: str) -> List[str]:
+    """Return the segment file names in ``directory`` in write order."""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        name for name in os.listdir(directory)
+        if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+    )
+
+
+def _segment_index(name: str) -> int:
+    return int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+
+
+class EngagementLog:
+    """
+    Process-safe, append-only JSON-lines log split into rotating segments.
+
+    Args:
+        directory (str): Directory holding the segment files
+        segment_max_bytes (int): Size after which a new segment is started
+        fsync (str): 'always' (fsync every append), 'interval' (at most once
+            per ``fsync_interval`` seconds) or 'never' (leave it to the OS)
+        fsync_interval (float): Seconds between fsyncs for the 'interval' policy
+        compact_responses (bool): Store response bodies as deduplicated,
+            compressed blobs instead of inline; entries with inline bodies
+            are read either way
+    """
+
+    def __init__(self, directory: str, segment_max_bytes: int = DEFAULT_SEGMENT_MAX_BYTES,
+                 fsync: str = FSYNC_INTERVAL, fsync_interval: float = 1.0,
+                 compact_responses: bool = True):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Invalid fsync policy: {fsync}")
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.compact_responses = compact_responses
+        self.responses = ResponseStore(os.path.join(directory, BLOB_DIRECTORY),
+                                       fsync=fsync == FSYNC_ALWAYS)
+
+        self._thread_lock = threading.Lock()
+        self._pid = None
+        self._lock_fd = None
+        self._segment_fd = None
+        self._segment_index = None
+        self._last_fsync = 0.0
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        """Append a single entry to the log."""
+        self.append_many([entry])
+
+    def append_many(self, entries: Iterable[Dict[str, Any]]) -> int:
+        """
+        Append several entries with a single write.
+
+        Returns:
+            int: Number of entries written
+        """
+        # Blobs are written before the entries referencing them, outside the lock
+        lines = [serialization.dumps(self._compact(entry)) + b"\n" for entry in entries]
+        if not lines:
+            return 0
+        payload = b"".join(lines)
+
+        with self._thread_lock:
+            self._ensure_open()
+            self._lock()
+            try:
+                fd = self._current_segment()
+                os.write(fd, payload)
+                self._maybe_fsync(fd)
+            finally:
+                self._unlock()
+        return len(lines)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self.iter_entries()
+
+    def iter_entries(self, load_responses: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Stream all entries in write order without loading the whole log.
+
+        Lines that cannot be decoded (e.g. a write torn by a crash) are
+        skipped rather than discarding the rest of the history.
+
+        Args:
+            load_responses (bool): Replace ``response_ref`` with the stored
+                ``response``. Without it, entries keep the reference and
+                ``load_response`` decompresses a body when it is needed.
+        """
+        for name in list_segments(self.directory):
+            for entry in self._read_segment(name):
+                yield self._with_response(entry) if load_responses else entry
+
+    def iter_recent(self, limit: int, load_responses: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the last ``limit`` entries in write order.
+
+        Only the newest segments holding them are read and only their
+        responses are loaded, so the cost does not grow with the history.
+
+        Args:
+            limit (int): Number of entries
+            load_responses (bool): As for ``iter_entries``
+        """
+        if limit <= 0:
+            return
+        segments: List[List[Dict[str, Any]]] = []
+        count = 0
+        for name in reversed(list_segments(self.directory)):
+            entries = list(self._read_segment(name))
+            segments.append(entries)
+            count += len(entries)
+            if count >= limit:
+                break
+        recent = [entry for entries in reversed(segments) for entry in entries][-limit:]
+        for entry in recent:
+            yield self._with_response(entry) if load_responses else entry
+
+    def _read_segment(self, name: str) -> Iterator[Dict[str, Any]]:
+        """Decode the entries of a segment, skipping lines that cannot be decoded."""
+        with open(os.path.join(self.directory, name), "rb") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield serialization.loads(line)
+                except ValueError:
+                    continue
+
+    def _with_response(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        if "response_ref" in entry:
+            entry["response"] = self.load_response(entry)
+            del entry["response_ref"]
+        return entry
+
+    def load_response(self, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Return the response of an entry, decompressing its blob if needed.
+
+        Returns:
+            Optional[Dict[str, Any]]: The response, or None if its blob is missing
+        """
+        if "response_ref" not in entry:
+            return entry.get("response")
+        try:
+            return self.responses.get(entry["response_ref"])
+        except FileNotFoundError:
+            return None
+
+    def flush(self) -> None:
+        """Force the current segment to stable storage."""
+        with self._thread_lock:
+            if self._segment_fd is not None and self._pid == os.getpid():
+                os.fsync(self._segment_fd)
+                self._last_fsync = time.monotonic()
+
+    def close(self) -> None:
+        """Flush and release file handles."""
+        with self._thread_lock:
+            if self._pid == os.getpid():
+                if self._segment_fd is not None and self.fsync != FSYNC_NEVER:
+                    os.fsync(self._segment_fd)
+            self._close_fds()
+
+    def _compact(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the entry with its response replaced by a blob reference."""
+        if not self.compact_responses or not isinstance(entry.get("response"), dict):
+            return entry
+        compact = dict(entry)
+        compact["response_ref"] = self.responses.put(compact.pop("response"))
+        return compact
+
+    def _ensure_open(self) -> None:
+        # Descriptors inherited across fork() share lock state with the
+        # parent, so every process opens its own.
+        if self._pid == os.getpid() and self._lock_fd is not None:
+            return
+        self._close_fds()
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_fd = os.open(os.path.join(self.directory, ".lock"),
+                                os.O_RDWR | os.O_CREAT, 0o644)
+        self._pid = os.getpid()
+
+    def _close_fds(self) -> None:
+        if self._pid == os.getpid():
+            for fd in (self._segment_fd, self._lock_fd):
+                if fd is not None:
+                    os.close(fd)
+        self._segment_fd = None
+        self._segment_index = None
+        self._lock_fd = None
+        self._pid = None
+
+    def _lock(self) -> None:
+        if fcntl is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+
+    def _unlock(self) -> None:
+        if fcntl is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _open_segment(self, index: int) -> None:
+        if self._segment_fd is not None:
+            os.close(self._segment_fd)
+        path = os.path.join(self.directory, segment_name(index))
+        self._segment_fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._segment_index = index
+
+    def _current_segment(self) -> int:
+        """Return the descriptor of the segment to append to. Caller holds the lock."""
+        if self._segment_fd is None:
+            segments = list_segments(self.directory)
+            self._open_segment(_segment_index(segments[-1]) if segments else 1)
+
+        if os.fstat(self._segment_fd).st_size >= self.segment_max_bytes:
+            # Another process may already have rotated; only rescan the
+            # directory here, never on the regular append path.
+            segments = list_segments(self.directory)
+            latest = _segment_index(segments[-1]) if segments else self._segment_index
+            if latest > self._segment_index:
+                self._open_segment(latest)
+            if os.fstat(self._segment_fd).st_size >= self.segment_max_bytes:
+                if self.fsync != FSYNC_NEVER:
+                    os.fsync(self._segment_fd)
+                self._open_segment(self._segment_index + 1)
+        return self._segment_fd
+
+    def _maybe_fsync(self, fd: int) -> None:
+        if self.fsync == FSYNC_ALWAYS:
+            os.fsync(fd)
+        elif self.fsync == FSYNC_INTERVAL:
+            now = time.monotonic()
+            if now - self._last_fsync >= self.fsync_interval:
+                os.fsync(fd)
+                self._last_fsync = now
+
+
+def migrate_json_array(source: str, log: EngagementLog, batch_size: int = 1000) -> int:
+    """
+    One-shot migration of a legacy JSON-array log file into ``log``.
+
+    The source file is renamed to ``<source>.migrated`` once all entries have
+    been written so the migration is not repeated.
+
+    Args:
+        source (str): Path to the legacy ``user_engagement_log.json`` file
+        log (EngagementLog): Destination log
+        batch_size (int): Number of entries written per append
+
+    Returns:
+        int: Number of migrated entries
+    """
+    with open(source, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        raise ValueError(f"{source} does not contain a JSON array")
+
+    migrated = 0
+    for start in range(0, len(entries), batch_size):
+        migrated += log.append_many(entries[start:start + batch_size])
+    log.flush()
+
+    os.replace(source, source + ".migrated")
+    return migrated
+
+
+def compact_segments(log: EngagementLog) -> Tuple[int, int]:
+    """
+    Move inline response bodies of existing segments into the blob store.
+
+    Every segment but the newest is rewritten and atomically replaced. Run it
+    while no server writes to the log.
+
+    Args:
+        log (EngagementLog): Log to compact
+
+    Returns:
+        Tuple[int, int]: Segment bytes before and after
+    """
+    before = after = 0
+    for name in list_segments(log.directory)[:-1]:
+        path = os.path.join(log.directory, name)
+        tmp = path + ".compacting"
+        with open(path, "rb") as source, open(tmp, "wb") as target:
+            for line in source:
+                before += len(line)
+                try:
+                    entry = log._compact(serialization.loads(line))
+                except ValueError:
+                    continue
+                compacted = serialization.dumps(entry) + b"\n"
+                after += len(compacted)
+                target.write(compacted)
+            target.flush()
+            os.fsync(target.fileno())
+        os.replace(tmp, path)
+    return before, after
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Engagement log maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate = subparsers.add_parser("migrate", help="Convert a legacy JSON-array log")
+    migrate.add_argument("source", help="Path to the legacy user_engagement_log.json")
+    migrate.add_argument("directory", help="Destination segment directory")
+    compact = subparsers.add_parser("compact", help="Move inline responses of old segments into blobs")
+    compact.add_argument("directory", help="Segment directory")
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        log = EngagementLog(args.directory)
+        count = migrate_json_array(args.source, log)
+        log.close()
+        print(f"Migrated {count} entries from {args.source} to {args.directory}")
+    elif args.command == "compact":
+        before, after = compact_segments(EngagementLog(args.directory))
+        print(f"Compacted segments from {before} to {after} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""
+Indexed query history over the engagement log.
+
+The append-only engagement log stays the source of truth; every batch
+written to it is also inserted into a SQLite database indexed on timestamp,
+analysis type, BRS and RCS, so history lookups and score distributions are
+answered by the database instead of scanning the log. Entries are identified
+by ``(timestamp, analysis_type, query)``, which makes re-importing the log
+idempotent. An empty database is filled from the log on first use.
+
+Response bodies stay in the log's blob store: rows hold the blob reference
+and a body is only decompressed when a page of history returns it. Bodies
+are stored inline only for entries the log keeps inline.
+"""
+
+import argparse
+import base64
+import json
+import math
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from . import serialization
+except ImportError:
+    import serialization
+
+# Filters accepted by ``HistoryStore.query`` and ``HistoryStore.stats``
+FILTERS = ("analysis_type", "min_brs", "max_brs", "min_rcs", "max_rcs", "since", "until")
+
+_CONDITIONS = {
+    "analysis_type": "analysis_type = ?",
+    "min_brs": "brs >= ?",
+    "max_brs": "brs < ?",
+    "min_rcs": "rcs >= ?",
+    "max_rcs": "rcs < ?",
+    "since": "timestamp >= ?",
+    "until": "timestamp < ?",
+}
+
+
+def normalize_timestamp(value: str) -> str:
+    """Spell an ISO timestamp the way logged timestamps are (``YYYY-MM-DD HH:MM:SS``)."""
+    return value.strip().replace("T", " ")
+
+
+def encode_cursor(timestamp: str, row_id: int) -> str:
+    """Return the opaque cursor pointing after the given row."""
+    return base64.urlsafe_b64encode(json.dumps([timestamp, row_id]).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Inverse of ``encode_cursor``; raises ValueError on a malformed cursor."""
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(timestamp), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+class HistoryStore:
+    """
+    SQLite index of logged interactions, shared by every process using the same file.
+
+    The database is opened on first use. If it is empty then, it is filled
+    from ``entries_source`` inside the same write transaction, so concurrent
+    workers import the log only once. A database written before responses
+    were stored by reference is rebuilt the same way.
+
+    Args:
+        path (str): Database file
+        entries_source (Optional[Callable[[], Iterable[Dict[str, Any]]]]):
+            Returns the logged interactions to fill an empty database with,
+            preferably without loading their responses
+        batch_size (int): Entries inserted per statement when importing
+        log (Optional[EngagementLog]): Log whose blob store holds the
+            responses; without it, bodies are stored inline
+    """
+
+    def __init__(self, path: str,
+                 entries_source: Optional[Callable[[], Iterable[Dict[str, Any]]]] = None,
+                 batch_size: int = 1000, log=None):
+        self.path = path
+        self.entries_source = entries_source
+        self.batch_size = batch_size
+        self.log = log
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def append_many(self, entries: Iterable[Dict[str, Any]]) -> int:
+        """
+        Index logged entries; entries already present are skipped.
+
+        Returns:
+            int: Number of entries inserted
+        """
+        rows = [self._row(entry) for entry in entries]
+        if not rows:
+            return 0
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                return self._insert(conn, rows)
+
+    def import_entries(self, entries: Iterable[Dict[str, Any]]) -> int:
+        """
+        Index every entry of a log, e.g. to catch up after the database was deleted.
+
+        Returns:
+            int: Number of entries that were not indexed yet
+        """
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                return self._insert_batched(conn, entries)
+
+    def query(self, limit: int = 50, cursor: Optional[str] = None,
+              **filters: Any) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Return logged interactions, newest first.
+
+        Args:
+            limit (int): Maximum number of entries returned
+            cursor (Optional[str]): ``next_cursor`` of the previous page
+            **filters: Any of ``FILTERS``; ``min_*``/``since`` are inclusive,
+                ``max_*``/``until`` exclusive
+
+        Returns:
+            Tuple[List[Dict[str, Any]], Optional[str]]: The entries and the
+            cursor of the next page (None on the last page)
+        """
+        where, params = self._where(filters)
+        if cursor is not None:
+            timestamp, row_id = decode_cursor(cursor)
+            where.append("(timestamp < ? OR (timestamp = ? AND id < ?))")
+            params.extend([timestamp, timestamp, row_id])
+        sql = ("SELECT id, timestamp, analysis_type, query, brs, rcs, response_ref, response FROM interactions"
+               + self._clause(where) + " ORDER BY timestamp DESC, id DESC LIMIT ?")
+
+        with self._lock:
+            rows = self._connect().execute(sql, params + [limit + 1]).fetchall()
+
+        entries = [{
+            "id": row[0],
+            "timestamp": row[1],
+            "analysis_type": row[2],
+            "query": row[3],
+            "BRS": row[4],
+            "RCS": row[5],
+            "response": self._response(row[6], row[7]),
+        } for row in rows[:limit]]
+        next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+        return entries, next_cursor
+
+    def stats(self, bucket_size: float = 10, **filters: Any) -> Dict[str, Any]:
+        """
+        Aggregate BRS and RCS over the matching interactions.
+
+        Args:
+            bucket_size (float): Width of the histogram buckets
+            **filters: As for ``query``
+
+        Returns:
+            Dict[str, Any]: Count, mean/min/max and a histogram (bucket lower
+            bound -> count; 100 falls into the last bucket) of BRS and RCS,
+            plus count and means per analysis type
+        """
+        where, params = self._where(filters)
+        clause = self._clause(where)
+        last_bucket = math.ceil(100 / bucket_size - 1) * bucket_size
+
+        with self._lock:
+            conn = self._connect()
+            count, brs_mean, brs_min, brs_max, rcs_mean, rcs_min, rcs_max = conn.execute(
+                "SELECT COUNT(*), AVG(brs), MIN(brs), MAX(brs), AVG(rcs), MIN(rcs), MAX(rcs)"
+                " FROM interactions" + clause, params).fetchone()
+            histograms = {}
+            for column in ("brs", "rcs"):
+                scored = self._clause(where + [f"{column} IS NOT NULL"])
+                histograms[column] = conn.execute(
+                    f"SELECT MIN(CAST({column} / ? AS INTEGER) * ?, ?) AS bucket, COUNT(*)"
+                    f" FROM interactions{scored} GROUP BY bucket ORDER BY bucket",
+                    [bucket_size, bucket_size, last_bucket] + params).fetchall()
+            by_type = conn.execute(
+                "SELECT analysis_type, COUNT(*), AVG(brs), AVG(rcs) FROM interactions"
+                + clause + " GROUP BY analysis_type ORDER BY analysis_type", params).fetchall()
+
+        def summary(mean, low, high, histogram):
+            return {
+                "mean": _round(mean),
+                "min": low,
+                "max": high,
+                "histogram": {_bucket_label(bucket): n for bucket, n in histogram},
+            }
+
+        return {
+            "count": count,
+            "BRS": summary(brs_mean, brs_min, brs_max, histograms["brs"]),
+            "RCS": summary(rcs_mean, rcs_min, rcs_max, histograms["rcs"]),
+            "by_analysis_type": {
+                analysis_type: {"count": n, "BRS_mean": _round(brs), "RCS_mean": _round(rcs)}
+                for analysis_type, n, brs, rcs in by_type
+            },
+        }
+
+    def top_queries(self, analysis_type: str, limit: int = 10,
+                    since: Optional[str] = None) -> List[Tuple[str, int]]:
+        """
+        Return the most frequently asked queries of an analysis type.
+
+        Queries differing only in case or surrounding whitespace are counted together.
+
+        Args:
+            analysis_type (str): Type of analysis
+            limit (int): Maximum number of queries returned
+            since (Optional[str]): Only count interactions from this ISO timestamp on
+
+        Returns:
+            List[Tuple[str, int]]: (query, count) pairs, most frequent first
+        """
+        where, params = self._where({"analysis_type": analysis_type, "since": since})
+        with self._lock:
+            return [tuple(row) for row in self._connect().execute(
+                "SELECT query, COUNT(*) AS asked FROM interactions" + self._clause(where)
+                + " GROUP BY lower(trim(query)) ORDER BY asked DESC, MAX(timestamp) DESC LIMIT ?",
+                params + [limit]).fetchall()]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM interactions").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database, creating and filling it if needed. Caller holds the lock."""
+        if self._conn is not None:
+            return self._conn
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30,
+                               isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(interactions)")]
+            if columns and "response_ref" not in columns:
+                # Written when bodies were stored inline: rebuilt from the log
+                conn.execute("DROP TABLE interactions")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS interactions ("
+                " id INTEGER PRIMARY KEY,"
+                " timestamp TEXT NOT NULL,"
+                " analysis_type TEXT NOT NULL,"
+                " query TEXT NOT NULL,"
+                " brs REAL,"
+                " rcs REAL,"
+                " response_ref TEXT,"
+                " response TEXT)"
+            )
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS interactions_timestamp"
+                " ON interactions (timestamp, analysis_type, query)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS interactions_analysis_type"
+                " ON interactions (analysis_type, timestamp)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS interactions_brs ON interactions (brs)")
+            conn.execute("CREATE INDEX IF NOT EXISTS interactions_rcs ON interactions (rcs)")
+            empty = conn.execute("SELECT 1 FROM interactions LIMIT 1").fetchone() is None
+            if empty and self.entries_source is not None:
+                self._insert_batched(conn, self.entries_source())
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            conn.close()
+            raise
+        # Later transactions are managed by the connection context manager
+        conn.isolation_level = ""
+        self._conn = conn
+        return conn
+
+    def _insert_batched(self, conn: sqlite3.Connection, entries: Iterable[Dict[str, Any]]) -> int:
+        inserted = 0
+        batch = []
+        for entry in entries:
+            batch.append(self._row(entry))
+            if len(batch) >= self.batch_size:
+                inserted += self._insert(conn, batch)
+                batch = []
+        return inserted + self._insert(conn, batch)
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, rows: List[Tuple]) -> int:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO interactions (timestamp, analysis_type, query, brs, rcs, response_ref, response)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        return conn.total_changes - before
+
+    def _row(self, entry: Dict[str, Any]) -> Tuple:
+        ref = entry.get("response_ref")
+        response = entry.get("response")
+        if (ref is None and self.log is not None and self.log.compact_responses
+                and isinstance(response, dict)):
+            # Entries handed over by the log writer still carry the body; the
+            # log has stored its blob already, so this only hashes it
+            ref = self.log.responses.put(response)
+        return (
+            str(entry.get("timestamp", "")),
+            entry.get("analysis_type", "general"),
+            entry.get("query", ""),
+            entry.get("BRS"),
+            entry.get("RCS"),
+            ref,
+            None if ref is not None else serialization.dumps(response).decode("utf-8"),
+        )
+
+    def _response(self, ref: Optional[str], response: Optional[str]) -> Optional[Dict[str, Any]]:
+        if ref is None:
+            return serialization.loads(response) if response is not None else None
+        if self.log is None:
+            return None
+        return self.log.load_response({"response_ref": ref})
+
+    @staticmethod
+    def _where(filters: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+        where, params = [], []
+        for name, value in filters.items():
+            if name not in _CONDITIONS:
+                raise ValueError(f"Unknown filter: {name}")
+            if value is None:
+                continue
+            if name in ("since", "until"):
+                value = normalize_timestamp(value)
+            where.append(_CONDITIONS[name])
+            params.append(value)
+        return where, params
+
+    @staticmethod
+    def _clause(where: List[str]) -> str:
+        return " WHERE " + " AND ".join(where) if where else ""
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 2)
+
+
+def _bucket_label(bucket: float) -> str:
+    return str(int(bucket)) if float(bucket).is_integer() else str(bucket)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Query history maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    sync = subparsers.add_parser("sync", help="Index engagement log entries missing from the database")
+    sync.add_argument("directory", help="Engagement log segment directory")
+    sync.add_argument("database", help="History database file")
+    args = parser.parse_args(argv)
+
+    if args.command == "sync":
+        from engagement_log import EngagementLog
+
+        log = EngagementLog(args.directory)
+        store = HistoryStore(args.database, log=log)
+        count = store.import_entries(log.iter_entries(load_responses=False))
+        store.close()
+        print(f"Indexed {count} new entries from {args.directory} in {args.database}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""
+Language model backends the query engine dispatches through.
+
+``GeminiBackend`` calls Google Gemini. ``FakeBackend`` is a local stand-in
+that writes realistic multi-section answers for the sections a prompt asks
+for, with configurable latency, stream chunking and injected errors, so the
+whole pipeline (parse, score, log) can be exercised and load-tested offline.
+
+Callers may pass a ``response_schema`` (an OpenAPI-style object schema) to
+ask for a JSON answer with exactly those fields instead of free text.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    from . import config
+except ImportError:
+    import config
+
+
+def configure_gemini_api():
+    """Configure the Gemini API with the API key."""
+    try:
+        # Imported here: the SDK takes most of a second to import and is
+        # only needed once Gemini is actually called
+        import google.generativeai as genai
+
+        # In test mode, return without raising error
+        if os.getenv("TESTING") and not config.GOOGLE_API_KEY:
+            return
+
+        genai.configure(api_key=config.require_google_api_key())
+    except Exception as e:
+        if not os.getenv("TESTING"):
+            raise ValueError(f"Failed to configure Gemini API: {str(e)}")
+
+
+class Completion:
+    """
+    Text generated for a prompt.
+
+    Args:
+        text (str): Generated text
+        total_tokens (Optional[int]): Prompt plus output tokens, if known
+        output_tokens (Optional[int]): Output tokens, if known
+    """
+
+    __slots__ = ("text", "total_tokens", "output_tokens")
+
+    def __init__(self, text: str, total_tokens: Optional[int] = None,
+                 output_tokens: Optional[int] = None):
+        self.text = text
+        self.total_tokens = total_tokens
+        self.output_tokens = output_tokens
+
+
+class LLMBackend:
+    """Base class for language model backends."""
+
+    name = "base"
+
+    def warmup(self) -> None:
+        """Load clients and configuration ahead of the first call."""
+
+    def generate(self, prompt: str, model: Optional[str] = None,
+                 max_output_tokens: Optional[int] = None,
+                 response_schema: Optional[Dict[str, Any]] = None) -> Completion:
+        """
+        Generate a complete answer.
+
+        Args:
+            prompt (str): Prompt text
+            model (Optional[str]): Model to call instead of the backend's default
+            max_output_tokens (Optional[int]): Cap on the generated tokens
+            response_schema (Optional[Dict[str, Any]]): Ask for a JSON object
+                matching this schema instead of free text
+        """
+        raise NotImplementedError
+
+    async def agenerate(self, prompt: str, model: Optional[str] = None,
+                        max_output_tokens: Optional[int] = None,
+                        response_schema: Optional[Dict[str, Any]] = None) -> Completion:
+        """Generate a complete answer without blocking the event loop."""
+        raise NotImplementedError
+
+    def stream(self, prompt: str, model: Optional[str] = None,
+               max_output_tokens: Optional[int] = None,
+               response_schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """
+        Start generating and return the answer as an iterator of text chunks.
+
+        The request is made before this returns, so errors opening the stream
+        are raised here rather than on the first ``next``.
+        """
+        raise NotImplementedError
+
+
+class GeminiBackend(LLMBackend):
+    """
+    Google Gemini via ``google.generativeai``.
+
+    Args:
+        model_name (str): Gemini model to call
+    """
+
+    name = "gemini"
+
+    def __init__(self, model_name: str = "gemini-2.0-flash"):
+        self.model_name = model_name
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _get_model(self, model: Optional[str] = None):
+        """Return the shared client of a Gemini model, configuring the API on first use."""
+        name = model or self.model_name
+        with self._lock:
+            if name not in self._models:
+                import google.generativeai as genai
+                if not self._models:
+                    configure_gemini_api()
+                self._models[name] = genai.GenerativeModel(name)
+            return self._models[name]
+
+    def warmup(self) -> None:
+        self._get_model()
+
+    @staticmethod
+    def _config(max_output_tokens: Optional[int], response_schema: Optional[Dict[str, Any]] = None):
+        config: Dict[str, Any] = {}
+        if max_output_tokens:
+            config["max_output_tokens"] = max_output_tokens
+        if response_schema is not None:
+            # Constrained decoding: the model can only emit JSON matching the schema
+            config["response_mime_type"] = "application/json"
+            config["response_schema"] = response_schema
+        return config or None
+
+    @staticmethod
+    def _completion(response) -> Completion:
+        usage = getattr(response, "usage_metadata", None)
+        return Completion(response.text, getattr(usage, "total_token_count", None) or None,
+                          getattr(usage, "candidates_token_count", None) or None)
+
+    def generate(self, prompt: str, model: Optional[str] = None,
+                 max_output_tokens: Optional[int] = None,
+                 response_schema: Optional[Dict[str, Any]] = None) -> Completion:
+        return self._completion(self._get_model(model).generate_content(
+            prompt, generation_config=self._config(max_output_tokens, response_schema)))
+
+    async def agenerate(self, prompt: str, model: Optional[str] = None,
+                        max_output_tokens: Optional[int] = None,
+                        response_schema: Optional[Dict[str, Any]] = None) -> Completion:
+        return self._completion(await self._get_model(model).generate_content_async(
+            prompt, generation_config=self._config(max_output_tokens, response_schema)))
+
+    def stream(self, prompt: str, model: Optional[str] = None,
+               max_output_tokens: Optional[int] = None,
+               response_schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        response = self._get_model(model).generate_content(
+            prompt, generation_config=self._config(max_output_tokens, response_schema), stream=True)
+        return (chunk.text for chunk in response)
+
+
+class FakeLLMError(Exception):
+    """Injected provider error; ``code`` mimics the HTTP status of a real failure."""
+
+    def __init__(self, message: str, code: int):
+        super().__init__(message)
+        self.code = code
+
+
+# Header lines of the prompt built by query_engine.build_prompt
+_PROMPT_HEADER = re.compile(r"^([A-Z][^:\n]{0,60}):$", re.MULTILINE)
+_PROMPT_QUERY = re.compile(r"^Business query: (.*)$", re.MULTILINE)
+_PROMPT_MAX_ITEMS = re.compile(r"at most (\d+) bullet points")
+_WORD = re.compile(r"[A-Za-z][A-Za-z'-]{3,}")
+
+# Header styles seen in real model output
+_HEADER_STYLES = ["{name}:", "**{name}:**", "## {name}", "📊 {name}:", "**{number}. {name}**"]
+_BULLET_STYLES = ["- ", "• ", "* ", "{number}. "]
+
+_OPENERS = [
+    "Focus on", "Invest in", "Prioritize", "Expand", "Strengthen", "Monitor",
+    "Reduce exposure to", "Partner around", "Differentiate through", "Measure",
+]
+_OBJECTS = [
+    "customer retention", "pricing strategy", "digital channels", "operational efficiency",
+    "supply chain resilience", "market share in adjacent segments", "brand positioning",
+    "data-driven decision making", "recurring revenue", "talent and capabilities",
+]
+_QUALIFIERS = [
+    "over the next two quarters", "to protect margins", "before competitors react",
+    "with clear success metrics", "starting with a pilot", "in the highest-growth regions",
+    "while keeping costs flat", "to capture emerging demand",
+]
+
+
+class FakeBackend(LLMBackend):
+    """
+    Deterministic local stand-in for a language model.
+
+    Answers are generated from the prompt (same prompt, same text) and mention
+    words from the query, so parsing, scoring and logging behave as with a
+    real model. Latencies and injected errors are drawn from a seeded
+    generator.
+
+    Args:
+        latency_ms (float): Median latency of a full answer
+        distribution (str): 'fixed', 'uniform' (0 to 2x median), 'exponential'
+            or 'lognormal'
+        sigma (float): Spread of the lognormal distribution
+        first_chunk_share (float): Share of the latency spent before the first
+            streamed chunk
+        chunk_chars (int): Characters per streamed chunk
+        error_rate (float): Probability that a call fails
+        error_code (int): Status code of injected errors (429 and 503 are
+            retried by the rate limiter)
+        seed (Optional[int]): Seed for latencies and injected errors
+    """
+
+    name = "fake"
+
+    def __init__(self, latency_ms: float = 0, distribution: str = "lognormal", sigma: float = 0.5,
+                 first_chunk_share: float = 0.3, chunk_chars: int = 80, error_rate: float = 0.0,
+                 error_code: int = 429, seed: Optional[int] = None):
+        if distribution not in ("fixed", "uniform", "exponential", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.latency_ms = latency_ms
+        self.distribution = distribution
+        self.sigma = sigma
+        self.first_chunk_share = first_chunk_share
+        self.chunk_chars = max(1, chunk_chars)
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str, model: Optional[str] = None,
+                 max_output_tokens: Optional[int] = None,
+                 response_schema: Optional[Dict[str, Any]] = None) -> Completion:
+        latency = self._start_call()
+        time.sleep(latency)
+        return self._completion(prompt, max_output_tokens, response_schema)
+
+    async def agenerate(self, prompt: str, model: Optional[str] = None,
+                        max_output_tokens: Optional[int] = None,
+                        response_schema: Optional[Dict[str, Any]] = None) -> Completion:
+        latency = self._start_call()
+        await asyncio.sleep(latency)
+        return self._completion(prompt, max_output_tokens, response_schema)
+
+    def stream(self, prompt: str, model: Optional[str] = None,
+               max_output_tokens: Optional[int] = None,
+               response_schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        latency = self._start_call()
+        chunks = self._chunks(self._truncate(self.answer(prompt, response_schema), max_output_tokens))
+        delays = self._chunk_delays(latency, len(chunks))
+
+        def generate_chunks():
+            for chunk, delay in zip(chunks, delays):
+                time.sleep(delay)
+                yield chunk
+        return generate_chunks()
+
+    def answer(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        """Return the text (or, given a schema, the JSON) this backend answers ``prompt`` with."""
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+        query = _PROMPT_QUERY.search(prompt)
+        topics = _WORD.findall(query.group(1)) if query else []
+        max_items = _PROMPT_MAX_ITEMS.search(prompt)
+        max_items = int(max_items.group(1)) if max_items else 5
+        if response_schema is not None:
+            return self._json_answer(rng, topics, max_items, response_schema)
+
+        headers = _PROMPT_HEADER.findall(prompt) or ["Summary"]
+        header_style = rng.choice(_HEADER_STYLES)
+        bullet_style = rng.choice(_BULLET_STYLES)
+
+        lines = [rng.choice(["Here is my analysis.", "Certainly! Below is a structured analysis.", ""])]
+        for index, header in enumerate(headers):
+            lines.append("")
+            lines.append(header_style.format(name=header, number=index + 1))
+            if index == 0:
+                lines.append(self._sentence(rng, topics) + " " + self._sentence(rng, topics))
+                continue
+            for number in range(1, rng.randint(min(2, max_items), max_items) + 1):
+                lines.append(bullet_style.format(number=number) + self._sentence(rng, topics))
+        return "\n".join(lines) + "\n"
+
+    def _json_answer(self, rng: random.Random, topics: List[str], max_items: int,
+                     response_schema: Dict[str, Any]) -> str:
+        answer: Dict[str, Any] = {}
+        for key, field in response_schema.get("properties", {}).items():
+            if field.get("type") == "array":
+                answer[key] = [self._sentence(rng, topics)
+                               for _ in range(rng.randint(min(2, max_items), max_items))]
+            else:
+                answer[key] = self._sentence(rng, topics) + " " + self._sentence(rng, topics)
+        return json.dumps(answer, ensure_ascii=False)
+
+    @staticmethod
+    def _sentence(rng: random.Random, topics: List[str]) -> str:
+        topic = f" for {rng.choice(topics).lower()}" if topics and rng.random() < 0.7 else ""
+        return f"{rng.choice(_OPENERS)} {rng.choice(_OBJECTS)}{topic} {rng.choice(_QUALIFIERS)}."
+
+    def _start_call(self) -> float:
+        """Draw this call's latency in seconds, or raise an injected error."""
+        with self._lock:
+            if self.error_rate and self._random.random() < self.error_rate:
+                raise FakeLLMError(f"Injected error ({self.error_code})", self.error_code)
+            return self._latency() / 1000
+
+    def _latency(self) -> float:
+        median = self.latency_ms
+        if median <= 0 or self.distribution == "fixed":
+            return max(0.0, median)
+        if self.distribution == "uniform":
+            return self._random.uniform(0, 2 * median)
+        if self.distribution == "exponential":
+            return self._random.expovariate(math.log(2) / median)
+        return self._random.lognormvariate(math.log(median), self.sigma)
+
+    def _chunks(self, text: str) -> List[str]:
+        return [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)]
+
+    def _chunk_delays(self, latency: float, count: int) -> List[float]:
+        if count <= 1:
+            return [latency] * count
+        rest = latency * (1 - self.first_chunk_share) / (count - 1)
+        return [latency * self.first_chunk_share] + [rest] * (count - 1)
+
+    @staticmethod
+    def _truncate(text: str, max_output_tokens: Optional[int]) -> str:
+        # Cut like a real model hitting its output cap (~4 characters per token)
+        return text[:max_output_tokens * 4] if max_output_tokens else text
+
+    def _completion(self, prompt: str, max_output_tokens: Optional[int] = None,
+                    response_schema: Optional[Dict[str, Any]] = None) -> Completion:
+        text = self._truncate(self.answer(prompt, response_schema), max_output_tokens)
+        return Completion(text, (len(prompt) + len(text)) // 4, len(text) // 4)
+
+
+def create_llm_backend(backend: str = "gemini", model_name: str = "gemini-2.0-flash") -> LLMBackend:
+    """
+    Create a language model backend.
+
+    The fake backend is configured with the ``FAKE_LLM_*`` environment
+    variables (see README).
+
+    Args:
+        backend (str): 'gemini' or 'fake'
+        model_name (str): Gemini model to call
+
+    Returns:
+        LLMBackend: The configured backend
+    """
+    if backend == "gemini":
+        return GeminiBackend(model_name)
+    if backend == "fake":
+        seed = os.getenv("FAKE_LLM_SEED")
+        return FakeBackend(
+            latency_ms=float(os.getenv("FAKE_LLM_LATENCY_MS", "0")),
+            distribution=os.getenv("FAKE_LLM_LATENCY_DISTRIBUTION", "lognormal"),
+            sigma=float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.5")),
+            chunk_chars=int(os.getenv("FAKE_LLM_CHUNK_CHARS", "80")),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+            error_code=int(os.getenv("FAKE_LLM_ERROR_CODE", "429")),
+            seed=int(seed) if seed else None
+        )
+    raise ValueError(f"Unknown LLM backend: {backend}")
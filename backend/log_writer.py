@@ -0,0 +1,203 @@
+"""
+Background, batched writer for the engagement log.
+
+Request handlers enqueue entries without touching the filesystem; a worker
+thread drains the bounded queue and writes entries in batches once either
+the batch size or the flush interval is reached, and on shutdown. Batches
+written to the log are then passed on to secondary indexes such as the
+query history store.
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+_SHUTDOWN = object()
+
+
+class AsyncLogWriter:
+    """
+    Bounded, batching writer in front of an ``EngagementLog``.
+
+    Args:
+        log: Destination with an ``append_many(entries)`` method
+        max_queue (int): Maximum number of entries waiting to be written
+        batch_size (int): Write as soon as this many entries are pending
+        flush_interval (float): Write pending entries at least this often (seconds)
+        block_timeout (float): How long ``submit`` may wait for room in a full
+            queue before dropping the entry; 0 never blocks
+        synchronous (bool): Write directly on ``submit`` (used by tests)
+        indexes (Sequence): Objects with an ``append_many(entries)`` method
+            receiving every batch once it is in the log
+    """
+
+    def __init__(self, log, max_queue: int = 10000, batch_size: int = 100,
+                 flush_interval: float = 0.5, block_timeout: float = 0.0,
+                 synchronous: bool = False, indexes: Sequence = ()):
+        self.log = log
+        self.indexes = list(indexes)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.synchronous = synchronous
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._worker = None
+        self._pid = None
+        self._closed = False
+        self._counters = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped": 0,
+            "backpressure_waits": 0,
+            "batches": 0,
+            "write_errors": 0,
+            "index_errors": 0,
+        }
+        atexit.register(self.close)
+
+    def submit(self, entry: Dict[str, Any]) -> bool:
+        """
+        Queue an entry for writing.
+
+        Returns:
+            bool: False if the entry was dropped because the queue stayed full
+        """
+        if self.synchronous or self._closed:
+            self._write([entry])
+            return True
+
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            if self.block_timeout <= 0:
+                self._count("dropped")
+                return False
+            self._count("backpressure_waits")
+            try:
+                self._queue.put(entry, timeout=self.block_timeout)
+            except queue.Full:
+                self._count("dropped")
+                return False
+        self._count("enqueued")
+        return True
+
+    def submit_many(self, entries: List[Dict[str, Any]]) -> int:
+        """
+        Queue several entries, e.g. the results of a batch request.
+
+        Returns:
+            int: Number of entries accepted
+        """
+        if self.synchronous or self._closed:
+            self._write(list(entries))
+            return len(entries)
+        return sum(1 for entry in entries if self.submit(entry))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until every queued entry has been written.
+
+        Returns:
+            bool: False if the timeout expired first
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """Write everything still queued and stop the worker."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            worker = self._worker if self._pid == os.getpid() else None
+        if worker is not None and worker.is_alive():
+            self._queue.put(_SHUTDOWN)
+            worker.join(timeout)
+        for destination in [self.log] + self.indexes:
+            if hasattr(destination, "close"):
+                destination.close()
+
+    def stats(self) -> Dict[str, int]:
+        """Return a snapshot of the writer counters and current queue depth."""
+        with self._lock:
+            snapshot = dict(self._counters)
+        snapshot["queue_depth"] = self._queue.qsize()
+        return snapshot
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker is not None and self._pid == os.getpid():
+                return
+            # A worker inherited across fork() is not running in this process
+            self._worker = threading.Thread(target=self._run, name="engagement-log-writer",
+                                            daemon=True)
+            self._pid = os.getpid()
+            self._worker.start()
+
+    def _run(self) -> None:
+        stopping = False
+        while not (stopping and self._queue.empty()):
+            try:
+                first = self._queue.get(timeout=0 if stopping else self.flush_interval)
+            except queue.Empty:
+                continue
+            if first is _SHUTDOWN:
+                self._queue.task_done()
+                stopping = True
+                first = None
+
+            batch = [] if first is None else [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = 0 if stopping else deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _SHUTDOWN:
+                    self._queue.task_done()
+                    stopping = True
+                    continue
+                batch.append(item)
+
+            if batch:
+                self._write(batch)
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            self.log.append_many(batch)
+        except Exception as e:
+            print(f"Error writing engagement log: {str(e)}")
+            self._count("write_errors")
+            self._count("dropped", len(batch))
+            return
+        with self._lock:
+            self._counters["written"] += len(batch)
+            self._counters["batches"] += 1
+        # The log is the source of truth; a failed index only misses the batch
+        for index in self.indexes:
+            try:
+                index.append_many(batch)
+            except Exception as e:
+                print(f"Error indexing engagement log entries: {str(e)}")
+                self._count("index_errors")
@@ -1,21 +1,193 @@
-from flask import Flask, request, jsonify
-from query_engine import generate_insights
-import json
+from flask import Flask, request, jsonify, Response, g, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from query_engine import generate_insights, stream_insights
+import query_engine
+import metrics
+from metrics import CACHE_LOOKUPS, ERRORS, REQUEST_SECONDS, span, stats_samples
+from engagement_log import EngagementLog
+from history_store import HistoryStore, normalize_timestamp
+from log_writer import AsyncLogWriter
+from response_cache import cache_key, create_response_cache
+from semantic_cache import SemanticCache
+from relevance import load_or_bootstrap, response_text
+from single_flight import SingleFlight
+from cache_warmer import CacheWarmer
+import serialization
 import os
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
 import datetime
+import json
+import threading
+import time
 import traceback
 
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Routes jsonify and request.json through the shared fast JSON encoder."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return serialization.dumps(obj).decode("utf-8")
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        return serialization.loads(s)
+
+
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
+
+# Directory holding the append-only engagement log segments.
+# Legacy JSON-array logs can be converted with:
+#   python engagement_log.py migrate backend/user_engagement_log.json backend/user_engagement_log
+LOG_DIR = "backend/user_engagement_log"
+
+engagement_log = EngagementLog(LOG_DIR)
+
+# Indexed copy of the engagement log serving /history and /stats; filled from
+# the log on first use when the database is new. Rows reference the log's
+# response blobs, so the import does not decompress them.
+history_store = HistoryStore(
+    os.getenv("HISTORY_DB_PATH", "backend/history.sqlite3"),
+    lambda: engagement_log.iter_entries(load_responses=False),
+    log=engagement_log
+)
+
+# Entries are written by a background thread so requests never wait on disk.
+# Tests write synchronously so the log can be inspected right after a request.
+log_writer = AsyncLogWriter(engagement_log, synchronous=bool(os.getenv("TESTING")),
+                            indexes=[history_store])
+
+# Cache of generated insights keyed on the normalized (query, analysis_type)
+response_cache = create_response_cache(
+    backend=os.getenv("RESPONSE_CACHE_BACKEND", "memory"),
+    path=os.getenv("RESPONSE_CACHE_PATH", "backend/response_cache.sqlite3"),
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+)
+
+# Answers to paraphrased questions, matched on TF-IDF cosine similarity;
+# they expire with the same TTL as the response cache
+semantic_cache = SemanticCache(
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.7")),
+    max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "100000")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+)
+
+# Expired answers are served for up to this many seconds past their TTL while
+# a background refresh replaces them (0 regenerates them on the request)
+RESPONSE_CACHE_MAX_STALE = float(os.getenv("RESPONSE_CACHE_MAX_STALE", "86400"))
+
+# Hot queries kept warm in the response cache: the CACHE_WARM_TOP_N most
+# asked queries of each analysis type within CACHE_WARM_WINDOW seconds, plus
+# the example queries of the Streamlit frontend. Warming starts with the
+# server and repeats every CACHE_WARM_INTERVAL seconds. Opt-in: every process
+# with it set calls Gemini on its own, so enable it on one instance per
+# shared cache rather than in every worker.
+CACHE_WARM = os.getenv("CACHE_WARM", "false").lower() in ("1", "true", "yes")
+CACHE_WARM_TOP_N = int(os.getenv("CACHE_WARM_TOP_N", "10"))
+CACHE_WARM_WINDOW = float(os.getenv("CACHE_WARM_WINDOW", str(7 * 24 * 3600)))
+CACHE_WARM_INTERVAL = float(os.getenv("CACHE_WARM_INTERVAL", "900"))
+EXAMPLE_QUERIES_PATH = os.getenv(
+    "EXAMPLE_QUERIES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "streamlit_app", "example_queries.json")
+)
+
+# Identical queries already in flight share one Gemini call, also across
+# worker processes when SINGLE_FLIGHT_DIR is set (empty disables that).
+# A process waits at most SINGLE_FLIGHT_LOCK_TIMEOUT seconds for another
+# one answering the same query before calling Gemini itself.
+single_flight = SingleFlight(
+    directory=os.getenv("SINGLE_FLIGHT_DIR", "backend/single_flight") or None,
+    lock_timeout=float(os.getenv("SINGLE_FLIGHT_LOCK_TIMEOUT", "120"))
+)
+
+# Refreshes hot and stale answers in the background (see hot_queries)
+cache_warmer = CacheWarmer(
+    lambda query, analysis_type: refresh_insights(query, analysis_type),
+    lambda: hot_queries(),
+    lambda query, analysis_type: response_cache.expires_in(query, analysis_type),
+    interval=CACHE_WARM_INTERVAL,
+    max_workers=int(os.getenv("CACHE_WARM_CONCURRENCY", "2"))
+)
+
+# When scikit-learn, the relevance model and the LLM client are loaded:
+# 'eager' on import, 'background' in a thread started with the server (or by
+# the first request), 'lazy' on first use
+STARTUP_MODE = os.getenv("STARTUP_MODE", "lazy" if os.getenv("TESTING") else "background")
+
+# TF-IDF model for BRS, fitted once on the engagement history and refitted
+# in the background as new interactions are logged. Fits use the most recent
+# RELEVANCE_MAX_DOCUMENTS queries and responses, so only the newest entries
+# of the log are read.
+RELEVANCE_MODEL_PATH = "backend/relevance_model.pkl"
+RELEVANCE_MAX_DOCUMENTS = int(os.getenv("RELEVANCE_MAX_DOCUMENTS", "50000"))
+
+relevance_model = load_or_bootstrap(
+    RELEVANCE_MODEL_PATH,
+    lambda: engagement_log.iter_recent(RELEVANCE_MAX_DOCUMENTS // 2),
+    lazy=STARTUP_MODE != "eager",
+    max_documents=RELEVANCE_MAX_DOCUMENTS,
+    refit_interval=float(os.getenv("RELEVANCE_REFIT_INTERVAL", "3600"))
+)
+
+_warmup_thread: Optional[threading.Thread] = None
+_warmup_lock = threading.Lock()
+
+# Analysis types served by /analysis-types
+ANALYSIS_TYPES = [
+    {
+        "id": "competitive",
+        "name": "Competitive Analysis",
+        "description": "Analyzes market position, competitors, and strategic differentiators"
+    },
+    {
+        "id": "trend",
+        "name": "Trend Analysis",
+        "description": "Analyzes current trends, future predictions, and growth opportunities"
+    },
+    {
+        "id": "general",
+        "name": "General Business Analysis",
+        "description": "Provides comprehensive business insights and recommendations"
+    }
+]
+
+ANALYSIS_TYPE_IDS = [analysis_type["id"] for analysis_type in ANALYSIS_TYPES]
+
+# Limits for /generate-insights-batch
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+BATCH_ITEM_TIMEOUT = float(os.getenv("BATCH_ITEM_TIMEOUT", "120"))
+
+# Page size limits for /history
+HISTORY_DEFAULT_LIMIT = 50
+HISTORY_MAX_LIMIT = 500
+
+# Add a Server-Timing header with the per-stage breakdown to every response
+# (and the same breakdown to the final event of /generate-insights/stream)
+SERVER_TIMING = os.getenv("SERVER_TIMING", "").lower() in ("1", "true", "yes")
 
-# Path to store user interactions
-LOG_FILE = "backend/user_engagement_log.json"
+# Compress JSON and text responses of at least COMPRESS_MIN_BYTES with br
+# (if the brotli package is installed) or gzip, as the client accepts.
+# Streamed responses are sent as is so events are not held back.
+COMPRESS_RESPONSES = os.getenv("COMPRESS_RESPONSES", "true").lower() in ("1", "true", "yes")
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+
+# Seconds clients may reuse /analysis-types without revalidating it
+ANALYSIS_TYPES_MAX_AGE = int(os.getenv("ANALYSIS_TYPES_MAX_AGE", "3600"))
+
+# Sections each analysis type is expected to fill, used for RCS
+REQUIRED_SECTIONS = {
+    "competitive": ["market_position", "competitor_analysis", "differentiators", "opportunities", "threats"],
+    "trend": ["current_trends", "predictions", "opportunities", "risks", "measures"],
+    "general": ["summary", "key_points", "recommendations", "timeline", "outcomes"]
+}
 
 
 def save_user_interaction(query: str, response: Dict[str, Any], brs: float, rcs: float, analysis_type: str):
-    """Logs user queries and response scores."""
+    """Queues user queries and response scores for the engagement log."""
     log_entry = {
         "query": query,
         "response": response,
@@ -25,21 +197,7 @@ def save_user_interaction(query: str, response: Dict[str, Any], brs: float, rcs:
         "timestamp": str(datetime.datetime.now())
     }
 
-    # Create the log file if it doesn't exist
-    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
-    
-    logs = []
-    if os.path.exists(LOG_FILE):
-        try:
-            with open(LOG_FILE, "r", encoding="utf-8") as f:
-                logs = json.load(f)
-        except json.JSONDecodeError:
-            logs = []  # Reset logs if file is corrupted
-
-    logs.append(log_entry)
-
-    with open(LOG_FILE, "w", encoding="utf-8") as f:
-        json.dump(logs, f, indent=4)
+    log_writer.submit(log_entry)
 
 
 def calculate_business_relevance(query: str, response: Dict[str, Any]) -> float:
@@ -48,22 +206,9 @@ def calculate_business_relevance(query: str, response: Dict[str, Any]) -> float:
     Considers all relevant sections of the response.
     """
     try:
-        vectorizer = TfidfVectorizer(stop_words='english')
-        
-        # Combine relevant sections based on response type
-        if "market_position" in response:
-            # Competitive analysis
-            text_to_analyze = f"{response['market_position']} {' '.join(response['competitor_analysis'])}"
-        elif "current_trends" in response:
-            # Trend analysis
-            text_to_analyze = f"{' '.join(response['current_trends'])} {' '.join(response['predictions'])}"
-        else:
-            # General analysis
-            text_to_analyze = f"{response['summary']} {' '.join(response['key_points'])}"
-        
-        vectors = vectorizer.fit_transform([query, text_to_analyze])
-        similarity = cosine_similarity(vectors[0], vectors[1])[0][0]
-        return round(similarity * 100, 2)  # Convert to percentage
+        brs = relevance_model.score(query, response_text(response))
+        relevance_model.observe()
+        return brs
     except Exception as e:
         print(f"Error calculating BRS: {str(e)}")
         return 0
@@ -73,46 +218,516 @@ def calculate_response_consistency(response: Dict[str, Any], analysis_type: str)
     """
     Evaluates Response Consistency Score (RCS) based on required sections.
     """
-    if analysis_type == "competitive":
-        required_sections = ["market_position", "competitor_analysis", "differentiators", "opportunities", "threats"]
-    elif analysis_type == "trend":
-        required_sections = ["current_trends", "predictions", "opportunities", "risks", "measures"]
-    else:
-        required_sections = ["summary", "key_points", "recommendations", "timeline", "outcomes"]
-    
+    required_sections = REQUIRED_SECTIONS.get(analysis_type, REQUIRED_SECTIONS["general"])
     missing_sections = sum(1 for section in required_sections if not response.get(section))
     return {0: 100, 1: 80, 2: 60, 3: 40, 4: 20, 5: 0}.get(missing_sections, 0)
 
 
+def score_batch(items: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Computes BRS and RCS for many logged interactions at once.
+
+    Args:
+        items (List[Dict[str, Any]]): Dicts with "query", "response" and
+            optionally "analysis_type" (defaults to "general")
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: BRS and RCS arrays, one value per item
+    """
+    queries, texts, scorable = [], [], np.ones(len(items), dtype=bool)
+    missing = np.zeros(len(items), dtype=int)
+    for i, item in enumerate(items):
+        response = item.get("response") or {}
+        analysis_type = item.get("analysis_type", "general")
+        required_sections = REQUIRED_SECTIONS.get(analysis_type, REQUIRED_SECTIONS["general"])
+        missing[i] = sum(1 for section in required_sections if not response.get(section))
+        try:
+            texts.append(response_text(response))
+        except KeyError:
+            texts.append("")
+            scorable[i] = False
+        queries.append(item.get("query", ""))
+
+    brs = relevance_model.score_many(queries, texts)
+    brs[~scorable] = 0
+    rcs = np.maximum(100 - 20 * missing, 0)
+    return brs, rcs
+
+
+def lookup_cached_insights(query: str, analysis_type: str,
+                           bypass_cache: bool = False) -> Tuple[Optional[Dict[str, Any]], Optional[str], bool]:
+    """
+    Looks up a previous answer, first by exact query and then by paraphrase.
+    An expired answer is returned as stale while it is refreshed in the
+    background.
+
+    Returns:
+        Tuple[Optional[Dict[str, Any]], Optional[str], bool]: The cached
+        insights (None on a miss), for paraphrase hits the query they
+        answered, and whether the insights are stale
+    """
+    if bypass_cache:
+        CACHE_LOOKUPS.inc(analysis_type=analysis_type, result="bypass")
+        return None, None, False
+    response, stale = response_cache.lookup(query, analysis_type, RESPONSE_CACHE_MAX_STALE)
+    if response is not None:
+        if stale:
+            cache_warmer.refresh_async(query, analysis_type)
+        CACHE_LOOKUPS.inc(analysis_type=analysis_type, result="stale_revalidate" if stale else "hit")
+        return response, None, stale
+    match = semantic_cache.lookup(query, analysis_type, RESPONSE_CACHE_MAX_STALE)
+    if match:
+        if match["stale"]:
+            cache_warmer.refresh_async(match["query"], analysis_type)
+        CACHE_LOOKUPS.inc(analysis_type=analysis_type,
+                          result="semantic_stale_revalidate" if match["stale"] else "semantic_hit")
+        return match["response"], match["query"], match["stale"]
+    CACHE_LOOKUPS.inc(analysis_type=analysis_type, result="miss")
+    return None, None, False
+
+
+def stale_insights(query: str, analysis_type: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Looks up any previous answer, expired or not, to serve while Gemini is
+    unavailable (quota exhausted, overloaded or circuit breaker open).
+
+    Returns:
+        Tuple[Optional[Dict[str, Any]], Optional[str]]: As ``lookup_cached_insights``
+    """
+    response = response_cache.get(query, analysis_type, allow_stale=True)
+    if response is None:
+        match = semantic_cache.lookup(query, analysis_type, float("inf"))
+        response, matched_query = (match["response"], match["query"]) if match else (None, None)
+    else:
+        matched_query = None
+    CACHE_LOOKUPS.inc(analysis_type=analysis_type, result="stale" if response is not None else "stale_miss")
+    return response, matched_query
+
+
+def cache_insights(query: str, analysis_type: str, response: Dict[str, Any]):
+    """Stores freshly generated insights in both caches."""
+    with span("cache_store", analysis_type):
+        response_cache.set(query, analysis_type, response)
+        semantic_cache.add(query, analysis_type, response)
+
+
+def refresh_insights(query: str, analysis_type: str) -> bool:
+    """Generates a fresh answer and caches it, without scoring or logging it."""
+    response = single_flight.do(cache_key(query, analysis_type),
+                                lambda: generate_insights(query, analysis_type))
+    if "error" in response:
+        return False
+    cache_insights(query, analysis_type, response)
+    return True
+
+
+def load_example_queries() -> Dict[str, List[str]]:
+    """Example queries of the Streamlit frontend per analysis type (empty if the file is missing)."""
+    try:
+        with open(EXAMPLE_QUERIES_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def hot_queries() -> List[Tuple[str, str]]:
+    """(query, analysis_type) pairs to keep warm: the most asked queries and the examples."""
+    since = str(datetime.datetime.now() - datetime.timedelta(seconds=CACHE_WARM_WINDOW))
+    examples = load_example_queries()
+    pairs: Dict[str, Tuple[str, str]] = {}
+    for analysis_type in ANALYSIS_TYPE_IDS:
+        asked = [query for query, _ in history_store.top_queries(analysis_type, CACHE_WARM_TOP_N, since)]
+        for query in asked + examples.get(analysis_type, []):
+            pairs.setdefault(cache_key(query, analysis_type), (query, analysis_type))
+    return list(pairs.values())
+
+
+def score_and_log(query: str, response: Dict[str, Any], analysis_type: str) -> Tuple[float, float]:
+    """Evaluates a response and records the interaction in the engagement log."""
+    with span("score", analysis_type):
+        brs = calculate_business_relevance(query, response)
+        rcs = calculate_response_consistency(response, analysis_type)
+    with span("log", analysis_type):
+        save_user_interaction(query, response, brs, rcs, analysis_type)
+    return brs, rcs
+
+
+def _generate_batch_item(query: str, analysis_type: str, bypass_cache: bool = False) -> Dict[str, Any]:
+    response, matched_query, stale = lookup_cached_insights(query, analysis_type, bypass_cache)
+    cached = response is not None
+    if not cached:
+        response = single_flight.do(cache_key(query, analysis_type),
+                                    lambda: generate_insights(query, analysis_type))
+        if "error" in response:
+            stale, matched_query = stale_insights(query, analysis_type) if response.get("unavailable") else (None, None)
+            if stale is None:
+                return {"status": "error", "error": response["error"]}
+            return {"status": "success", "insights": stale, "cached": True,
+                    "matched_query": matched_query, "stale": True}
+        cache_insights(query, analysis_type, response)
+    return {"status": "success", "insights": response, "cached": cached,
+            "matched_query": matched_query, "stale": stale}
+
+
+def generate_insights_batch(items: List[Dict[str, Any]], max_concurrency: int = 8,
+                            item_timeout: float = BATCH_ITEM_TIMEOUT,
+                            endpoint: str = "/generate-insights-batch") -> List[Dict[str, Any]]:
+    """
+    Generates insights for many queries with bounded parallelism.
+
+    Items are answered concurrently by at most ``max_concurrency`` threads.
+    An item that has been running for longer than ``item_timeout`` seconds is
+    reported as failed; its call is abandoned rather than interrupted.
+    Successful items are scored with ``score_batch`` and logged together.
+
+    Args:
+        items (List[Dict[str, Any]]): Dicts with "query" and optionally
+            "analysis_type" (defaults to "general") and "bypass_cache"
+        max_concurrency (int): Maximum number of concurrent Gemini calls
+        item_timeout (float): Seconds allowed per item
+        endpoint (str): Endpoint failed items are counted for
+
+    Returns:
+        List[Dict[str, Any]]: One result per item, in input order, with
+        "status" set to "success" or "error"
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    started: Dict[int, float] = {}
+
+    def run(index: int, query: str, analysis_type: str, bypass_cache: bool) -> Dict[str, Any]:
+        started[index] = time.monotonic()
+        return _generate_batch_item(query, analysis_type, bypass_cache)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="batch")
+    pending = {}
+    for index, item in enumerate(items):
+        query = str(item.get("query", "")).strip()
+        analysis_type = item.get("analysis_type", "general")
+        if not query:
+            results[index] = {"status": "error", "error": "No query provided"}
+        elif analysis_type not in ANALYSIS_TYPE_IDS:
+            results[index] = {"status": "error", "error": "Invalid analysis type"}
+        else:
+            pending[executor.submit(run, index, query, analysis_type,
+                                    bool(item.get("bypass_cache", False)))] = index
+        results[index] = dict(results[index] or {}, query=query, analysis_type=analysis_type)
+
+    try:
+        while pending:
+            now = time.monotonic()
+            for future, index in list(pending.items()):
+                if index in started and now - started[index] >= item_timeout:
+                    del pending[future]
+                    results[index].update(status="error", error="Timed out")
+            deadlines = [started[index] + item_timeout for index in pending.values() if index in started]
+            timeout = max(0.0, min(deadlines) - now) if deadlines else item_timeout
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    results[index].update(future.result())
+                except Exception as e:
+                    results[index].update(status="error", error=f"An error occurred: {str(e)}")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    score_and_log_results(results, endpoint)
+    return results
+
+
+def score_and_log_results(results: List[Dict[str, Any]], endpoint: str) -> None:
+    """
+    Scores all successful results together with ``score_batch``, adds their
+    BRS and RCS and logs them in one batch; failed results are counted.
+
+    Args:
+        results (List[Dict[str, Any]]): Results with "status", "query",
+            "analysis_type" and, on success, "insights"
+        endpoint (str): Endpoint failed results are counted for
+    """
+    succeeded = [result for result in results if result["status"] == "success"]
+    failed = len(results) - len(succeeded)
+    if failed:
+        ERRORS.inc(failed, endpoint=endpoint, kind="item")
+    if not succeeded:
+        return
+    with span("score", "batch"):
+        brs, rcs = score_batch([{"query": r["query"], "response": r["insights"],
+                                 "analysis_type": r["analysis_type"]} for r in succeeded])
+    relevance_model.observe(len(succeeded))
+    # One microsecond apart: the history index is unique on (timestamp,
+    # analysis_type, query), so repeated items must not share a timestamp
+    now = datetime.datetime.now()
+    entries = []
+    for i, (result, item_brs, item_rcs) in enumerate(zip(succeeded, brs.tolist(), rcs.tolist())):
+        result["BRS"], result["RCS"] = item_brs, item_rcs
+        entries.append({
+            "query": result["query"],
+            "response": result["insights"],
+            "BRS": item_brs,
+            "RCS": item_rcs,
+            "analysis_type": result["analysis_type"],
+            "timestamp": str(now + datetime.timedelta(microseconds=i))
+        })
+    log_writer.submit_many(entries)
+
+
+def parse_analysis_types(value: Any) -> Optional[List[str]]:
+    """
+    Reads a multi-perspective ``analysis_type``: "all" or a list of types.
+
+    Returns:
+        Optional[List[str]]: The requested types without duplicates, or None
+        if ``value`` is a single type
+
+    Raises:
+        ValueError: If the list is empty or contains an unknown type
+    """
+    if value == "all":
+        return list(ANALYSIS_TYPE_IDS)
+    if not isinstance(value, list):
+        return None
+    if not value or any(analysis_type not in ANALYSIS_TYPE_IDS for analysis_type in value):
+        raise ValueError("Invalid analysis type")
+    return list(dict.fromkeys(value))
+
+
+def multi_analysis_response(query: str, results: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], int]:
+    """
+    Builds the /generate-insights answer for several analysis types.
+
+    Returns:
+        Tuple[Dict[str, Any], int]: The payload, with one result per analysis
+        type, and the status code (500 only if every analysis failed)
+    """
+    failed = sum(1 for result in results if result["status"] == "error")
+    ok = failed < len(results)
+    return {
+        "status": "success" if ok else "error",
+        "query": query,
+        "analysis_type": [result["analysis_type"] for result in results],
+        "failed": failed,
+        "results": {
+            result["analysis_type"]: {key: value for key, value in result.items()
+                                      if key not in ("query", "analysis_type")}
+            for result in results
+        }
+    }, 200 if ok else 500
+
+
+def generate_multi_insights(query: str, analysis_types: List[str],
+                            bypass_cache: bool = False) -> List[Dict[str, Any]]:
+    """
+    Answers one query from several perspectives at once.
+
+    The analysis types are generated concurrently, so the wall-clock time is
+    close to the slowest of them, and are scored and logged together.
+
+    Returns:
+        List[Dict[str, Any]]: One result per analysis type, as returned by
+        ``generate_insights_batch``
+    """
+    items = [{"query": query, "analysis_type": analysis_type, "bypass_cache": bypass_cache}
+             for analysis_type in analysis_types]
+    return generate_insights_batch(items, max_concurrency=len(items), endpoint="/generate-insights")
+
+
+def collect_component_stats() -> List[metrics.Sample]:
+    """Counters kept by the caches, log writer, response store, cache warmer, request coalescing and rate limiter."""
+    guard_stats = query_engine.gemini_guard.stats()
+    return (
+        stats_samples("insights_response_cache", response_cache.stats(), "Response cache counters.")
+        + stats_samples("insights_semantic_cache", semantic_cache.stats(), "Semantic cache counters.")
+        + stats_samples("insights_log_writer", log_writer.stats(), "Engagement log writer counters.")
+        + stats_samples("insights_response_store", engagement_log.responses.stats(),
+                        "Logged response blobs written and deduplicated.")
+        + stats_samples("insights_single_flight", single_flight.stats(), "Request coalescing counters.")
+        + stats_samples("insights_cache_warmer", cache_warmer.stats(), "Cache warming and refresh counters.")
+        + stats_samples("insights_llm_guard", guard_stats, "LLM rate limiter and circuit breaker state.")
+        + [("insights_llm_guard_circuit_open", "1 while the circuit breaker rejects LLM calls.",
+            int(guard_stats["circuit"] == "open"), {})]
+    )
+
+
+metrics.REGISTRY.register_collector(collect_component_stats)
+
+
+def warmup() -> float:
+    """
+    Load what the first request would otherwise wait for: the relevance
+    model, the semantic cache tokenizer (both import scikit-learn) and the
+    LLM client and API configuration.
+
+    Returns:
+        float: Seconds spent
+    """
+    started = time.perf_counter()
+    relevance_model.ensure_loaded()
+    semantic_cache.warmup()
+    query_engine.get_backend().warmup()
+    return time.perf_counter() - started
+
+
+def _background_warmup() -> None:
+    try:
+        print(f"Warmup finished in {warmup():.2f}s")
+    except Exception as e:
+        print(f"Error warming up: {str(e)}")
+
+
+def start_warmup() -> Optional[threading.Thread]:
+    """
+    Start warming the response cache (if CACHE_WARM is set) and the
+    background warmup (only in 'background' mode) once per process.
+    """
+    global _warmup_thread
+    if CACHE_WARM:
+        cache_warmer.start()
+    if STARTUP_MODE != "background":
+        return None
+    with _warmup_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=_background_warmup, name="warmup", daemon=True)
+            _warmup_thread.start()
+    return _warmup_thread
+
+
+@app.before_request
+def start_background_warmup():
+    # Covers servers that import the app without running __main__ (gunicorn, ...)
+    if _warmup_thread is None:
+        start_warmup()
+
+
+@app.before_request
+def start_request_timings():
+    metrics.start_request()
+    g.analysis_type = ""
+
+
+@app.after_request
+def record_request_timings(response: Response) -> Response:
+    timings = metrics.current_timings()
+    # The stream endpoint is timed when its last event has been sent. Error
+    # responses raised by routing (404, 405) count as streamed too, so the
+    # endpoint is checked rather than response.is_streamed
+    if timings is not None and request.endpoint not in ("get_metrics", "stream_insights_endpoint"):
+        # The route pattern rather than the path, so arbitrary URLs (scanners,
+        # typos) cannot create a new label set each
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        REQUEST_SECONDS.observe(timings.elapsed(), endpoint=endpoint,
+                                analysis_type=g.analysis_type, status=str(response.status_code))
+        if SERVER_TIMING:
+            response.headers["Server-Timing"] = timings.header()
+    return response
+
+
+@app.after_request
+def compress_response(response: Response) -> Response:
+    """Compress large JSON and text bodies with the best coding the client accepts."""
+    if (not COMPRESS_RESPONSES or response.is_streamed or response.direct_passthrough
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in serialization.COMPRESSIBLE_TYPES):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = serialization.negotiate_encoding(request.headers.get("Accept-Encoding"))
+    if encoding is not None:
+        response.set_data(serialization.compress(data, encoding))
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def conditional_json(payload: Dict[str, Any], max_age: int = 0) -> Response:
+    """
+    JSON response with a weak ETag, answered with 304 Not Modified when the
+    client's If-None-Match names the same body.
+
+    Args:
+        payload (Dict[str, Any]): Response body
+        max_age (int): Seconds clients may reuse the response; 0 makes them
+            revalidate every time
+    """
+    response = jsonify(payload)
+    response.add_etag(weak=True)
+    if max_age:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@app.teardown_request
+def end_request_timings(error: Optional[BaseException] = None):
+    metrics.end_request()
+
+
 @app.route('/generate-insights', methods=['POST'])
 def get_insights():
     """Handles user queries and returns AI-generated business insights with scores."""
     try:
         data = request.json
         if not data:
+            ERRORS.inc(endpoint="/generate-insights", kind="bad_request")
             return jsonify({"error": "No JSON data provided"}), 400
 
         query = data.get("query", "").strip()
         if not query:
+            ERRORS.inc(endpoint="/generate-insights", kind="bad_request")
             return jsonify({"error": "No query provided"}), 400
 
         analysis_type = data.get("analysis_type", "general")
-        if analysis_type not in ["competitive", "trend", "general"]:
+        bypass_cache = bool(data.get("bypass_cache", False))
+        try:
+            analysis_types = parse_analysis_types(analysis_type)
+        except ValueError as e:
+            ERRORS.inc(endpoint="/generate-insights", kind="bad_request")
+            return jsonify({"error": str(e)}), 400
+
+        # Several perspectives of the same query, generated concurrently
+        if analysis_types is not None:
+            g.analysis_type = "multi"
+            results = generate_multi_insights(query, analysis_types, bypass_cache)
+            payload, status_code = multi_analysis_response(query, results)
+            return jsonify(payload), status_code
+
+        if analysis_type not in ANALYSIS_TYPE_IDS:
+            ERRORS.inc(endpoint="/generate-insights", kind="bad_request")
             return jsonify({"error": "Invalid analysis type"}), 400
+        g.analysis_type = analysis_type
 
-        # Generate AI insights
-        response = generate_insights(query, analysis_type)
-        
-        # Check for error in response
-        if "error" in response:
-            return jsonify({"error": response["error"]}), 500
+        # Serve repeated questions from the cache
+        with span("cache", analysis_type):
+            response, matched_query, stale = lookup_cached_insights(query, analysis_type, bypass_cache)
+        cached = response is not None
 
-        # Evaluate response
-        brs = calculate_business_relevance(query, response)
-        rcs = calculate_response_consistency(response, analysis_type)
+        if not cached:
+            # Generate AI insights, sharing the call with identical requests in flight
+            # ("generate" includes waiting on a coalesced call, "llm" and "parse")
+            with span("generate", analysis_type):
+                response = single_flight.do(cache_key(query, analysis_type),
+                                            lambda: generate_insights(query, analysis_type))
 
-        # Log user engagement
-        save_user_interaction(query, response, brs, rcs, analysis_type)
+            # Check for error in response
+            if "error" in response:
+                if not response.get("unavailable"):
+                    ERRORS.inc(endpoint="/generate-insights", kind="llm")
+                    return jsonify({"error": response["error"]}), 500
+                # Gemini is unavailable: fall back to an earlier answer if there is one
+                error = response["error"]
+                response, matched_query = stale_insights(query, analysis_type)
+                if response is None:
+                    ERRORS.inc(endpoint="/generate-insights", kind="unavailable")
+                    return jsonify({"error": error}), 503
+                cached = stale = True
+            else:
+                cache_insights(query, analysis_type, response)
+
+        brs, rcs = score_and_log(query, response, analysis_type)
 
         return jsonify({
             "status": "success",
@@ -120,41 +735,292 @@ def get_insights():
             "analysis_type": analysis_type,
             "insights": response,
             "BRS": brs,
-            "RCS": rcs
+            "RCS": rcs,
+            "cached": cached,
+            "matched_query": matched_query,
+            "stale": stale
+        })
+
+    except Exception as e:
+        ERRORS.inc(endpoint="/generate-insights", kind="exception")
+        print(f"Error in get_insights: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+
+@app.route('/generate-insights/stream', methods=['POST'])
+def stream_insights_endpoint():
+    """
+    Streams insights as newline-delimited JSON events.
+
+    Emits ``{"event": "section", "section": ..., "content": ...}`` as each
+    section is completed by the model, then a final ``{"event": "complete",
+    ...}`` carrying the same fields as /generate-insights, or an
+    ``{"event": "error", "error": ...}``. While Gemini is unavailable, an
+    earlier answer is replayed instead when there is one.
+
+    Every stream ends with exactly one "complete" or "error" event. An error
+    after sections were already sent carries ``"partial": true`` and the
+    keys of those sections, so clients can tell a truncated answer from a
+    finished one; truncated answers are neither cached nor logged.
+
+    Streamed requests are not coalesced through ``single_flight``: each
+    client reads its own model stream. Identical streamed queries are only
+    shared once the first one has completed and its answer is cached.
+    """
+    data = request.json
+    if not data:
+        ERRORS.inc(endpoint="/generate-insights/stream", kind="bad_request")
+        return jsonify({"error": "No JSON data provided"}), 400
+
+    query = data.get("query", "").strip()
+    if not query:
+        ERRORS.inc(endpoint="/generate-insights/stream", kind="bad_request")
+        return jsonify({"error": "No query provided"}), 400
+
+    analysis_type = data.get("analysis_type", "general")
+    if analysis_type not in ANALYSIS_TYPE_IDS:
+        ERRORS.inc(endpoint="/generate-insights/stream", kind="bad_request")
+        return jsonify({"error": "Invalid analysis type"}), 400
+    g.analysis_type = analysis_type
+
+    bypass_cache = bool(data.get("bypass_cache", False))
+    timings = metrics.current_timings()
+
+    def event(payload: Dict[str, Any]) -> str:
+        return serialization.dumps(payload).decode("utf-8") + "\n"
+
+    # Keys of the sections already sent, reported if the stream fails
+    sent: List[str] = []
+
+    def error_event(message: str) -> str:
+        return event({"event": "error", "error": message, "partial": bool(sent), "sections": sent})
+
+    def events():
+        status = "error"
+        if timings is not None:
+            metrics.start_request(timings)
+        try:
+            with span("cache", analysis_type):
+                response, matched_query, stale = lookup_cached_insights(query, analysis_type, bypass_cache)
+            cached = response is not None
+
+            if not cached:
+                streamed = False
+                for update in stream_insights(query, analysis_type):
+                    if "error" in update:
+                        if streamed or not update.get("unavailable"):
+                            ERRORS.inc(endpoint="/generate-insights/stream",
+                                       kind="llm_midstream" if streamed else "llm")
+                            yield error_event(update["error"])
+                            return
+                        response, matched_query = stale_insights(query, analysis_type)
+                        if response is None:
+                            ERRORS.inc(endpoint="/generate-insights/stream", kind="unavailable")
+                            yield error_event(update["error"])
+                            return
+                        cached = stale = True
+                        break
+                    if "section" in update:
+                        streamed = True
+                        sent.append(update["section"])
+                        yield event({"event": "section", **update})
+                    else:
+                        response = update["insights"]
+                if not stale:
+                    cache_insights(query, analysis_type, response)
+
+            if cached:
+                for section, content in response.items():
+                    sent.append(section)
+                    yield event({"event": "section", "section": section, "content": content})
+
+            brs, rcs = score_and_log(query, response, analysis_type)
+
+            complete = {
+                "event": "complete",
+                "status": "success",
+                "query": query,
+                "analysis_type": analysis_type,
+                "insights": response,
+                "BRS": brs,
+                "RCS": rcs,
+                "cached": cached,
+                "matched_query": matched_query,
+                "stale": stale
+            }
+            if SERVER_TIMING and timings is not None:
+                complete["server_timing"] = timings.as_dict()
+            status = "200"
+            yield event(complete)
+
+        except Exception as e:
+            ERRORS.inc(endpoint="/generate-insights/stream", kind="exception")
+            print(f"Error in stream_insights_endpoint: {str(e)}\n{traceback.format_exc()}")
+            yield error_event(f"An error occurred: {str(e)}")
+        finally:
+            if timings is not None:
+                REQUEST_SECONDS.observe(timings.elapsed(), endpoint="/generate-insights/stream",
+                                        analysis_type=analysis_type, status=status)
+
+    return Response(stream_with_context(events()), mimetype="application/x-ndjson")
+
+
+@app.route('/generate-insights-batch', methods=['POST'])
+def get_insights_batch():
+    """Answers many queries in one request with bounded parallelism."""
+    try:
+        data = request.json
+        if not data:
+            return jsonify({"error": "No JSON data provided"}), 400
+
+        items = data.get("items")
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "No items provided"}), 400
+        if len(items) > BATCH_MAX_ITEMS:
+            return jsonify({"error": f"At most {BATCH_MAX_ITEMS} items per batch"}), 400
+        if not all(isinstance(item, dict) for item in items):
+            return jsonify({"error": "Each item must be an object"}), 400
+
+        try:
+            max_concurrency = int(data.get("max_concurrency", 8))
+            item_timeout = float(data.get("timeout", BATCH_ITEM_TIMEOUT))
+        except (TypeError, ValueError):
+            return jsonify({"error": "max_concurrency and timeout must be numbers"}), 400
+        if max_concurrency < 1:
+            return jsonify({"error": "max_concurrency must be at least 1"}), 400
+        if not 0 < item_timeout < float("inf"):
+            return jsonify({"error": "timeout must be a positive number of seconds"}), 400
+        max_concurrency = min(max_concurrency, BATCH_MAX_CONCURRENCY)
+
+        results = generate_insights_batch(items, max_concurrency, item_timeout)
+        return jsonify({
+            "status": "success",
+            "count": len(results),
+            "failed": sum(1 for result in results if result["status"] == "error"),
+            "results": results
         })
 
     except Exception as e:
-        error_trace = traceback.format_exc()
-        print(f"Error in get_insights: {str(e)}\n{error_trace}")
+        ERRORS.inc(endpoint="/generate-insights-batch", kind="exception")
+        print(f"Error in get_insights_batch: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+
+@app.route('/score-batch', methods=['POST'])
+def post_score_batch():
+    """Re-scores a batch of query/response pairs."""
+    try:
+        data = request.json
+        if not data:
+            return jsonify({"error": "No JSON data provided"}), 400
+
+        items = data.get("items")
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "No items provided"}), 400
+        if not all(isinstance(item, dict) and isinstance(item.get("response"), dict) for item in items):
+            return jsonify({"error": "Each item needs a query and a response object"}), 400
+
+        brs, rcs = score_batch(items)
         return jsonify({
-            "error": f"An error occurred: {str(e)}",
-            "details": error_trace
-        }), 500
+            "status": "success",
+            "count": len(items),
+            "BRS": brs.tolist(),
+            "RCS": rcs.tolist()
+        })
+
+    except Exception as e:
+        ERRORS.inc(endpoint="/score-batch", kind="exception")
+        print(f"Error in post_score_batch: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+
+def history_filters(args) -> Dict[str, Any]:
+    """
+    Reads the /history and /stats filters from the query string.
+
+    Raises:
+        ValueError: If a filter has an invalid value
+    """
+    filters: Dict[str, Any] = {}
+    analysis_type = args.get("analysis_type")
+    if analysis_type is not None:
+        if analysis_type not in ANALYSIS_TYPE_IDS:
+            raise ValueError("Invalid analysis type")
+        filters["analysis_type"] = analysis_type
+    for name in ("min_brs", "max_brs", "min_rcs", "max_rcs"):
+        if args.get(name) is not None:
+            try:
+                filters[name] = float(args[name])
+            except ValueError:
+                raise ValueError(f"Invalid {name}")
+    for name in ("since", "until"):
+        if args.get(name) is not None:
+            try:
+                datetime.datetime.fromisoformat(normalize_timestamp(args[name]))
+            except ValueError:
+                raise ValueError(f"Invalid {name}, expected an ISO date or timestamp")
+            filters[name] = args[name]
+    return filters
+
+
+@app.route('/history', methods=['GET'])
+def get_history():
+    """Returns logged interactions, newest first, filtered and paginated with a cursor."""
+    try:
+        filters = history_filters(request.args)
+        limit = request.args.get("limit", str(HISTORY_DEFAULT_LIMIT))
+        if not limit.isdigit() or not 1 <= int(limit) <= HISTORY_MAX_LIMIT:
+            raise ValueError(f"limit must be between 1 and {HISTORY_MAX_LIMIT}")
+        items, next_cursor = history_store.query(int(limit), request.args.get("cursor"), **filters)
+    except ValueError as e:
+        ERRORS.inc(endpoint="/history", kind="bad_request")
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        ERRORS.inc(endpoint="/history", kind="exception")
+        print(f"Error in get_history: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+    return conditional_json({
+        "status": "success",
+        "count": len(items),
+        "items": items,
+        "next_cursor": next_cursor
+    })
+
+
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    """Returns BRS/RCS distributions over the logged interactions matching the filters."""
+    try:
+        filters = history_filters(request.args)
+        stats = history_store.stats(**filters)
+    except ValueError as e:
+        ERRORS.inc(endpoint="/stats", kind="bad_request")
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        ERRORS.inc(endpoint="/stats", kind="exception")
+        print(f"Error in get_stats: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+    return conditional_json({"status": "success", **stats})
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Exposes request, stage, cache, token and error metrics in the Prometheus text format."""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
 
 
 @app.route('/analysis-types', methods=['GET'])
 def get_analysis_types():
     """Returns available analysis types and their descriptions."""
-    return jsonify({
-        "analysis_types": [
-            {
-                "id": "competitive",
-                "name": "Competitive Analysis",
-                "description": "Analyzes market position, competitors, and strategic differentiators"
-            },
-            {
-                "id": "trend",
-                "name": "Trend Analysis",
-                "description": "Analyzes current trends, future predictions, and growth opportunities"
-            },
-            {
-                "id": "general",
-                "name": "General Business Analysis",
-                "description": "Provides comprehensive business insights and recommendations"
-            }
-        ]
-    })
+    return conditional_json({"analysis_types": ANALYSIS_TYPES}, ANALYSIS_TYPES_MAX_AGE)
+
+
+if STARTUP_MODE == "eager":
+    warmup()
 
 
 if __name__ == '__main__':
+    start_warmup()
     app.run(host='0.0.0.0', port=8000, debug=True)
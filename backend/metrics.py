@@ -0,0 +1,278 @@
+"""
+Request instrumentation rendered in the Prometheus text format.
+
+Stages of a request are timed with ``span``; each span is recorded in a
+histogram labelled by stage and analysis type and, while a request is being
+handled, in that request's ``RequestTimings`` so the breakdown can be
+returned in a ``Server-Timing`` header. Counters cover cache lookups, LLM
+tokens and errors; components that already keep counters (caches, log
+writer, rate limiter) are exported through collectors called at scrape time.
+"""
+
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers in-process stages (sub-millisecond) up to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+# (metric name, help text, value, labels) reported by a collector as a gauge
+Sample = Tuple[str, str, float, Dict[str, str]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets per label combination."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return int(sum(state[:-1])) if state else 0
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metrics and collectors and renders them for a scrape."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        """Add a function returning gauge samples, called on every scrape."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+
+        gauges: Dict[str, Tuple[str, List[Tuple[Dict[str, str], float]]]] = {}
+        for collector in self._collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                print(f"Error collecting metrics: {str(e)}")
+                continue
+            for name, help_text, value, labels in samples:
+                gauges.setdefault(name, (help_text, []))[1].append((labels, value))
+        for name, (help_text, samples) in gauges.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                names = sorted(labels)
+                lines.append(f"{name}{_format_labels(names, [labels[n] for n in names])} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class RequestTimings:
+    """Stage durations of one request, in the order the stages first ran."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def as_dict(self) -> Dict[str, float]:
+        """Stage durations in milliseconds, including the total so far."""
+        with self._lock:
+            timings = {stage: round(seconds * 1000, 3) for stage, seconds in self.stages.items()}
+        timings["total"] = round(self.elapsed() * 1000, 3)
+        return timings
+
+    def header(self) -> str:
+        """Value of a ``Server-Timing`` header."""
+        return ", ".join(f"{stage};dur={ms}" for stage, ms in self.as_dict().items())
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "insights_stage_seconds", "Time spent in each stage of a request.", ("stage", "analysis_type"))
+REQUEST_SECONDS = REGISTRY.histogram(
+    "insights_request_seconds", "End-to-end request latency.", ("endpoint", "analysis_type", "status"))
+CACHE_LOOKUPS = REGISTRY.counter(
+    "insights_cache_lookups_total", "Cache lookups by result (hit, semantic_hit, miss, stale).",
+    ("analysis_type", "result"))
+LLM_TOKENS = REGISTRY.counter(
+    "insights_llm_tokens_total",
+    "LLM tokens: estimated and output_cap before a call, actual and actual_output after it.",
+    ("analysis_type", "tier", "kind"))
+RESPONSE_FORMATS = REGISTRY.counter(
+    "insights_response_formats_total",
+    "Parsed model answers by format (json, text_fallback for JSON that did not validate, text).",
+    ("analysis_type", "format"))
+RESPONSE_SECTIONS = REGISTRY.counter(
+    "insights_response_sections_total", "Sections of parsed model answers by whether they have content.",
+    ("analysis_type", "filled"))
+ERRORS = REGISTRY.counter(
+    "insights_errors_total", "Failed requests by endpoint and kind.", ("endpoint", "kind"))
+
+_current_timings: "contextvars.ContextVar[Optional[RequestTimings]]" = contextvars.ContextVar(
+    "request_timings", default=None)
+
+
+def start_request(timings: Optional[RequestTimings] = None) -> RequestTimings:
+    """
+    Start collecting stage timings for the request handled in this context.
+
+    Pass the request's existing ``timings`` to continue collecting in another
+    context, e.g. in a generator streaming the response.
+    """
+    timings = timings or RequestTimings()
+    _current_timings.set(timings)
+    return timings
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current_timings.get()
+
+
+def end_request() -> None:
+    _current_timings.set(None)
+
+
+@contextmanager
+def span(stage: str, analysis_type: str = "") -> Iterator[None]:
+    """Time a stage into ``STAGE_SECONDS`` and the current request's timings."""
+    timings = _current_timings.get()
+    if timings is not None:
+        # Register the stage now so stages are listed in the order they started
+        timings.add(stage, 0.0)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(seconds, stage=stage, analysis_type=analysis_type)
+        if timings is not None:
+            timings.add(stage, seconds)
+
+
+def stats_samples(prefix: str, stats: Dict[str, object], help_text: str,
+                  labels: Optional[Dict[str, str]] = None) -> List[Sample]:
+    """Turn a component's ``stats()`` dict into gauge samples named ``<prefix>_<key>``."""
+    samples = []
+    for key, value in stats.items():
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, (int, float)):
+            samples.append((f"{prefix}_{key}", help_text, value, dict(labels or {})))
+    return samples
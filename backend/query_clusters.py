@@ -0,0 +1,189 @@
+"""
+Offline clustering of the queries in the engagement log.
+
+The log is streamed three times and never loaded as a whole:
+
+1. a TF-IDF vectorizer (the one BRS uses, see ``relevance.RelevanceModel``)
+   is fitted on the most recent ``vocabulary_size`` queries,
+2. MiniBatchKMeans is trained with ``partial_fit`` on chunks of queries,
+3. every query is assigned to its cluster to count it, average its BRS and
+   RCS and keep the queries closest to the cluster centre as representatives.
+
+Memory is bounded by the vectorizer sample, one chunk and a few
+representatives per cluster, whatever the size of the log. Response bodies
+are not read.
+
+Run with:
+    cd backend
+    python query_clusters.py backend/user_engagement_log --clusters 20 --output clusters.json
+"""
+
+import argparse
+import heapq
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+try:
+    from .engagement_log import EngagementLog
+    from .relevance import RelevanceModel
+    from .response_cache import normalize_query
+except ImportError:
+    from engagement_log import EngagementLog
+    from relevance import RelevanceModel
+    from response_cache import normalize_query
+
+
+def _chunks(entries: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Group entries with a non-empty query into lists of ``size``."""
+    chunk = []
+    for entry in entries:
+        if str(entry.get("query") or "").strip():
+            chunk.append(entry)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def _scores(chunk: List[Dict[str, Any]], name: str) -> np.ndarray:
+    return np.array([entry[name] if isinstance(entry.get(name), (int, float)) else np.nan
+                     for entry in chunk], dtype=float)
+
+
+def cluster_queries(entries_source: Callable[[], Iterable[Dict[str, Any]]], n_clusters: int = 20,
+                    chunk_size: int = 10000, vocabulary_size: int = 50000,
+                    representatives: int = 5, top_terms: int = 5,
+                    random_state: Optional[int] = 0) -> Dict[str, Any]:
+    """
+    Cluster the logged queries.
+
+    Args:
+        entries_source (Callable[[], Iterable[Dict[str, Any]]]): Returns the
+            logged interactions; called once per pass
+        n_clusters (int): Number of clusters (fewer if there are fewer queries)
+        chunk_size (int): Queries vectorized and clustered at once
+        vocabulary_size (int): Most recent queries the vectorizer is fitted on
+        representatives (int): Distinct queries closest to the centre kept per cluster
+        top_terms (int): Highest-weighted centre terms reported per cluster
+        random_state (Optional[int]): Seed of the clustering
+
+    Returns:
+        Dict[str, Any]: Number of clustered entries and the clusters, most
+        frequent first, with count, share, mean BRS/RCS, top terms and
+        representative queries
+    """
+    from sklearn.cluster import MiniBatchKMeans
+
+    # Pass 1: vocabulary
+    model = RelevanceModel(max_documents=vocabulary_size)
+    if not model.fit(str(entry.get("query") or "") for entry in entries_source()):
+        return {"entries": 0, "clusters": []}
+    vectorizer = model.vectorizer
+
+    # Pass 2: train on chunks; the first partial_fit needs n_clusters samples.
+    # partial_fit seeds the centres once, with k-means++ on the first chunk,
+    # and never restarts, so a single initialization is all there is.
+    kmeans = None
+    pending: List[Dict[str, Any]] = []
+    for chunk in _chunks(entries_source(), chunk_size):
+        pending.extend(chunk)
+        if len(pending) < n_clusters:
+            continue
+        if kmeans is None:
+            kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state,
+                                     init="k-means++", n_init=1)
+        kmeans.partial_fit(vectorizer.transform([entry["query"] for entry in pending]))
+        pending = []
+    if kmeans is None:
+        if not pending:
+            return {"entries": 0, "clusters": []}
+        kmeans = MiniBatchKMeans(n_clusters=len(pending), random_state=random_state,
+                                 init="k-means++", n_init=1)
+        kmeans.partial_fit(vectorizer.transform([entry["query"] for entry in pending]))
+    elif pending:
+        kmeans.partial_fit(vectorizer.transform([entry["query"] for entry in pending]))
+
+    # Pass 3: assign, aggregate and pick representatives
+    k = kmeans.n_clusters
+    counts = np.zeros(k, dtype=np.int64)
+    sums = {name: np.zeros(k) for name in ("BRS", "RCS")}
+    scored = {name: np.zeros(k, dtype=np.int64) for name in ("BRS", "RCS")}
+    # Per cluster: max-heap (by distance) of the closest distinct queries
+    closest: List[List[tuple]] = [[] for _ in range(k)]
+    seen: List[Dict[str, float]] = [{} for _ in range(k)]
+
+    for chunk in _chunks(entries_source(), chunk_size):
+        distances = kmeans.transform(vectorizer.transform([entry["query"] for entry in chunk]))
+        labels = distances.argmin(axis=1)
+        nearest = distances[np.arange(len(chunk)), labels]
+        counts += np.bincount(labels, minlength=k)
+        for name in ("BRS", "RCS"):
+            values = _scores(chunk, name)
+            valid = ~np.isnan(values)
+            sums[name] += np.bincount(labels[valid], weights=values[valid], minlength=k)
+            scored[name] += np.bincount(labels[valid], minlength=k)
+
+        for entry, label, distance in zip(chunk, labels.tolist(), nearest.tolist()):
+            heap, known = closest[label], seen[label]
+            key = normalize_query(entry["query"])
+            if key in known:
+                continue
+            if len(heap) < representatives:
+                heapq.heappush(heap, (-distance, key, entry["query"]))
+                known[key] = distance
+            elif distance < -heap[0][0]:
+                _, dropped, _ = heapq.heapreplace(heap, (-distance, key, entry["query"]))
+                del known[dropped]
+                known[key] = distance
+
+    terms = vectorizer.get_feature_names_out()
+    total = int(counts.sum())
+    clusters = []
+    for label in np.argsort(-counts, kind="stable").tolist():
+        if not counts[label]:
+            continue
+        centre = kmeans.cluster_centers_[label]
+        clusters.append({
+            "cluster": label,
+            "count": int(counts[label]),
+            "share": round(counts[label] / total, 4),
+            "mean_BRS": round(sums["BRS"][label] / scored["BRS"][label], 2) if scored["BRS"][label] else None,
+            "mean_RCS": round(sums["RCS"][label] / scored["RCS"][label], 2) if scored["RCS"][label] else None,
+            "top_terms": [terms[i] for i in np.argsort(-centre)[:top_terms] if centre[i] > 0],
+            "representative_queries": [query for _, _, query in sorted(closest[label], reverse=True)],
+        })
+    return {"entries": total, "clusters": clusters}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Cluster the queries of the engagement log")
+    parser.add_argument("directory", help="Engagement log segment directory")
+    parser.add_argument("--clusters", type=int, default=20, help="Number of clusters")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Queries clustered at once")
+    parser.add_argument("--vocabulary-size", type=int, default=50000,
+                        help="Most recent queries the TF-IDF vocabulary is fitted on")
+    parser.add_argument("--representatives", type=int, default=5, help="Representative queries per cluster")
+    parser.add_argument("--output", help="Write the clusters as JSON to this file")
+    args = parser.parse_args(argv)
+
+    log = EngagementLog(args.directory)
+    result = cluster_queries(lambda: log.iter_entries(load_responses=False), args.clusters,
+                             args.chunk_size, args.vocabulary_size, args.representatives)
+
+    print(f"{result['entries']} queries in {len(result['clusters'])} clusters")
+    for cluster in result["clusters"]:
+        print(f"\n#{cluster['cluster']}: {cluster['count']} queries ({cluster['share']:.1%}), "
+              f"BRS {cluster['mean_BRS']}, RCS {cluster['mean_RCS']}, terms: {', '.join(cluster['top_terms'])}")
+        for query in cluster["representative_queries"]:
+            print(f"  - {query}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
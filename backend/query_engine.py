@@ -2,28 +2,217 @@
 AI-powered query engine for business insights generation.
 """
 
-import google.generativeai as genai
 import os
 import re
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Any, Tuple
 
-def configure_gemini_api():
-    """Configure the Gemini API with the API key."""
-    try:
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            # In test mode, return without raising error
-            if os.getenv("TESTING"):
-                return
-            raise ValueError("GOOGLE_API_KEY environment variable is not set! Please check your .env file.")
-        
-        genai.configure(api_key=api_key)
-    except Exception as e:
-        if not os.getenv("TESTING"):
-            raise ValueError(f"Failed to configure Gemini API: {str(e)}")
+try:
+    from .llm_backends import Completion, LLMBackend, create_llm_backend
+    from .metrics import LLM_TOKENS, RESPONSE_FORMATS, RESPONSE_SECTIONS, span
+    from .rate_limit import CircuitOpenError, GeminiGuard, is_retryable
+    from .serialization import loads
+except ImportError:  # imported as a top-level module from backend/
+    from llm_backends import Completion, LLMBackend, create_llm_backend
+    from metrics import LLM_TOKENS, RESPONSE_FORMATS, RESPONSE_SECTIONS, span
+    from rate_limit import CircuitOpenError, GeminiGuard, is_retryable
+    from serialization import loads
+
+# Gemini model used for all analysis types
+MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+
+# Backend generating the answers: 'gemini', or 'fake' for the offline
+# stand-in used by the tests and for load testing
+LLM_BACKEND = os.getenv("LLM_BACKEND", "fake" if os.getenv("TESTING") else "gemini")
+
+# Client-side flow control for Gemini calls: request and token quotas,
+# adaptive concurrency, retries with backoff and a circuit breaker
+# (quotas default to unlimited for the fake backend)
+gemini_guard = GeminiGuard(
+    requests_per_minute=float(os.getenv("GEMINI_RPM", "60" if LLM_BACKEND == "gemini" else "0")),
+    tokens_per_minute=float(os.getenv("GEMINI_TPM", "1000000" if LLM_BACKEND == "gemini" else "0")),
+    max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "16")),
+    max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "3")),
+    failure_threshold=int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5")),
+    reset_timeout=float(os.getenv("GEMINI_BREAKER_RESET", "30"))
+)
+
+# Output tokens charged against the token quota before a call (at most the
+# call's output cap); the charge is corrected from the response's usage
+# metadata afterwards
+EXPECTED_OUTPUT_TOKENS = int(os.getenv("GEMINI_EXPECTED_OUTPUT_TOKENS", "1024"))
+
+# Cheaper, faster model answering simple queries: at most
+# SIMPLE_QUERY_MAX_WORDS words and a single question. An empty
+# GEMINI_SIMPLE_MODEL sends every query to MODEL_NAME.
+SIMPLE_MODEL_NAME = os.getenv("GEMINI_SIMPLE_MODEL", "gemini-2.0-flash-lite")
+SIMPLE_QUERY_MAX_WORDS = int(os.getenv("SIMPLE_QUERY_MAX_WORDS", "12"))
+
+# Output token cap per analysis type
+MAX_OUTPUT_TOKENS = {
+    "general": int(os.getenv("MAX_OUTPUT_TOKENS_GENERAL", "600")),
+    "competitive": int(os.getenv("MAX_OUTPUT_TOKENS_COMPETITIVE", "700")),
+    "trend": int(os.getenv("MAX_OUTPUT_TOKENS_TREND", "700")),
+}
+
+# Length limits the prompt asks for per analysis type: (bullet points per
+# list section, words per bullet point, sentences in a text section)
+SECTION_LIMITS = {
+    "general": (3, 20, 3),
+    "competitive": (4, 25, 3),
+    "trend": (4, 25, 3),
+}
+
+# What the model should focus on for each analysis type
+ANALYSIS_INSTRUCTIONS = {
+    "general": "Provide comprehensive business insights and actionable recommendations.",
+    "competitive": "Analyze the market position, competitors, and strategic differentiators.",
+    "trend": "Analyze current trends, future predictions, and growth opportunities.",
+}
+
+# Ask the model for a JSON object with one field per section (constrained
+# to a schema by Gemini) instead of free text with section headers. Answers
+# that are not valid JSON fall back to header parsing. Streamed answers are
+# always free text so sections can be shown as they arrive.
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "true").lower() in ("1", "true", "yes")
+
+# Created on first use; the Gemini API is configured when its client is
+# first needed rather than on import
+_backend: Optional[LLMBackend] = None
+
+def get_backend() -> LLMBackend:
+    """Return the language model backend, creating it on first use."""
+    global _backend
+    if _backend is None:
+        _backend = create_llm_backend(LLM_BACKEND, MODEL_NAME)
+    return _backend
+
+def set_backend(backend: Optional[LLMBackend]) -> None:
+    """Replace the language model backend (None recreates the configured one)."""
+    global _backend
+    _backend = backend
+
+def estimate_tokens(prompt: str, max_output_tokens: Optional[int] = None) -> int:
+    """Rough token count of a call: ~4 characters per prompt token plus the expected output."""
+    expected = EXPECTED_OUTPUT_TOKENS
+    if max_output_tokens:
+        expected = min(expected, max_output_tokens)
+    return len(prompt) // 4 + expected
+
+def is_simple_query(user_query: str) -> bool:
+    """Short single questions are answered by the simple model tier."""
+    query = user_query.strip()
+    return (len(query.split()) <= SIMPLE_QUERY_MAX_WORDS
+            and query.count("?") <= 1
+            and "\n" not in query)
+
+class PromptPlan:
+    """
+    A model call planned for a query: prompt, model tier and token budget.
+
+    Args:
+        prompt (str): Prompt text
+        analysis_type (str): Type of analysis requested
+        tier (str): 'simple' or 'standard'
+        model (str): Model answering the query
+        max_output_tokens (int): Cap on the generated tokens
+        response_schema (Optional[Dict[str, Any]]): Schema of the JSON answer,
+            None for a free-text answer
+    """
+
+    __slots__ = ("prompt", "analysis_type", "tier", "model", "max_output_tokens", "response_schema",
+                 "estimated_tokens")
+
+    def __init__(self, prompt: str, analysis_type: str, tier: str, model: str, max_output_tokens: int,
+                 response_schema: Optional[Dict[str, Any]] = None):
+        self.prompt = prompt
+        self.analysis_type = analysis_type
+        self.tier = tier
+        self.model = model
+        self.max_output_tokens = max_output_tokens
+        self.response_schema = response_schema
+        self.estimated_tokens = estimate_tokens(prompt, max_output_tokens)
+
+def plan_prompt(user_query: str, analysis_type: str, structured: Optional[bool] = None) -> PromptPlan:
+    """
+    Build the prompt for a query and choose its model tier and output cap.
+
+    Args:
+        user_query (str): The user's business query
+        analysis_type (str): Type of analysis to perform
+        structured (Optional[bool]): Ask for a JSON answer; defaults to
+            ``STRUCTURED_OUTPUT``
+
+    Returns:
+        PromptPlan: What to send to the backend
+    """
+    if structured is None:
+        structured = STRUCTURED_OUTPUT
+    if SIMPLE_MODEL_NAME and is_simple_query(user_query):
+        tier, model = "simple", SIMPLE_MODEL_NAME
+    else:
+        tier, model = "standard", MODEL_NAME
+    return PromptPlan(build_prompt(user_query, analysis_type, structured), analysis_type, tier, model,
+                      MAX_OUTPUT_TOKENS[analysis_type],
+                      RESPONSE_SCHEMAS[analysis_type] if structured else None)
 
-# Configure API on module import
-configure_gemini_api()
+def _used_tokens(completion: Completion) -> Optional[int]:
+    return completion.total_tokens
+
+def _record_estimate(plan: PromptPlan) -> None:
+    labels = {"analysis_type": plan.analysis_type, "tier": plan.tier}
+    LLM_TOKENS.inc(plan.estimated_tokens, kind="estimated", **labels)
+    LLM_TOKENS.inc(plan.max_output_tokens, kind="output_cap", **labels)
+
+def _record_tokens(plan: PromptPlan, completion: Completion) -> None:
+    _record_estimate(plan)
+    labels = {"analysis_type": plan.analysis_type, "tier": plan.tier}
+    if completion.total_tokens is not None:
+        LLM_TOKENS.inc(completion.total_tokens, kind="actual", **labels)
+    if completion.output_tokens is not None:
+        LLM_TOKENS.inc(completion.output_tokens, kind="actual_output", **labels)
+
+def _error_response(error: Exception) -> Dict[str, Any]:
+    """Error result; ``unavailable`` marks quota, overload and open-circuit failures."""
+    response = {"error": f"Error generating response: {str(error)}"}
+    if isinstance(error, CircuitOpenError) or is_retryable(error):
+        response["unavailable"] = True
+    return response
+
+def build_prompt(user_query: str, analysis_type: str, structured: bool = False) -> str:
+    """
+    Build the prompt asking the model for the sections of an analysis type.
+
+    Args:
+        user_query (str): The user's business query
+        analysis_type (str): Type of analysis to perform
+        structured (bool): Ask for a JSON object with one field per section
+            instead of section headers
+
+    Returns:
+        str: Prompt text
+    """
+    items, words, sentences = SECTION_LIMITS[analysis_type]
+    text_sections = " and ".join(name for key, name in SECTION_HEADERS[analysis_type]
+                                 if key in TEXT_SECTIONS)
+    if structured:
+        fields = "\n".join(
+            f"- {key}: {name} ({'text' if key in TEXT_SECTIONS else 'list of bullet points'})"
+            for key, name in SECTION_HEADERS[analysis_type])
+        layout = f"Answer with a JSON object with exactly these fields:\n{fields}"
+    else:
+        headers = "\n".join(f"{name}:" for _, name in SECTION_HEADERS[analysis_type])
+        layout = ("Structure your answer with exactly these section headers, in this order, each on "
+                  "its own line and followed by the section content as bullet points:\n"
+                  f"{headers}")
+    return (
+        "You are a Business Intelligence AI Assistant. "
+        f"{ANALYSIS_INSTRUCTIONS[analysis_type]}\n\n"
+        f"Business query: {user_query}\n\n"
+        f"Be concise: write at most {items} bullet points per section, each under {words} words"
+        + (f", and at most {sentences} sentences for {text_sections}" if text_sections else "")
+        + ".\n"
+        + layout
+    )
 
 def generate_insights(user_query: str, analysis_type: Optional[str] = None) -> Dict[str, Any]:
     """
@@ -37,40 +226,225 @@ def generate_insights(user_query: str, analysis_type: Optional[str] = None) -> D
         Dict[str, Any]: Generated insights in structured format
     """
     try:
-        # In test mode, return mock data
-        if os.getenv("TESTING"):
-            if analysis_type == "general":
-                return {
-                    "summary": "Sample summary",
-                    "key_points": "Sample key points",
-                    "recommendations": "Sample recommendations",
-                    "timeline": "Sample timeline",
-                    "outcomes": "Sample outcomes"
-                }
-            elif analysis_type == "competitive":
-                return {
-                    "market_position": "Sample market position",
-                    "competitor_analysis": "Sample competitor analysis",
-                    "differentiators": "Sample differentiators",
-                    "opportunities": "Sample opportunities",
-                    "threats": "Sample threats"
-                }
-            elif analysis_type == "trend":
-                return {
-                    "current_trends": "Sample current trends",
-                    "predictions": "Sample predictions",
-                    "opportunities": "Sample opportunities",
-                    "risks": "Sample risks",
-                    "measures": "Sample measures"
-                }
-            else:
-                return {"error": "Invalid analysis type"}
-        
-        # Rest of the actual implementation...
-        return {"error": "Not implemented in test mode"}
+        analysis_type = analysis_type or "general"
+        if analysis_type not in SECTION_HEADERS:
+            return {"error": "Invalid analysis type"}
+
+        plan = plan_prompt(user_query, analysis_type)
+        backend = get_backend()
+        with span("llm", analysis_type):
+            completion = gemini_guard.call(
+                lambda: backend.generate(plan.prompt, plan.model, plan.max_output_tokens,
+                                         response_schema=plan.response_schema),
+                plan.estimated_tokens, _used_tokens)
+        _record_tokens(plan, completion)
+        with span("parse", analysis_type):
+            return parse_response(completion.text, analysis_type, plan.response_schema is not None)
         
     except Exception as e:
-        return {"error": f"Error generating response: {str(e)}"}
+        return _error_response(e)
+
+async def agenerate_insights(user_query: str, analysis_type: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Async variant of ``generate_insights`` for the ASGI server.
+
+    The model call is awaited instead of blocking a thread, so one process
+    can keep many requests waiting on Gemini at the same time.
+
+    Args:
+        user_query (str): The user's business query
+        analysis_type (Optional[str]): Type of analysis to perform
+
+    Returns:
+        Dict[str, Any]: Generated insights in structured format
+    """
+    try:
+        analysis_type = analysis_type or "general"
+        if analysis_type not in SECTION_HEADERS:
+            return {"error": "Invalid analysis type"}
+
+        plan = plan_prompt(user_query, analysis_type)
+        backend = get_backend()
+        with span("llm", analysis_type):
+            completion = await gemini_guard.call_async(
+                lambda: backend.agenerate(plan.prompt, plan.model, plan.max_output_tokens,
+                                          response_schema=plan.response_schema),
+                plan.estimated_tokens, _used_tokens)
+        _record_tokens(plan, completion)
+        with span("parse", analysis_type):
+            return parse_response(completion.text, analysis_type, plan.response_schema is not None)
+
+    except Exception as e:
+        return _error_response(e)
+
+# Section headers per analysis type, in the order the model is asked to emit them
+SECTION_HEADERS = {
+    "general": [
+        ("summary", "Business Insights"),
+        ("key_points", "Key Strategic Points"),
+        ("recommendations", "Actionable Recommendations"),
+        ("timeline", "Implementation Timeline"),
+        ("outcomes", "Expected Outcomes"),
+    ],
+    "competitive": [
+        ("market_position", "Market Position Analysis"),
+        ("competitor_analysis", "Competitor Strengths and Weaknesses"),
+        ("differentiators", "Strategic Differentiators"),
+        ("opportunities", "Market Opportunities"),
+        ("threats", "Potential Threats"),
+    ],
+    "trend": [
+        ("current_trends", "Current Market Trends"),
+        ("predictions", "Future Predictions"),
+        ("opportunities", "Growth Opportunities"),
+        ("risks", "Risk Factors"),
+        ("measures", "Proactive Measures"),
+    ],
+}
+
+# Sections rendered as free text; every other section is a list of items
+TEXT_SECTIONS = {"summary", "market_position"}
+
+def response_schema(analysis_type: str) -> Dict[str, Any]:
+    """Return the schema of a JSON answer: one field per section of the analysis type."""
+    keys = [key for key, _ in SECTION_HEADERS[analysis_type]]
+    return {
+        "type": "object",
+        "properties": {
+            key: {"type": "string"} if key in TEXT_SECTIONS
+            else {"type": "array", "items": {"type": "string"}}
+            for key in keys
+        },
+        "required": keys,
+    }
+
+RESPONSE_SCHEMAS = {analysis_type: response_schema(analysis_type) for analysis_type in SECTION_HEADERS}
+
+# Header name (lower case) -> (analysis type, section key)
+_HEADER_LOOKUP = {
+    name.lower(): (analysis_type, key)
+    for analysis_type, headers in SECTION_HEADERS.items()
+    for key, name in headers
+}
+
+# Matches a header line in any of the variants the model produces, e.g.
+# "📊 Business Insights:", "## Key Strategic Points", "**1. ✅ Actionable
+# Recommendations (next quarter)**" or "Expected Outcomes: inline text"
+_HEADER_PATTERN = re.compile(
+    r"^[ \t]*(?![-•*+][ \t])"
+    r"(?:#{1,6}[ \t]*)?"
+    r"(?:[*_]{1,3}[ \t]*)?"
+    r"(?:\d+[.)][ \t]*)?"
+    r"(?:[^\w\s][ \t]*)*"
+    r"(?:[*_]{1,3}[ \t]*)?"
+    r"(?P<name>" + "|".join(re.escape(name) for name in sorted(_HEADER_LOOKUP, key=len, reverse=True)) + r")\b"
+    r"(?:[ \t]*\([^)\n]*\))?"
+    r"[ \t]*(?:[*_]{1,3})?[ \t]*(?P<colon>:)?[ \t]*(?:[*_]{1,3})?[ \t]*"
+    r"(?P<rest>.*)$",
+    re.IGNORECASE,
+)
+_BULLET_PATTERN = re.compile(r"^\s*(?:[-•*+]|\d+[.)])\s+")
+_RULE_PATTERN = re.compile(r"^\s*([-*_=])\1{2,}\s*$")
+
+
+def _parse_line(line: str) -> Tuple[Optional[Tuple[str, str]], str]:
+    """Return the section a header line opens (or None) and the line's content."""
+    match = _HEADER_PATTERN.match(line)
+    if match and (match.group("colon") or not match.group("rest")):
+        return _HEADER_LOOKUP[match.group("name").lower()], match.group("rest")
+    return None, line
+
+def _is_content(line: str) -> bool:
+    return bool(line.strip()) and not _RULE_PATTERN.match(line)
+
+def _format_section(key: str, lines: List[str]) -> Any:
+    if key in TEXT_SECTIONS:
+        return "\n".join(lines)
+    return [_BULLET_PATTERN.sub("", line) for line in lines]
+
+def split_sections(text: str) -> Dict[Tuple[str, str], List[str]]:
+    """
+    Split the AI response into sections in a single pass over its lines.
+
+    Args:
+        text (str): Full response text
+
+    Returns:
+        Dict[Tuple[str, str], List[str]]: Non-empty content lines keyed by
+        ``(analysis_type, section_key)``; text before the first header is dropped
+    """
+    sections: Dict[Tuple[str, str], List[str]] = {}
+    current = None
+    for line in text.splitlines():
+        section, line = _parse_line(line)
+        if section is not None:
+            current = sections.setdefault(section, [])
+        if current is not None and _is_content(line):
+            current.append(line.strip())
+    return sections
+
+class SectionStreamParser:
+    """
+    Incremental counterpart of ``format_response`` for streamed model output.
+
+    Text chunks are fed as they arrive; a section is reported as soon as the
+    next header closes it, so it can be shown before the response is complete.
+
+    Args:
+        analysis_type (str): Type of analysis whose sections are reported
+    """
+
+    def __init__(self, analysis_type: str):
+        self.analysis_type = analysis_type
+        self.sections: Dict[Tuple[str, str], List[str]] = {}
+        self._current: Optional[Tuple[str, str]] = None
+        self._partial = ""
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Consume a chunk of model output.
+
+        Returns:
+            List[Tuple[str, Any]]: ``(section_key, content)`` for every section
+            of this analysis type closed by the chunk
+        """
+        lines = (self._partial + chunk).split("\n")
+        self._partial = lines.pop()
+        closed = []
+        for line in lines:
+            closed.extend(self._feed_line(line))
+        return closed
+
+    def close(self) -> List[Tuple[str, Any]]:
+        """Flush the remaining text and close the last open section."""
+        closed = self._feed_line(self._partial) if self._partial else []
+        self._partial = ""
+        closed.extend(self._close_current())
+        return closed
+
+    def result(self) -> Dict[str, Any]:
+        """Return the complete formatted response, as ``format_response`` would."""
+        return {
+            key: _format_section(key, self.sections.get((self.analysis_type, key), []))
+            for key, _ in SECTION_HEADERS[self.analysis_type]
+        }
+
+    def _feed_line(self, line: str) -> List[Tuple[str, Any]]:
+        section, line = _parse_line(line)
+        closed = []
+        if section is not None:
+            closed = self._close_current()
+            self._current = section
+            self.sections.setdefault(section, [])
+        if self._current is not None and _is_content(line):
+            self.sections[self._current].append(line.strip())
+        return closed
+
+    def _close_current(self) -> List[Tuple[str, Any]]:
+        section, self._current = self._current, None
+        if section is None or section[0] != self.analysis_type:
+            return []
+        return [(section[1], _format_section(section[1], self.sections[section]))]
 
 def format_response(response_text: str, analysis_type: Optional[str] = None) -> Dict[str, Any]:
     """
@@ -80,36 +454,86 @@ def format_response(response_text: str, analysis_type: Optional[str] = None) ->
         response_text (str): Raw response text from the AI model
         analysis_type (Optional[str]): Type of analysis ('general', 'competitive', or 'trend')
         
+    Returns:
+        Dict[str, Any]: Formatted response with structured sections; text
+        sections are strings, all others are lists of bullet items
+    """
+    if analysis_type not in SECTION_HEADERS:
+        return {}
+
+    sections = split_sections(response_text)
+    return {
+        key: _format_section(key, sections.get((analysis_type, key), []))
+        for key, _ in SECTION_HEADERS[analysis_type]
+    }
+
+_JSON_FENCE = re.compile(r"^\s*```(?:json)?\s*(?P<body>.*?)\s*```\s*$", re.DOTALL | re.IGNORECASE)
+
+def _structured_section(key: str, value: Any) -> Any:
+    if isinstance(value, list):
+        lines = [str(item).strip() for item in value if item is not None]
+    elif value is None:
+        lines = []
+    else:
+        lines = [line.strip() for line in str(value).splitlines()]
+    return _format_section(key, [line for line in lines if line])
+
+def parse_structured(response_text: str, analysis_type: str) -> Optional[Dict[str, Any]]:
+    """
+    Validate a JSON answer and shape it like ``format_response`` output.
+
+    Missing fields become empty sections, extra fields are dropped and list
+    items lose any bullet markers the model added.
+
+    Args:
+        response_text (str): Raw JSON answer, optionally in a ```json fence
+        analysis_type (str): Type of analysis the answer is for
+
+    Returns:
+        Optional[Dict[str, Any]]: The formatted response, or None if the text
+        is not a JSON object with any of the analysis type's sections
+    """
+    fenced = _JSON_FENCE.match(response_text)
+    text = fenced.group("body") if fenced else response_text.strip()
+    if not text.startswith("{"):
+        return None
+    try:
+        data = loads(text)
+    except ValueError:
+        return None
+    sections = SECTION_HEADERS[analysis_type]
+    if not isinstance(data, dict) or not any(key in data for key, _ in sections):
+        return None
+    return {key: _structured_section(key, data.get(key)) for key, _ in sections}
+
+def _record_sections(analysis_type: str, response_format: str, result: Dict[str, Any]) -> None:
+    RESPONSE_FORMATS.inc(analysis_type=analysis_type, format=response_format)
+    for content in result.values():
+        RESPONSE_SECTIONS.inc(analysis_type=analysis_type, filled="true" if content else "false")
+
+def parse_response(response_text: str, analysis_type: str, structured: bool = False) -> Dict[str, Any]:
+    """
+    Format a model answer, reading it as JSON first if it was asked for.
+
+    Header parsing (``format_response``) is only used for free-text answers
+    and as a fallback for JSON answers that do not validate.
+
+    Args:
+        response_text (str): Raw answer
+        analysis_type (str): Type of analysis the answer is for
+        structured (bool): The answer was requested as JSON
+
     Returns:
         Dict[str, Any]: Formatted response with structured sections
     """
-    formatted_response = {}
-    
-    if analysis_type == "general":
-        # Extract sections for general analysis
-        formatted_response["summary"] = extract_section(response_text, "Business Insights")
-        formatted_response["key_points"] = extract_section(response_text, "Key Strategic Points")
-        formatted_response["recommendations"] = extract_section(response_text, "Actionable Recommendations")
-        formatted_response["timeline"] = extract_section(response_text, "Implementation Timeline")
-        formatted_response["outcomes"] = extract_section(response_text, "Expected Outcomes")
-        
-    elif analysis_type == "competitive":
-        # Extract sections for competitive analysis
-        formatted_response["market_position"] = extract_section(response_text, "Market Position Analysis")
-        formatted_response["competitor_analysis"] = extract_section(response_text, "Competitor Strengths and Weaknesses")
-        formatted_response["differentiators"] = extract_section(response_text, "Strategic Differentiators")
-        formatted_response["opportunities"] = extract_section(response_text, "Market Opportunities")
-        formatted_response["threats"] = extract_section(response_text, "Potential Threats")
-        
-    elif analysis_type == "trend":
-        # Extract sections for trend analysis
-        formatted_response["current_trends"] = extract_section(response_text, "Current Market Trends")
-        formatted_response["predictions"] = extract_section(response_text, "Future Predictions")
-        formatted_response["opportunities"] = extract_section(response_text, "Growth Opportunities")
-        formatted_response["risks"] = extract_section(response_text, "Risk Factors")
-        formatted_response["measures"] = extract_section(response_text, "Proactive Measures")
-    
-    return formatted_response
+    result = parse_structured(response_text, analysis_type) if structured else None
+    if result is not None:
+        response_format = "json"
+    else:
+        response_format = "text_fallback" if structured else "text"
+        result = format_response(response_text, analysis_type)
+    _record_sections(analysis_type, response_format, result)
+    return result
 
 def extract_section(text: str, section_name: str) -> str:
     """
@@ -122,8 +546,50 @@ def extract_section(text: str, section_name: str) -> str:
     Returns:
         str: Extracted section content
     """
-    pattern = f"{section_name}:(.*?)(?=\n\n|$)"
-    match = re.search(pattern, text, re.DOTALL)
-    if match:
-        return match.group(1).strip()
-    return ""
+    section = _HEADER_LOOKUP.get(section_name.lower())
+    if section is None:
+        return ""
+    return "\n".join(split_sections(text).get(section, []))
+
+def stream_insights(user_query: str, analysis_type: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming variant of ``generate_insights``.
+
+    Args:
+        user_query (str): The user's business query
+        analysis_type (Optional[str]): Type of analysis to perform
+
+    Yields:
+        Dict[str, Any]: ``{"section": key, "content": ...}`` as soon as each
+        section is complete, then ``{"insights": {...}}`` with the full
+        structured response, or a single ``{"error": ...}``
+    """
+    analysis_type = analysis_type or "general"
+    if analysis_type not in SECTION_HEADERS:
+        yield {"error": "Invalid analysis type"}
+        return
+
+    try:
+        parser = SectionStreamParser(analysis_type)
+        plan = plan_prompt(user_query, analysis_type, structured=False)
+        backend = get_backend()
+        # Only opening the stream is guarded; errors mid-stream are not retried.
+        # "llm" covers opening the stream, "stream" receiving and parsing it
+        with span("llm", analysis_type):
+            stream = gemini_guard.call(
+                lambda: backend.stream(plan.prompt, plan.model, plan.max_output_tokens),
+                plan.estimated_tokens)
+        # Streamed responses carry no usage metadata
+        _record_estimate(plan)
+        with span("stream", analysis_type):
+            for chunk in stream:
+                for key, content in parser.feed(chunk):
+                    yield {"section": key, "content": content}
+            for key, content in parser.close():
+                yield {"section": key, "content": content}
+        result = parser.result()
+        _record_sections(analysis_type, "text", result)
+        yield {"insights": result}
+
+    except Exception as e:
+        yield _error_response(e)
@@ -0,0 +1,431 @@
+"""
+Client-side flow control for Gemini calls.
+
+``GeminiGuard`` combines:
+    - token buckets for requests and tokens per minute, so traffic stays
+      under the provider quota instead of running into it,
+    - an AIMD (additive-increase, multiplicative-decrease) concurrency limit
+      that backs off when the provider signals overload,
+    - retries with jittered exponential backoff for retryable errors,
+    - a circuit breaker that fails fast while the provider keeps failing.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+# Status codes / exception names that mean "try again later"
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_ERROR_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded",
+    "InternalServerError", "GatewayTimeout", "TimeoutError", "ConnectionError",
+}
+# Errors that mean the provider is over capacity, which shrink the concurrency limit
+OVERLOAD_STATUS_CODES = {429, 503}
+OVERLOAD_ERROR_NAMES = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable"}
+# Errors caused by the request itself, which say nothing about the provider's health
+CLIENT_ERROR_NAMES = {
+    "InvalidArgument", "BadRequest", "FailedPrecondition", "NotFound",
+    "PermissionDenied", "Unauthenticated", "Unauthorized", "Forbidden",
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the provider while the circuit breaker is open."""
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    code = getattr(error, "code", None)
+    code = getattr(code, "value", code)  # grpc status enums
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed call is worth retrying."""
+    return (type(error).__name__ in RETRYABLE_ERROR_NAMES
+            or _status_code(error) in RETRYABLE_STATUS_CODES)
+
+
+def is_overload(error: BaseException) -> bool:
+    """Whether an error signals that the provider is over capacity or quota."""
+    return (type(error).__name__ in OVERLOAD_ERROR_NAMES
+            or _status_code(error) in OVERLOAD_STATUS_CODES)
+
+
+def is_client_error(error: BaseException) -> bool:
+    """Whether a call was rejected because of the request (a non-retryable 4xx)."""
+    if is_retryable(error):
+        return False
+    code = _status_code(error)
+    return type(error).__name__ in CLIENT_ERROR_NAMES or (code is not None and 400 <= code < 500)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at ``rate_per_minute``.
+
+    ``reserve`` takes tokens immediately (the balance may go negative) and
+    returns how long the caller has to wait before using them, which lets the
+    same bucket serve blocking and asyncio callers.
+
+    Args:
+        rate_per_minute (float): Refill rate; 0 disables the limit
+        capacity (Optional[float]): Maximum burst; defaults to one minute's worth
+        clock (Callable[[], float]): Time source, overridable in tests
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1) -> float:
+        """Take ``amount`` tokens and return the seconds to wait before using them."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def adjust(self, delta: float) -> None:
+        """Return (positive) or charge (negative) tokens after the fact."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + delta)
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit.
+
+    Each success raises the limit by ``1 / limit`` (about +1 per round of
+    ``limit`` calls); each overload signal multiplies it by ``backoff``.
+
+    Asyncio callers queue in arrival order and are handed freed slots by
+    ``release``, from whichever thread frees them; blocking callers only take
+    a slot when no asyncio caller is waiting.
+
+    Args:
+        initial (int): Starting limit
+        min_limit (int): Lower bound of the limit
+        max_limit (int): Upper bound of the limit
+        backoff (float): Multiplicative decrease factor
+    """
+
+    def __init__(self, initial: int = 8, min_limit: int = 1, max_limit: int = 64,
+                 backoff: float = 0.5):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        # Waiting asyncio callers: the loop each one runs on and the future it awaits
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def try_acquire(self) -> bool:
+        with self._condition:
+            if self._free():
+                self._in_flight += 1
+                return True
+            return False
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Wait for a free slot; False if the timeout expired first."""
+        with self._condition:
+            if not self._condition.wait_for(self._free, timeout):
+                return False
+            self._in_flight += 1
+            return True
+
+    async def acquire_async(self) -> None:
+        """Wait for a free slot without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        with self._condition:
+            if self._free():
+                self._in_flight += 1
+                return
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._condition:
+                try:
+                    self._waiters.remove((loop, future))
+                    granted = False
+                except ValueError:
+                    granted = True
+            # A slot handed over before the cancellation is given back here,
+            # one handed over after it by _grant
+            if granted and future.done() and not future.cancelled():
+                self.release(success=False)
+            raise
+
+    def release(self, success: bool, overload: bool = False) -> None:
+        """Free a slot and adapt the limit to the outcome of the call."""
+        with self._condition:
+            self._in_flight -= 1
+            if overload:
+                self._limit = max(self.min_limit, self._limit * self.backoff)
+            elif success:
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            self._wake()
+            self._condition.notify_all()
+
+    def _free(self) -> bool:
+        return self._in_flight < self.limit and not self._waiters
+
+    def _wake(self) -> None:
+        # Called with the lock held: hand free slots to asyncio waiters in order
+        while self._waiters and self._in_flight < self.limit:
+            loop, future = self._waiters.popleft()
+            self._in_flight += 1
+            try:
+                loop.call_soon_threadsafe(self._grant, future)
+            except RuntimeError:  # the waiter's loop is closed
+                self._in_flight -= 1
+
+    def _grant(self, future: asyncio.Future) -> None:
+        if future.cancelled():
+            self.release(success=False)
+        else:
+            future.set_result(None)
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures and lets a single
+    trial call through once ``reset_timeout`` seconds have passed.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self.clock()
+
+
+class GeminiGuard:
+    """
+    Rate limiting, adaptive concurrency, retries and circuit breaking around
+    provider calls.
+
+    Args:
+        requests_per_minute (float): Request quota
+        tokens_per_minute (float): Token quota
+        max_concurrency (int): Upper bound for the adaptive concurrency limit
+        max_retries (int): Retries after the first attempt for retryable errors
+        base_delay (float): First backoff delay in seconds
+        max_delay (float): Cap on a single backoff delay
+        failure_threshold (int): Consecutive failures that open the circuit
+        reset_timeout (float): Seconds before an open circuit allows a trial call
+    """
+
+    def __init__(self, requests_per_minute: float = 60, tokens_per_minute: float = 1000000,
+                 max_concurrency: int = 16, max_retries: int = 3, base_delay: float = 0.5,
+                 max_delay: float = 20, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = AdaptiveConcurrencyLimiter(
+            initial=max(1, max_concurrency // 2), max_limit=max_concurrency
+        )
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "retries": 0, "failures": 0, "rejected": 0, "throttled_seconds": 0.0}
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int = 0,
+             used_tokens: Optional[Callable[[Any], Optional[int]]] = None) -> Any:
+        """
+        Call ``fn`` under the guard, blocking while throttled.
+
+        Args:
+            fn (Callable[[], Any]): The provider call
+            estimated_tokens (int): Tokens charged up front against the quota
+            used_tokens (Optional[Callable[[Any], Optional[int]]]): Extracts the
+                actual token usage from the result to correct the estimate
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is open
+        """
+        for attempt in range(self.max_retries + 1):
+            self._admit()
+            try:
+                time.sleep(self._throttle(estimated_tokens))
+                self.concurrency.acquire()
+            except BaseException:
+                # Interrupted before the call was sent: nothing was used
+                self._refund(1, estimated_tokens)
+                raise
+            result, error, returned = None, None, False
+            try:
+                result = fn()
+                returned = True
+            except Exception as e:
+                error = e
+            finally:
+                # Also reached on KeyboardInterrupt and other BaseExceptions
+                self.concurrency.release(success=returned,
+                                         overload=error is not None and is_overload(error))
+            if error is not None:
+                if not self._failed(error, attempt, estimated_tokens):
+                    raise error
+                time.sleep(self._backoff(attempt))
+                continue
+            self._succeeded(result, estimated_tokens, used_tokens)
+            return result
+
+    async def call_async(self, fn: Callable[[], Awaitable[Any]], estimated_tokens: int = 0,
+                         used_tokens: Optional[Callable[[Any], Optional[int]]] = None) -> Any:
+        """Asyncio counterpart of ``call``."""
+        for attempt in range(self.max_retries + 1):
+            self._admit()
+            try:
+                await asyncio.sleep(self._throttle(estimated_tokens))
+                await self.concurrency.acquire_async()
+            except BaseException:
+                # Cancelled before the call was sent: nothing was used
+                self._refund(1, estimated_tokens)
+                raise
+            result, error, returned = None, None, False
+            try:
+                result = await fn()
+                returned = True
+            except Exception as e:
+                error = e
+            finally:
+                # Also reached when the calling task is cancelled
+                self.concurrency.release(success=returned,
+                                         overload=error is not None and is_overload(error))
+            if error is not None:
+                if not self._failed(error, attempt, estimated_tokens):
+                    raise error
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            self._succeeded(result, estimated_tokens, used_tokens)
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters and the current limiter and breaker state."""
+        with self._lock:
+            snapshot = dict(self._counters)
+        snapshot.update(
+            concurrency_limit=self.concurrency.limit,
+            in_flight=self.concurrency.in_flight,
+            circuit=self.breaker.state,
+        )
+        return snapshot
+
+    def _count(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def _admit(self) -> None:
+        # Checked before _throttle, so rejected calls are never charged
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise CircuitOpenError("Gemini is unavailable (circuit breaker open)")
+        self._count("calls")
+
+    def _throttle(self, estimated_tokens: int) -> float:
+        wait = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+        if wait:
+            self._count("throttled_seconds", wait)
+        return wait
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniform in [0, base * 2^attempt], capped
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _refund(self, requests: float, tokens: float) -> None:
+        if requests:
+            self.requests.adjust(requests)
+        if tokens:
+            self.tokens.adjust(tokens)
+
+    def _failed(self, error: Exception, attempt: int, estimated_tokens: int = 0) -> bool:
+        """Record a failed attempt; True if it should be retried."""
+        self._count("failures")
+        # A failed call produced no completion, so its token estimate is
+        # returned; the request itself was sent and stays charged
+        self._refund(0, estimated_tokens)
+        if is_client_error(error):
+            # The provider answered, so the circuit closes (ending a trial call)
+            self.breaker.record_success()
+            return False
+        self.breaker.record_failure()
+        if not is_retryable(error) or attempt >= self.max_retries:
+            return False
+        self._count("retries")
+        return True
+
+    def _succeeded(self, result: Any, estimated_tokens: int,
+                   used_tokens: Optional[Callable[[Any], Optional[int]]]) -> None:
+        self.breaker.record_success()
+        actual = used_tokens(result) if used_tokens else None
+        if actual is not None:
+            self.tokens.adjust(estimated_tokens - actual)
@@ -0,0 +1,241 @@
+"""
+Pre-fitted TF-IDF model for the Business Relevance Score (BRS).
+
+The vectorizer is fitted once on a corpus of past queries and responses
+(bootstrapped from the engagement log), persisted to disk and reloaded at
+startup, so scoring a request only costs a ``transform`` of the query and
+the response. Once enough new interactions have been scored, the model is
+refitted in the background on the most recent part of the log.
+
+scikit-learn is imported on first use and ``load_or_bootstrap(lazy=True)``
+defers reading the model, so importing the backend stays fast.
+"""
+
+import os
+import pickle
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+
+def _tfidf_vectorizer(**kwargs) -> "TfidfVectorizer":
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    return TfidfVectorizer(**kwargs)
+
+
+def _join(value: Any) -> str:
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(item) for item in value)
+    return str(value or "")
+
+
+def response_text(response: Dict[str, Any]) -> str:
+    """Combine the sections of a response that BRS is computed on."""
+    if "market_position" in response:
+        # Competitive analysis
+        return f"{_join(response['market_position'])} {_join(response['competitor_analysis'])}"
+    if "current_trends" in response:
+        # Trend analysis
+        return f"{_join(response['current_trends'])} {_join(response['predictions'])}"
+    # General analysis
+    return f"{_join(response['summary'])} {_join(response['key_points'])}"
+
+
+class RelevanceModel:
+    """
+    TF-IDF vectorizer shared by every BRS computation.
+
+    Args:
+        path (Optional[str]): File the fitted vectorizer is persisted to
+        entries_source (Optional[Callable[[], Iterable[Dict[str, Any]]]]):
+            Returns the logged interactions to refit on
+        max_documents (int): Most recent documents used for a fit
+        refit_interval (float): Minimum seconds between background refits
+        min_new_documents (int): Newly scored documents required before a refit
+    """
+
+    def __init__(self, path: Optional[str] = None,
+                 entries_source: Optional[Callable[[], Iterable[Dict[str, Any]]]] = None,
+                 max_documents: int = 50000, refit_interval: float = 3600,
+                 min_new_documents: int = 50):
+        self.path = path
+        self.entries_source = entries_source
+        self.max_documents = max_documents
+        self.refit_interval = refit_interval
+        self.min_new_documents = min_new_documents
+        self.vectorizer: Optional["TfidfVectorizer"] = None
+
+        # Set by load_or_bootstrap(lazy=True) until the first use
+        self._deferred_load = False
+        self._load_lock = threading.Lock()
+        self._new_documents = 0
+        self._last_fit = time.monotonic()
+        self._lock = threading.Lock()
+        self._refitting = False
+
+    @property
+    def fitted(self) -> bool:
+        return self.vectorizer is not None
+
+    def ensure_loaded(self) -> None:
+        """Load or bootstrap the model now if that was deferred."""
+        if not self._deferred_load:
+            return
+        with self._load_lock:
+            if self._deferred_load:
+                try:
+                    if not self.load() and self.bootstrap(self.entries_source()):
+                        self.save()
+                finally:
+                    self._deferred_load = False
+
+    def fit(self, documents: Iterable[str]) -> bool:
+        """
+        Fit the vectorizer on the last ``max_documents`` of ``documents``.
+
+        Returns:
+            bool: False if there was nothing to fit on
+        """
+        corpus = list(deque((doc for doc in documents if doc), maxlen=self.max_documents))
+        with self._lock:
+            self._new_documents = 0
+            self._last_fit = time.monotonic()
+        if not corpus:
+            return False
+
+        vectorizer = _tfidf_vectorizer(stop_words='english', sublinear_tf=True)
+        try:
+            vectorizer.fit(corpus)
+        except ValueError:
+            # Corpus consists of stop words only
+            return False
+        self.vectorizer = vectorizer
+        return True
+
+    def bootstrap(self, entries: Iterable[Dict[str, Any]]) -> bool:
+        """Fit on the queries and responses of logged interactions."""
+        def documents():
+            for entry in entries:
+                yield entry.get("query", "")
+                try:
+                    yield response_text(entry.get("response", {}))
+                except KeyError:
+                    continue
+        return self.fit(documents())
+
+    def score(self, query: str, text: str) -> float:
+        """Return the cosine similarity of ``query`` and ``text`` as a percentage."""
+        from sklearn.metrics.pairwise import cosine_similarity
+        self.ensure_loaded()
+        vectorizer = self.vectorizer
+        if vectorizer is None:
+            # Nothing fitted yet: fall back to fitting on the pair itself
+            vectorizer = _tfidf_vectorizer(stop_words='english')
+            vectors = vectorizer.fit_transform([query, text])
+        else:
+            vectors = vectorizer.transform([query, text])
+        similarity = cosine_similarity(vectors[0], vectors[1])[0][0]
+        return round(float(similarity) * 100, 2)
+
+    def score_many(self, queries: Sequence[str], texts: Sequence[str]) -> np.ndarray:
+        """
+        Score many query/text pairs at once.
+
+        Both sides are transformed in one call each and the row-wise cosine
+        similarity is computed with a single sparse element-wise product
+        (TF-IDF rows are already L2-normalized).
+
+        Returns:
+            np.ndarray: BRS percentages, one per pair
+        """
+        if not len(queries):
+            return np.zeros(0)
+        self.ensure_loaded()
+        vectorizer = self.vectorizer
+        if vectorizer is None:
+            # Nothing fitted yet: fit once on the whole batch
+            vectorizer = _tfidf_vectorizer(stop_words='english')
+            try:
+                vectorizer.fit(list(queries) + list(texts))
+            except ValueError:
+                return np.zeros(len(queries))
+        query_vectors = vectorizer.transform(queries)
+        text_vectors = vectorizer.transform(texts)
+        similarity = np.asarray(query_vectors.multiply(text_vectors).sum(axis=1)).ravel()
+        return np.round(similarity * 100, 2)
+
+    def observe(self, pairs: int = 1) -> None:
+        """Record scored pairs and start a background refit when one is due."""
+        if self.entries_source is None:
+            return
+        with self._lock:
+            self._new_documents += 2 * pairs
+            due = (not self._refitting
+                   and self._new_documents >= self.min_new_documents
+                   and (not self.fitted
+                        or time.monotonic() - self._last_fit >= self.refit_interval))
+            if due:
+                self._refitting = True
+        if due:
+            threading.Thread(target=self._refit, name="relevance-refit", daemon=True).start()
+
+    def save(self, path: Optional[str] = None) -> None:
+        """Persist the fitted vectorizer."""
+        path = path or self.path
+        if not path or self.vectorizer is None:
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self.vectorizer, f)
+        os.replace(tmp_path, path)
+
+    def load(self, path: Optional[str] = None) -> bool:
+        """Load a persisted vectorizer; returns False if none exists."""
+        path = path or self.path
+        if not path or not os.path.exists(path):
+            return False
+        with open(path, "rb") as f:
+            self.vectorizer = pickle.load(f)
+        return True
+
+    def _refit(self) -> None:
+        try:
+            if self.bootstrap(self.entries_source()):
+                self.save()
+        except Exception as e:
+            print(f"Error refitting relevance model: {str(e)}")
+        finally:
+            with self._lock:
+                self._refitting = False
+
+
+def load_or_bootstrap(path: str, entries_source: Callable[[], Iterable[Dict[str, Any]]],
+                      lazy: bool = False, **kwargs) -> RelevanceModel:
+    """
+    Load the persisted model, or fit a new one on the logged interactions and save it.
+
+    Args:
+        path (str): Model file
+        entries_source (Callable[[], Iterable[Dict[str, Any]]]): Returns the
+            logged interactions to bootstrap and refit on
+        lazy (bool): Defer loading until the model is first used (or
+            ``ensure_loaded`` is called)
+        **kwargs: Passed to ``RelevanceModel``
+
+    Returns:
+        RelevanceModel: The ready-to-use model (unfitted if there was no data)
+    """
+    model = RelevanceModel(path=path, entries_source=entries_source, **kwargs)
+    model._deferred_load = True
+    if not lazy:
+        model.ensure_loaded()
+    return model
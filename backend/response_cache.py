@@ -0,0 +1,270 @@
+"""
+Response cache for generated insights.
+
+Entries are keyed on the normalized ``(query, analysis_type)`` pair, expire
+after a TTL and are evicted least-recently-used once the cache is full.
+Expired entries are kept until evicted or replaced, so they can still be
+served as stale answers while a refresh is running or Gemini is unavailable. Two
+backends are provided: an in-process ``MemoryCache`` and a ``SQLiteCache``
+that persists across restarts and is shared between worker processes.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    from . import serialization
+except ImportError:
+    import serialization
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so trivially different spellings share a cache entry."""
+    query = _WHITESPACE.sub(" ", query.strip().lower())
+    return _TRAILING_PUNCTUATION.sub("", query)
+
+
+def cache_key(query: str, analysis_type: str) -> str:
+    """Return the cache key for a query and analysis type."""
+    return f"{analysis_type}:{normalize_query(query)}"
+
+
+class CacheBackend:
+    """
+    Base class for response cache backends.
+
+    Args:
+        max_entries (int): Maximum number of cached responses
+        ttl (float): Seconds a response stays valid; 0 disables expiry
+        clock (Callable[[], float]): Time source, overridable in tests
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600,
+                 clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._stats_lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "stale_hits": 0}
+
+    def get(self, query: str, analysis_type: str, allow_stale: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached response, or None on a miss.
+
+        Args:
+            query (str): The user's query
+            analysis_type (str): Type of analysis
+            allow_stale (bool): Also return a response whose TTL has expired
+        """
+        return self.lookup(query, analysis_type, float("inf") if allow_stale else 0)[0]
+
+    def lookup(self, query: str, analysis_type: str,
+               max_stale: float = 0) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        Return the cached response and whether its TTL has expired.
+
+        Args:
+            query (str): The user's query
+            analysis_type (str): Type of analysis
+            max_stale (float): Seconds past its expiry a response is still returned
+
+        Returns:
+            Tuple[Optional[Dict[str, Any]], bool]: The response (None on a
+            miss) and True if it is stale
+        """
+        raise NotImplementedError
+
+    def expires_in(self, query: str, analysis_type: str) -> Optional[float]:
+        """Seconds until the cached response expires (negative once expired), None if absent."""
+        raise NotImplementedError
+
+    def set(self, query: str, analysis_type: str, response: Dict[str, Any]) -> None:
+        """Store a response."""
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        """Remove every cached response."""
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/eviction counters and the current size."""
+        with self._stats_lock:
+            snapshot = dict(self._counters)
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = round(snapshot["hits"] / lookups, 4) if lookups else 0.0
+        snapshot["size"] = len(self)
+        return snapshot
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._counters[name] += amount
+
+    def _expires_at(self) -> float:
+        return self.clock() + self.ttl if self.ttl else float("inf")
+
+    def _check(self, expires_at: float, now: float, max_stale: float) -> Optional[bool]:
+        """Count a lookup of an existing entry; returns whether it is stale, None if too old."""
+        if expires_at > now:
+            self._count("hits")
+            return False
+        if now - expires_at <= max_stale:
+            self._count("stale_hits")
+            return True
+        self._count("expirations")
+        self._count("misses")
+        return None
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU cache."""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600,
+                 clock: Callable[[], float] = time.time):
+        super().__init__(max_entries, ttl, clock)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def lookup(self, query: str, analysis_type: str,
+               max_stale: float = 0) -> Tuple[Optional[Dict[str, Any]], bool]:
+        key = cache_key(query, analysis_type)
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self._count("misses")
+                return None, False
+            stale = self._check(item[0], self.clock(), max_stale)
+            if stale is None:
+                return None, False
+            if not stale:
+                self._entries.move_to_end(key)
+        return item[1], stale
+
+    def expires_in(self, query: str, analysis_type: str) -> Optional[float]:
+        with self._lock:
+            item = self._entries.get(cache_key(query, analysis_type))
+        return None if item is None else item[0] - self.clock()
+
+    def set(self, query: str, analysis_type: str, response: Dict[str, Any]) -> None:
+        key = cache_key(query, analysis_type)
+        with self._lock:
+            self._entries[key] = (self._expires_at(), response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._count("evictions")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache(CacheBackend):
+    """On-disk LRU cache shared by every process using the same database file."""
+
+    def __init__(self, path: str, max_entries: int = 10000, ttl: float = 3600,
+                 clock: Callable[[], float] = time.time):
+        super().__init__(max_entries, ttl, clock)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " response TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+            )
+
+    def lookup(self, query: str, analysis_type: str,
+               max_stale: float = 0) -> Tuple[Optional[Dict[str, Any]], bool]:
+        key = cache_key(query, analysis_type)
+        now = self.clock()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT response, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._count("misses")
+                return None, False
+            stale = self._check(row[1], now, max_stale)
+            if stale is None:
+                return None, False
+            if not stale:
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        return serialization.loads(row[0]), stale
+
+    def expires_in(self, query: str, analysis_type: str) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at FROM responses WHERE key = ?", (cache_key(query, analysis_type),)
+            ).fetchone()
+        return None if row is None else row[0] - self.clock()
+
+    def set(self, query: str, analysis_type: str, response: Dict[str, Any]) -> None:
+        key = cache_key(query, analysis_type)
+        expires_at = self._expires_at()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, expires_at, last_access)"
+                " VALUES (?, ?, ?, ?)",
+                (key, serialization.dumps(response).decode("utf-8"), min(expires_at, 1e18), self.clock()),
+            )
+            overflow = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    " SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                    (overflow,),
+                )
+                self._count("evictions", overflow)
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_response_cache(backend: str = "memory", path: str = "response_cache.sqlite3",
+                          max_entries: int = 1000, ttl: float = 3600) -> CacheBackend:
+    """
+    Create a response cache.
+
+    Args:
+        backend (str): 'memory' or 'sqlite'
+        path (str): Database file for the SQLite backend
+        max_entries (int): Maximum number of cached responses
+        ttl (float): Seconds a response stays valid
+
+    Returns:
+        CacheBackend: The configured cache
+    """
+    if backend == "memory":
+        return MemoryCache(max_entries=max_entries, ttl=ttl)
+    if backend == "sqlite":
+        return SQLiteCache(path, max_entries=max_entries, ttl=ttl)
+    raise ValueError(f"Unknown response cache backend: {backend}")
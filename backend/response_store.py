@@ -0,0 +1,143 @@
+"""
+Content-addressed, compressed storage for logged responses.
+
+Each distinct response is serialized canonically, hashed with SHA-256 and
+written once as a compressed blob named after its hash
+(``<directory>/ab/abcdef...``). Repeated answers to the same canned queries
+therefore share one blob, and log entries only need to hold the hash.
+Blobs are compressed with zstd when the ``zstandard`` package is installed
+and with gzip otherwise; readers recognize either format from the blob's
+magic bytes.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict
+
+try:
+    import zstandard
+except ImportError:  # gzip is always available
+    zstandard = None
+
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+def canonical_json(response: Dict[str, Any]) -> bytes:
+    """Serialize a response so equal responses produce identical bytes."""
+    return json.dumps(response, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def compress(data: bytes) -> bytes:
+    """Compress with zstd if available, gzip otherwise."""
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def decompress(blob: bytes) -> bytes:
+    """Decompress a blob written by ``compress``."""
+    if blob.startswith(_ZSTD_MAGIC):
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed responses")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    if blob.startswith(_GZIP_MAGIC):
+        return gzip.decompress(blob)
+    raise ValueError("Unknown response blob format")
+
+
+class ResponseStore:
+    """
+    Deduplicating store of compressed response bodies, safe across processes.
+
+    Args:
+        directory (str): Directory holding the blobs
+        fsync (bool): Force each new blob to stable storage before it is referenced
+        cache_size (int): Decompressed responses kept in memory for repeated reads
+    """
+
+    def __init__(self, directory: str, fsync: bool = False, cache_size: int = 256):
+        self.directory = directory
+        self.fsync = fsync
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._known = set()
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._counters = {"written": 0, "deduplicated": 0, "raw_bytes": 0, "stored_bytes": 0}
+
+    def path(self, ref: str) -> str:
+        """Return the file holding the blob with the given hash."""
+        return os.path.join(self.directory, ref[:2], ref)
+
+    def put(self, response: Dict[str, Any]) -> str:
+        """
+        Store a response unless an identical one is already stored.
+
+        Returns:
+            str: The response's reference (hex SHA-256 of its canonical JSON)
+        """
+        data = canonical_json(response)
+        ref = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            known = ref in self._known
+        path = self.path(ref)
+        if known or os.path.exists(path):
+            self._count("deduplicated")
+        else:
+            blob = compress(data)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Writers racing on the same blob write the same bytes; the
+            # rename makes sure readers never see a partial one
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(blob)
+                    if self.fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+                os.replace(tmp, path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                raise
+            self._count("written")
+            self._count("raw_bytes", len(data))
+            self._count("stored_bytes", len(blob))
+        with self._lock:
+            self._known.add(ref)
+        return ref
+
+    def get(self, ref: str) -> Dict[str, Any]:
+        """
+        Load and decompress a stored response.
+
+        Raises:
+            FileNotFoundError: If no blob with this reference exists
+        """
+        with self._lock:
+            data = self._cache.get(ref)
+            if data is not None:
+                self._cache.move_to_end(ref)
+        if data is None:
+            with open(self.path(ref), "rb") as f:
+                data = decompress(f.read())
+            with self._lock:
+                self._cache[ref] = data
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        # Parsed per call so callers never share (and mutate) the same dict
+        return json.loads(data)
+
+    def stats(self) -> Dict[str, int]:
+        """Return counters of blobs written and deduplicated by this process."""
+        with self._lock:
+            return dict(self._counters)
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
@@ -0,0 +1,234 @@
+"""
+Similarity-based cache of past answers.
+
+Queries are tokenized with the same analyzer as ``TfidfVectorizer`` and
+weighted with sublinear TF-IDF, using document frequencies that are updated
+incrementally as answers are added. Lookups go through an inverted index and
+use prefix filtering: query terms whose combined weight cannot reach the
+similarity threshold on their own are never expanded, so only the short
+posting lists of distinctive terms are scanned.
+
+Answers expire like those of the response cache: past their TTL they are
+returned as stale (so callers can refresh them) for at most ``max_stale``
+seconds, after which lookups no longer return them.
+"""
+
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from .response_cache import normalize_query
+except ImportError:
+    from response_cache import normalize_query
+
+
+class _Partition:
+    """Inverted index over the cached queries of one analysis type."""
+
+    def __init__(self):
+        self.doc_freq: Counter = Counter()
+        self.postings: Dict[int, set] = {}
+        # doc id -> (query, {term id: weight}, response, added at), least recently used first
+        self.docs: "OrderedDict[int, Tuple[str, Dict[int, float], Dict[str, Any], float]]" = OrderedDict()
+        # normalized query -> doc id, so a refreshed answer replaces the old one
+        self.by_query: Dict[str, int] = {}
+
+    def idf(self, term_id: int) -> float:
+        # Same smoothed IDF as TfidfVectorizer(smooth_idf=True)
+        return math.log((1 + len(self.docs)) / (1 + self.doc_freq.get(term_id, 0))) + 1
+
+
+class SemanticCache:
+    """
+    Returns a stored answer when a new query is close enough to a cached one.
+
+    Args:
+        threshold (float): Minimum cosine similarity for a hit
+        max_entries (int): Maximum cached answers per analysis type; the
+            least recently used answers are evicted first
+        ttl (float): Seconds an answer stays fresh; 0 disables expiry
+        clock (Callable[[], float]): Time source, overridable in tests
+    """
+
+    def __init__(self, threshold: float = 0.7, max_entries: int = 100000, ttl: float = 3600,
+                 clock: Callable[[], float] = time.time):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        # Built on first use so importing the cache does not import scikit-learn
+        self._analyzer: Optional[Callable[[str], List[str]]] = None
+        # Terms of the cached queries; a term is dropped with its last query
+        self._vocabulary: Dict[str, int] = {}
+        self._terms: Dict[int, str] = {}
+        self._next_term_id = 0
+        self._partitions: Dict[str, _Partition] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stale_hits": 0, "evictions": 0, "expirations": 0}
+
+    def add(self, query: str, analysis_type: str, response: Dict[str, Any]) -> None:
+        """Index a generated answer, replacing an earlier answer to the same query."""
+        with self._lock:
+            partition = self._partitions.setdefault(analysis_type, _Partition())
+            key = normalize_query(query)
+            # Removed first, so terms it alone used are not dropped after
+            # the new answer has been given their ids
+            if key in partition.by_query:
+                self._remove(partition, partition.by_query[key])
+            counts = self._term_counts(query, grow=True)
+            if not counts:
+                return
+            partition.doc_freq.update(counts.keys())
+            doc_id = self._next_id
+            self._next_id += 1
+            # Weights are frozen at insertion time; later DF changes only
+            # affect the query side, which keeps inserts O(query length).
+            partition.docs[doc_id] = (query, self._weights(counts, partition), response, self.clock())
+            partition.by_query[key] = doc_id
+            for term_id in counts:
+                partition.postings.setdefault(term_id, set()).add(doc_id)
+
+            while len(partition.docs) > self.max_entries:
+                self._remove(partition, next(iter(partition.docs)))
+                self._counters["evictions"] += 1
+
+    def lookup(self, query: str, analysis_type: str, max_stale: float = 0) -> Optional[Dict[str, Any]]:
+        """
+        Find the most similar cached answer.
+
+        Args:
+            query (str): The user's query
+            analysis_type (str): Type of analysis
+            max_stale (float): Seconds past its TTL an answer is still returned
+
+        Returns:
+            Optional[Dict[str, Any]]: ``{"query", "response", "similarity",
+            "stale"}`` for the best match above the threshold, otherwise None
+        """
+        with self._lock:
+            match = self._best_match(query, analysis_type, max_stale)
+            if match is None:
+                self._counters["misses"] += 1
+            else:
+                self._counters["stale_hits" if match["stale"] else "hits"] += 1
+        return match
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss/eviction counters and the number of cached answers."""
+        with self._lock:
+            snapshot = dict(self._counters)
+            snapshot["size"] = sum(len(p.docs) for p in self._partitions.values())
+        return snapshot
+
+    def clear(self) -> None:
+        with self._lock:
+            self._partitions.clear()
+            self._vocabulary.clear()
+            self._terms.clear()
+
+    def __len__(self) -> int:
+        return self.stats()["size"]
+
+    def warmup(self) -> None:
+        """Build the tokenizer ahead of the first lookup."""
+        self._get_analyzer()
+
+    def _get_analyzer(self) -> Callable[[str], List[str]]:
+        if self._analyzer is None:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            self._analyzer = TfidfVectorizer(stop_words='english').build_analyzer()
+        return self._analyzer
+
+    def _term_counts(self, text: str, grow: bool) -> Counter:
+        counts: Counter = Counter()
+        # Unseen terms of a lookup still count towards the query norm, each
+        # under one negative id however often it is repeated
+        unseen: Dict[str, int] = {}
+        for token in self._get_analyzer()(text):
+            term_id = self._vocabulary.get(token)
+            if term_id is None:
+                if not grow:
+                    term_id = unseen.setdefault(token, -1 - len(unseen))
+                else:
+                    term_id = self._vocabulary[token] = self._next_term_id
+                    self._terms[term_id] = token
+                    self._next_term_id += 1
+            counts[term_id] += 1
+        return counts
+
+    def _weights(self, counts: Counter, partition: _Partition) -> Dict[int, float]:
+        weights = {term_id: (1 + math.log(tf)) * partition.idf(term_id)
+                   for term_id, tf in counts.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        return {term_id: w / norm for term_id, w in weights.items()}
+
+    def _best_match(self, query: str, analysis_type: str, max_stale: float) -> Optional[Dict[str, Any]]:
+        partition = self._partitions.get(analysis_type)
+        if partition is None or not partition.docs:
+            return None
+        counts = self._term_counts(query, grow=False)
+        if not counts:
+            return None
+        weights = self._weights(counts, partition)
+
+        # Prefix filtering: a document sharing only terms from a set S has
+        # similarity <= ||q_S||, so the lowest-weight terms whose norm stays
+        # below the threshold never need their postings expanded.
+        ordered = sorted(weights.items(), key=lambda item: item[1])
+        suffix_mass = 0.0
+        skip = 0
+        for _, weight in ordered:
+            if math.sqrt(suffix_mass + weight * weight) >= self.threshold:
+                break
+            suffix_mass += weight * weight
+            skip += 1
+
+        candidates = set()
+        for term_id, _ in ordered[skip:]:
+            candidates.update(partition.postings.get(term_id, ()))
+
+        now = self.clock()
+        best_id, best_score, best_stale = None, self.threshold, False
+        expired = False
+        for doc_id in candidates:
+            _, doc_weights, _, added_at = partition.docs[doc_id]
+            age = now - added_at
+            if self.ttl and age > self.ttl + max_stale:
+                # Too old for this lookup, but kept (until evicted) for
+                # lookups allowing more staleness, as in the response cache
+                expired = True
+                continue
+            score = sum(w * doc_weights.get(term_id, 0.0) for term_id, w in weights.items())
+            if score >= best_score:
+                best_id, best_score, best_stale = doc_id, score, bool(self.ttl) and age > self.ttl
+        if best_id is None:
+            if expired:
+                self._counters["expirations"] += 1
+            return None
+
+        cached_query, _, response, _ = partition.docs[best_id]
+        partition.docs.move_to_end(best_id)
+        return {"query": cached_query, "response": response, "similarity": round(best_score, 4),
+                "stale": best_stale}
+
+    def _remove(self, partition: _Partition, doc_id: int) -> None:
+        query, weights, _, _ = partition.docs.pop(doc_id)
+        for term_id in weights:
+            posting = partition.postings[term_id]
+            posting.discard(doc_id)
+            if not posting:
+                del partition.postings[term_id]
+        for term_id in weights:
+            partition.doc_freq[term_id] -= 1
+            if partition.doc_freq[term_id] <= 0:
+                del partition.doc_freq[term_id]
+                if not any(term_id in other.doc_freq for other in self._partitions.values()):
+                    del self._vocabulary[self._terms.pop(term_id)]
+        key = normalize_query(query)
+        if partition.by_query.get(key) == doc_id:
+            del partition.by_query[key]
+
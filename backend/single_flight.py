@@ -0,0 +1,276 @@
+"""
+Request coalescing ("single flight") for identical concurrent calls.
+
+Callers asking for the same key while a call is already in flight wait for
+that call and share its result instead of starting their own. Inside a
+process this uses events/futures; across worker processes the leader holds
+an advisory file lock for the key and publishes its result next to it, so
+processes that were waiting for the lock can pick the result up. Waiting is
+bounded by ``lock_timeout``: a leader that hangs makes the others compute
+the result themselves rather than hang with it.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalesce within each process only
+    fcntl = None
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class _FileCoordinator:
+    """Per-key file locks and published results shared between processes."""
+
+    # Files untouched for this long are removed; at worst this lets a late
+    # caller miss a coalescing opportunity, never return a wrong result.
+    STALE_AFTER = 600
+    PRUNE_EVERY = 100
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._published = 0
+
+    def _path(self, key: str, suffix: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.directory, digest + suffix)
+
+    def try_lock(self, key: str) -> Optional[int]:
+        """Take the key's lock without waiting; None if another process holds it."""
+        fd = os.open(self._path(key, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return None
+        return fd
+
+    # Polling intervals while waiting for a lock held by another process
+    POLL_MIN = 0.01
+    POLL_MAX = 0.2
+
+    def lock(self, key: str, timeout: float) -> Optional[int]:
+        """Wait up to ``timeout`` seconds for the key's lock; None if it is still held."""
+        deadline = time.monotonic() + timeout
+        delay = self.POLL_MIN
+        while True:
+            fd = self.try_lock(key)
+            if fd is not None:
+                return fd
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, self.POLL_MAX)
+
+    async def lock_async(self, key: str, timeout: float) -> Optional[int]:
+        """Asyncio counterpart of ``lock``; a cancelled waiter holds no lock."""
+        deadline = time.monotonic() + timeout
+        delay = self.POLL_MIN
+        while True:
+            fd = self.try_lock(key)
+            if fd is not None:
+                return fd
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, self.POLL_MAX)
+
+    def unlock(self, fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def publish(self, key: str, result: Any) -> None:
+        path = self._path(key, ".json")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"finished_at": time.time(), "result": result}, f)
+        except (TypeError, ValueError):
+            # Result is not JSON-serializable; other processes recompute
+            os.remove(tmp_path)
+            return
+        os.replace(tmp_path, path)
+
+        self._published += 1
+        if self._published % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self) -> None:
+        """Remove lock and result files of keys not requested recently."""
+        cutoff = time.time() - self.STALE_AFTER
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                continue
+
+    def result_since(self, key: str, since: float) -> Optional[Dict[str, Any]]:
+        """Return the published result if it was produced after ``since``."""
+        try:
+            with open(self._path(key, ".json"), "r", encoding="utf-8") as f:
+                published = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if published.get("finished_at", 0) < since:
+            return None
+        return published
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight calls.
+
+    Args:
+        directory (Optional[str]): Directory for cross-process lock and result
+            files; None coalesces within this process only
+        lock_timeout (float): Seconds to wait for another process computing
+            the same key before computing it here as well
+    """
+
+    def __init__(self, directory: Optional[str] = None, lock_timeout: float = 120):
+        self.lock_timeout = lock_timeout
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._async_calls: Dict[str, "asyncio.Future"] = {}
+        self._files = _FileCoordinator(directory) if directory and fcntl is not None else None
+        self._counters = {"calls": 0, "executed": 0, "coalesced": 0, "coalesced_remote": 0,
+                          "lock_timeouts": 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run ``fn`` unless an identical call is in flight, then share its result."""
+        with self._lock:
+            self._counters["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self._counters["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run_across_processes(key, fn)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async counterpart of ``do`` for coroutine functions."""
+        with self._lock:
+            self._counters["calls"] += 1
+            future = self._async_calls.get(key)
+            if future is not None:
+                self._counters["coalesced"] += 1
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        with self._lock:
+            self._async_calls[key] = future
+        try:
+            result = await self._run_across_processes_async(key, fn)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception retrieved in case no follower awaited it
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                del self._async_calls[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Return how many calls were made, executed and coalesced."""
+        with self._lock:
+            return dict(self._counters)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def _run_across_processes(self, key: str, fn: Callable[[], Any]) -> Any:
+        if self._files is None:
+            self._count("executed")
+            return fn()
+
+        started = time.time()
+        fd = self._files.try_lock(key)
+        if fd is None:
+            # Another process is computing this key: wait for it to finish
+            fd = self._files.lock(key, self.lock_timeout)
+            published = self._coalesced(key, started, fd)
+            if published is not None:
+                return published["result"]
+        try:
+            self._count("executed")
+            result = fn()
+            self._files.publish(key, result)
+            return result
+        finally:
+            if fd is not None:
+                self._files.unlock(fd)
+
+    async def _run_across_processes_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if self._files is None:
+            self._count("executed")
+            return await fn()
+
+        started = time.time()
+        fd = self._files.try_lock(key)
+        if fd is None:
+            fd = await self._files.lock_async(key, self.lock_timeout)
+            published = self._coalesced(key, started, fd)
+            if published is not None:
+                return published["result"]
+        try:
+            self._count("executed")
+            result = await fn()
+            self._files.publish(key, result)
+            return result
+        finally:
+            if fd is not None:
+                self._files.unlock(fd)
+
+    def _coalesced(self, key: str, started: float, fd: Optional[int]) -> Optional[Dict[str, Any]]:
+        """
+        After waiting for another process: its published result, if any.
+
+        The lock is released when the result is returned. Without the lock
+        (the wait timed out) the caller computes the result unlocked.
+        """
+        if fd is None:
+            self._count("lock_timeouts")
+            return None
+        published = self._files.result_since(key, started)
+        if published is not None:
+            self._files.unlock(fd)
+            self._count("coalesced_remote")
+        return published
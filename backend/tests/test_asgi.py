@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import asgi
+import main
+from engagement_log import EngagementLog
+from log_writer import AsyncLogWriter
+from relevance import RelevanceModel
+from response_cache import MemoryCache
+from semantic_cache import SemanticCache
+from single_flight import SingleFlight
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """ASGI test client logging into a temporary directory."""
+    log = EngagementLog(str(tmp_path / "log"))
+    monkeypatch.setattr(main, "engagement_log", log)
+    monkeypatch.setattr(main, "log_writer", AsyncLogWriter(log, synchronous=True))
+    monkeypatch.setattr(main, "response_cache", MemoryCache())
+    monkeypatch.setattr(main, "semantic_cache", SemanticCache())
+    monkeypatch.setattr(main, "relevance_model", RelevanceModel())
+    monkeypatch.setattr(main, "single_flight", SingleFlight())
+    with TestClient(asgi.app) as test_client:
+        yield test_client
+
+
+def test_generate_insights_contract(client):
+    response = client.post("/generate-insights", json={"query": "Analyze our market", "analysis_type": "competitive"})
+
+    data = response.json()
+    assert response.status_code == 200
+    assert data["status"] == "success"
+    assert data["RCS"] == 100
+    assert set(data["insights"]) == {"market_position", "competitor_analysis", "differentiators",
+                                     "opportunities", "threats"}
+    assert [e["query"] for e in main.engagement_log] == ["Analyze our market"]
+
+
+def test_validation_errors(client):
+    assert client.post("/generate-insights", json={}).status_code == 400
+    assert client.post("/generate-insights", json={"query": "q", "analysis_type": "x"}).status_code == 400
+
+
+def test_analysis_types(client):
+    assert client.get("/analysis-types").json() == {"analysis_types": main.ANALYSIS_TYPES}
+
+
+def test_concurrent_llm_calls_do_not_block_each_other(client, monkeypatch):
+    """Many pending LLM calls overlap instead of running one per thread."""
+    async def slow_generate(query, analysis_type):
+        await asyncio.sleep(0.2)
+        return {"summary": query, "key_points": ["a"], "recommendations": ["b"],
+                "timeline": ["c"], "outcomes": ["d"]}
+    monkeypatch.setattr(asgi, "agenerate_insights", slow_generate)
+
+    async def fire():
+        import httpx
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            responses = await asyncio.gather(*(
+                http.post("/generate-insights", json={"query": f"question {i}", "bypass_cache": True})
+                for i in range(200)
+            ))
+            return loop.time() - start, responses
+
+    elapsed, responses = asyncio.run(fire())
+    assert all(r.status_code == 200 for r in responses)
+    assert elapsed < 5
+
+
+def test_metrics_and_server_timing(client, monkeypatch):
+    monkeypatch.setattr(main, "SERVER_TIMING", True)
+    response = client.post("/generate-insights", json={"query": "Churn drivers", "analysis_type": "general"})
+    metrics_text = client.get("/metrics").text
+
+    assert "score;dur=" in response.headers["Server-Timing"]
+    assert 'insights_request_seconds_count{endpoint="/generate-insights",analysis_type="general",status="200"}' \
+        in metrics_text
+
+
+def test_multi_perspective_request(client):
+    response = client.post("/generate-insights",
+                           json={"query": "Pricing pressure", "analysis_type": ["general", "trend"]})
+
+    data = response.json()
+    assert response.status_code == 200
+    assert data["analysis_type"] == ["general", "trend"]
+    assert all(result["status"] == "success" and result["RCS"] == 100
+               for result in data["results"].values())
+    assert sorted(e["analysis_type"] for e in main.engagement_log) == ["general", "trend"]
+
+
+def test_analysis_types_conditional_get_and_compression(client, monkeypatch):
+    monkeypatch.setattr(main, "COMPRESS_MIN_BYTES", 100)
+    first = client.get("/analysis-types", headers={"Accept-Encoding": "gzip"})
+
+    assert first.headers["Content-Encoding"] == "gzip"
+    assert first.json() == {"analysis_types": main.ANALYSIS_TYPES}
+    second = client.get("/analysis-types", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 304
@@ -0,0 +1,43 @@
+import json
+
+from benchmarks import micro, startup
+from benchmarks.common import percentile, summarize, write_results
+from benchmarks.compare import compare
+
+
+def test_percentiles_use_nearest_rank():
+    values = list(range(1, 101))
+
+    assert percentile(values, 0.50) == 50
+    assert percentile(values, 0.99) == 99
+    stats = summarize([3.0, 1.0, 2.0])
+    assert (stats["count"], stats["min_ms"], stats["p50_ms"], stats["max_ms"]) == (3, 1.0, 2.0, 3.0)
+
+
+def test_compare_flags_regressions():
+    baseline = {"results": {"a": {"p50_ms": 1.0}, "b": {"p50_ms": 2.0}, "c": {"count": 1, "mean_ms": 5.0}}}
+    current = {"results": {"a": {"p50_ms": 1.05}, "b": {"p50_ms": 3.0}, "c": {"count": 1, "mean_ms": 4.0}}}
+
+    rows = {row[0]: row for row in compare(baseline, current, threshold=0.1)}
+
+    assert rows["a"][4] is False
+    assert rows["b"][4] is True
+    assert rows["c"][3] == -0.2
+
+
+def test_micro_benchmarks_write_results(tmp_path):
+    results = micro.run([10], repeat=3, log_dir=str(tmp_path / "logs"))
+    path = write_results("micro", results, {"sizes": [10]}, str(tmp_path / "micro.json"))
+
+    with open(path) as f:
+        document = json.load(f)
+    assert document["benchmark"] == "micro"
+    assert document["results"]["save_user_interaction_sync[10]"]["count"] == 3
+    assert "format_response[general]" in document["results"]
+
+
+def test_startup_imports_no_heavy_dependencies():
+    results = startup.run(repeat=1)
+
+    assert results["eager_heavy_modules"] == []
+    assert results["import_main"]["count"] == 1
@@ -0,0 +1,70 @@
+import threading
+import time
+
+from backend.cache_warmer import CacheWarmer
+
+
+def test_warm_refreshes_missing_and_expiring_answers():
+    cached = {("fresh", "general"): 5000.0, ("expiring", "general"): 60.0}
+    refreshed = []
+    warmer = CacheWarmer(
+        lambda query, analysis_type: refreshed.append((query, analysis_type)) or True,
+        lambda: [("fresh", "general"), ("expiring", "general"), ("missing", "trend")],
+        lambda query, analysis_type: cached.get((query, analysis_type)),
+        interval=300
+    )
+
+    assert warmer.warm() == 2
+    assert warmer.wait(5)
+    assert sorted(refreshed) == [("expiring", "general"), ("missing", "trend")]
+    assert warmer.stats()["refreshed"] == 2
+
+
+def test_refresh_of_a_query_is_queued_once():
+    release = threading.Event()
+    calls = []
+
+    def refresh(query, analysis_type):
+        calls.append(query)
+        release.wait(5)
+        return query != "broken"
+
+    warmer = CacheWarmer(refresh, lambda: [], lambda query, analysis_type: None)
+    assert warmer.refresh_async("Growth ideas?", "general")
+    assert not warmer.refresh_async("growth ideas", "general")
+    assert warmer.refresh_async("broken", "general")
+    release.set()
+
+    assert warmer.wait(5)
+    stats = warmer.stats()
+    assert (stats["refreshed"], stats["failed"], stats["already_pending"], stats["pending"]) == (1, 1, 1, 0)
+    assert warmer.refresh_async("growth ideas", "general")
+    warmer.wait(5)
+    assert len(calls) == 3
+
+
+def test_close_stops_rounds_and_drops_queued_refreshes():
+    release = threading.Event()
+    rounds = []
+
+    def hot_queries():
+        rounds.append(1)
+        return []
+
+    warmer = CacheWarmer(lambda query, analysis_type: release.wait(5), hot_queries,
+                         lambda query, analysis_type: None, interval=0.05, max_workers=1)
+    warmer.start()
+    warmer.refresh_async("running", "general")
+    warmer.refresh_async("queued", "general")
+    warmer.close()
+    count = len(rounds)
+    release.set()
+
+    assert warmer.wait(1)
+    assert warmer.stats()["pending"] == 0
+    time.sleep(0.2)
+    assert len(rounds) == count
+    warmer.start()
+    time.sleep(0.2)
+    assert len(rounds) > count
+    warmer.close()
@@ -0,0 +1,137 @@
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from backend.engagement_log import EngagementLog, compact_segments, list_segments, migrate_json_array
+
+
+def _entry(i):
+    return {"query": f"query {i}", "response": {"summary": "s"}, "BRS": 50.0, "RCS": 100,
+            "analysis_type": "general", "timestamp": "2025-03-29 12:18:22"}
+
+
+def _append_worker(directory, start, count):
+    log = EngagementLog(directory, segment_max_bytes=2048, fsync="never")
+    for i in range(start, start + count):
+        log.append(_entry(i))
+    log.close()
+
+
+def test_append_and_iterate(tmp_path):
+    """Entries are read back in write order."""
+    log = EngagementLog(str(tmp_path))
+    for i in range(5):
+        log.append(_entry(i))
+
+    assert [e["query"] for e in log.iter_entries()] == [f"query {i}" for i in range(5)]
+
+
+def test_segments_rotate(tmp_path):
+    """A new segment is started once the current one exceeds the size limit."""
+    log = EngagementLog(str(tmp_path), segment_max_bytes=500, fsync="never")
+    log.append_many(_entry(i) for i in range(20))
+    for i in range(20, 40):
+        log.append(_entry(i))
+
+    assert len(list_segments(str(tmp_path))) > 1
+    assert len(list(log)) == 40
+
+
+def test_corrupt_line_is_skipped(tmp_path):
+    """A torn write does not discard the rest of the history."""
+    log = EngagementLog(str(tmp_path), fsync="always")
+    log.append(_entry(0))
+    segment = os.path.join(str(tmp_path), list_segments(str(tmp_path))[0])
+    with open(segment, "a", encoding="utf-8") as f:
+        f.write('{"query": "trunc')
+        f.write("\n")
+    log.append(_entry(1))
+
+    assert [e["query"] for e in log] == ["query 0", "query 1"]
+
+
+def test_concurrent_processes(tmp_path):
+    """Writers in separate processes neither lose nor interleave entries."""
+    workers = [multiprocessing.Process(target=_append_worker, args=(str(tmp_path), n * 100, 100))
+               for n in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    queries = {e["query"] for e in EngagementLog(str(tmp_path))}
+    assert len(queries) == 400
+
+
+def test_migrate_json_array(tmp_path):
+    """The legacy JSON-array file is converted once and then renamed."""
+    source = tmp_path / "user_engagement_log.json"
+    source.write_text(json.dumps([_entry(i) for i in range(3)], indent=4), encoding="utf-8")
+    log = EngagementLog(str(tmp_path / "log"))
+
+    assert migrate_json_array(str(source), log) == 3
+    assert [e["query"] for e in log] == ["query 0", "query 1", "query 2"]
+    assert not source.exists()
+    assert (tmp_path / "user_engagement_log.json.migrated").exists()
+
+
+def test_invalid_fsync_policy(tmp_path):
+    with pytest.raises(ValueError):
+        EngagementLog(str(tmp_path), fsync="sometimes")
+
+
+def test_responses_are_stored_once_and_loaded_lazily(tmp_path):
+    """Identical responses share one compressed blob referenced from the entries."""
+    log = EngagementLog(str(tmp_path), fsync="never")
+    response = {"summary": "Demand is growing. " * 200, "key_points": ["a", "b"]}
+    log.append_many(dict(_entry(i), response=response) for i in range(10))
+    log.append(dict(_entry(10), response={"summary": "different"}))
+
+    segment = os.path.join(str(tmp_path), list_segments(str(tmp_path))[0])
+    raw = [json.loads(line) for line in open(segment, encoding="utf-8")]
+    lazy = list(log.iter_entries(load_responses=False))
+
+    assert "response" not in raw[0] and raw[0]["response_ref"] == raw[9]["response_ref"]
+    assert log.responses.stats()["written"] == 2
+    assert log.responses.stats()["stored_bytes"] < log.responses.stats()["raw_bytes"]
+    assert os.path.getsize(segment) < len(json.dumps(response))
+    assert [e["response"] for e in log][:1] == [response]
+    assert "response" not in lazy[0] and log.load_response(lazy[10]) == {"summary": "different"}
+
+
+def test_compact_moves_inline_responses_to_blobs(tmp_path):
+    """Entries written inline by older versions can be compacted in place."""
+    response = {"summary": "Margins are under pressure. " * 20}
+    legacy = EngagementLog(str(tmp_path), segment_max_bytes=1000, fsync="never", compact_responses=False)
+    for i in range(6):
+        legacy.append(dict(_entry(i), response=response))
+    legacy.close()
+
+    log = EngagementLog(str(tmp_path))
+    before, after = compact_segments(log)
+
+    assert after < before
+    assert [e["query"] for e in log] == [f"query {i}" for i in range(6)]
+    assert all(e["response"] == response for e in log)
+
+
+def test_iter_recent_reads_only_the_newest_segments(tmp_path, monkeypatch):
+    log = EngagementLog(str(tmp_path), segment_max_bytes=512, fsync="never")
+    for i in range(40):
+        log.append(dict(_entry(i), response={"summary": f"answer {i}"}))
+    assert len(list_segments(str(tmp_path))) > 3
+
+    read, loaded = [], []
+    read_segment, load_response = log._read_segment, log.load_response
+    monkeypatch.setattr(log, "_read_segment", lambda name: read.append(name) or read_segment(name))
+    monkeypatch.setattr(log, "load_response", lambda entry: loaded.append(entry) or load_response(entry))
+    recent = list(log.iter_recent(3))
+
+    assert [e["query"] for e in recent] == ["query 37", "query 38", "query 39"]
+    assert recent[-1]["response"] == {"summary": "answer 39"}
+    assert len(loaded) == 3
+    assert len(read) < len(list_segments(str(tmp_path)))
+    assert [e["query"] for e in log.iter_recent(100, load_responses=False)] == [f"query {i}" for i in range(40)]
+    assert list(log.iter_recent(0)) == []
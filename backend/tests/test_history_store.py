@@ -0,0 +1,119 @@
+import sqlite3
+import threading
+
+import pytest
+
+from backend.engagement_log import EngagementLog
+from backend.history_store import HistoryStore
+
+
+def entry(index, analysis_type="trend", brs=50.0, rcs=80):
+    return {
+        "query": f"query {index}",
+        "response": {"summary": f"answer {index}"},
+        "BRS": brs,
+        "RCS": rcs,
+        "analysis_type": analysis_type,
+        "timestamp": f"2025-01-01 10:00:{index:02d}.000000",
+    }
+
+
+def test_query_filters_newest_first_and_paginates(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite3"))
+    store.append_many([entry(i, "trend" if i % 2 else "general", rcs=40 if i % 3 else 100)
+                       for i in range(20)])
+
+    items, cursor = store.query(limit=3, analysis_type="trend", max_rcs=60)
+    rest, last = store.query(limit=10, cursor=cursor, analysis_type="trend", max_rcs=60)
+
+    assert [item["query"] for item in items] == ["query 19", "query 17", "query 13"]
+    assert [item["query"] for item in rest] == ["query 11", "query 7", "query 5", "query 1"]
+    assert last is None
+    assert items[0]["response"] == {"summary": "answer 19"}
+
+
+def test_since_and_until_accept_iso_timestamps(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite3"))
+    store.append_many([entry(i) for i in range(10)])
+
+    items, _ = store.query(since="2025-01-01T10:00:03", until="2025-01-01T10:00:05")
+
+    assert [item["query"] for item in items] == ["query 4", "query 3"]
+
+
+def test_invalid_cursor_and_filter_are_rejected(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite3"))
+
+    with pytest.raises(ValueError):
+        store.query(cursor="not-a-cursor")
+    with pytest.raises(ValueError):
+        store.query(query="x")
+
+
+def test_stats_aggregate_in_the_database(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite3"))
+    store.append_many([entry(0, "trend", 5.0, 100), entry(1, "trend", 15.0, 60),
+                       entry(2, "general", 100.0, 80), entry(3, "general", None, 0)])
+
+    stats = store.stats()
+    trend = store.stats(analysis_type="trend")
+
+    assert stats["count"] == 4
+    assert stats["BRS"]["histogram"] == {"0": 1, "10": 1, "90": 1}
+    assert stats["RCS"]["histogram"] == {"0": 1, "60": 1, "80": 1, "90": 1}
+    assert (stats["BRS"]["min"], stats["BRS"]["max"]) == (5.0, 100.0)
+    assert stats["by_analysis_type"]["general"] == {"count": 2, "BRS_mean": 100.0, "RCS_mean": 40.0}
+    assert (trend["count"], trend["BRS"]["mean"], trend["RCS"]["mean"]) == (2, 10.0, 80.0)
+    assert store.stats(analysis_type="competitive")["BRS"] == {
+        "mean": None, "min": None, "max": None, "histogram": {}}
+
+
+def test_new_database_is_filled_from_the_log_once(tmp_path):
+    logged = [entry(i) for i in range(5)]
+    path = str(tmp_path / "history.sqlite3")
+    stores = [HistoryStore(path, lambda: iter(logged), batch_size=2) for _ in range(4)]
+
+    threads = [threading.Thread(target=len, args=(store,)) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Entries already imported are skipped when the live writer repeats them
+    stores[0].append_many(logged[-1:])
+
+    assert len(stores[0]) == 5
+    assert stores[1].import_entries(logged + [entry(9)]) == 1
+
+
+def test_responses_are_stored_by_reference_and_loaded_per_page(tmp_path):
+    log = EngagementLog(str(tmp_path / "log"))
+    path = str(tmp_path / "history.sqlite3")
+    logged = [entry(i) for i in range(4)]
+    log.append_many(logged[:2])
+    store = HistoryStore(path, lambda: log.iter_entries(load_responses=False), log=log)
+
+    # As handed over by the log writer: entries still carrying their body
+    log.append_many(logged[2:])
+    store.append_many(logged[2:])
+    items, _ = store.query(limit=10)
+
+    assert [item["response"] for item in items] == [{"summary": f"answer {i}"} for i in (3, 2, 1, 0)]
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute("SELECT response_ref, response FROM interactions").fetchall()
+    assert len(rows) == 4 and all(ref and response is None for ref, response in rows)
+
+
+def test_database_with_inline_responses_is_rebuilt(tmp_path):
+    path = str(tmp_path / "history.sqlite3")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE interactions (id INTEGER PRIMARY KEY, timestamp TEXT NOT NULL,"
+                     " analysis_type TEXT NOT NULL, query TEXT NOT NULL, brs REAL, rcs REAL,"
+                     " response TEXT NOT NULL)")
+        conn.execute("INSERT INTO interactions (timestamp, analysis_type, query, response)"
+                     " VALUES ('2024-01-01 00:00:00', 'trend', 'old', '{}')")
+    store = HistoryStore(path, lambda: iter([entry(i) for i in range(3)]))
+
+    items, _ = store.query()
+
+    assert [item["query"] for item in items] == ["query 2", "query 1", "query 0"]
+    assert items[0]["response"] == {"summary": "answer 2"}
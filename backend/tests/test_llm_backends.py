@@ -0,0 +1,104 @@
+import asyncio
+import statistics
+
+import pytest
+
+from backend.llm_backends import FakeBackend, FakeLLMError, create_llm_backend
+from backend.query_engine import SECTION_HEADERS, build_prompt, format_response
+from backend.rate_limit import is_retryable
+
+
+@pytest.mark.parametrize("analysis_type", sorted(SECTION_HEADERS))
+def test_fake_answers_fill_every_section(analysis_type):
+    backend = FakeBackend()
+    for i in range(20):
+        prompt = build_prompt(f"How should we price product {i}?", analysis_type)
+        sections = format_response(backend.generate(prompt).text, analysis_type)
+
+        assert list(sections) == [key for key, _ in SECTION_HEADERS[analysis_type]]
+        assert all(sections.values())
+
+
+def test_fake_answers_are_deterministic_per_prompt():
+    prompt = build_prompt("Subscription pricing strategy", "general")
+    first, second = FakeBackend(seed=1), FakeBackend(seed=2)
+
+    assert first.generate(prompt).text == second.generate(prompt).text
+    assert "subscription" in first.answer(prompt).lower()
+    assert first.generate(prompt).total_tokens > 0
+
+
+def test_fake_respects_output_cap_and_section_limits():
+    backend = FakeBackend()
+    prompt = build_prompt("Subscription pricing strategy", "general")
+
+    capped = backend.generate(prompt, max_output_tokens=50)
+    sections = format_response(backend.generate(prompt).text, "general")
+
+    assert len(capped.text) <= 200 and capped.output_tokens == len(capped.text) // 4
+    assert all(len(items) <= 3 for key, items in sections.items() if key != "summary")
+
+
+def test_fake_stream_chunks_reassemble_the_answer():
+    backend = FakeBackend(chunk_chars=16)
+    prompt = build_prompt("Emerging trends", "trend")
+    chunks = list(backend.stream(prompt))
+
+    assert len(chunks) > 10
+    assert all(len(chunk) <= 16 for chunk in chunks)
+    assert "".join(chunks) == backend.answer(prompt)
+
+
+def test_fake_error_injection():
+    backend = FakeBackend(error_rate=1.0, error_code=503)
+    with pytest.raises(FakeLLMError) as excinfo:
+        backend.generate("prompt")
+
+    assert excinfo.value.code == 503
+    assert is_retryable(excinfo.value)
+    with pytest.raises(FakeLLMError):
+        asyncio.run(backend.agenerate("prompt"))
+
+
+def test_fake_latency_distribution():
+    backend = FakeBackend(latency_ms=200, distribution="lognormal", sigma=0.5, seed=7)
+    latencies = [backend._latency() for _ in range(2000)]
+
+    assert 180 < statistics.median(latencies) < 220
+    assert max(latencies) > 400
+    assert FakeBackend(latency_ms=50, distribution="fixed")._latency() == 50
+
+
+def test_create_llm_backend(monkeypatch):
+    monkeypatch.setenv("FAKE_LLM_ERROR_RATE", "0.25")
+    backend = create_llm_backend("fake")
+
+    assert backend.name == "fake"
+    assert backend.error_rate == 0.25
+    assert create_llm_backend("gemini", "gemini-2.0-flash").model_name == "gemini-2.0-flash"
+    with pytest.raises(ValueError):
+        create_llm_backend("unknown")
+
+
+@pytest.mark.parametrize("analysis_type", sorted(SECTION_HEADERS))
+def test_fake_answers_json_matching_the_schema(analysis_type):
+    from backend.query_engine import RESPONSE_SCHEMAS, parse_structured
+
+    backend = FakeBackend()
+    prompt = build_prompt("How should we price our product?", analysis_type, structured=True)
+    text = backend.generate(prompt, response_schema=RESPONSE_SCHEMAS[analysis_type]).text
+    sections = parse_structured(text, analysis_type)
+
+    assert sections is not None and all(sections.values())
+    assert all(len(sections[key]) <= 4 for key, field in RESPONSE_SCHEMAS[analysis_type]["properties"].items()
+               if field["type"] == "array")
+
+
+def test_gemini_config_requests_json_for_a_schema():
+    from backend.llm_backends import GeminiBackend
+
+    schema = {"type": "object", "properties": {"summary": {"type": "string"}}}
+
+    assert GeminiBackend._config(None) is None
+    assert GeminiBackend._config(100, schema) == {
+        "max_output_tokens": 100, "response_mime_type": "application/json", "response_schema": schema}
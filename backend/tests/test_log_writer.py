@@ -0,0 +1,91 @@
+import threading
+
+from backend.engagement_log import EngagementLog
+from backend.log_writer import AsyncLogWriter
+
+
+class BlockingLog:
+    """Destination that holds every write until released."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.batches = []
+
+    def append_many(self, entries):
+        self.release.wait(5)
+        self.batches.append(list(entries))
+        return len(self.batches[-1])
+
+
+def test_entries_are_batched(tmp_path):
+    """Queued entries are written in batches and all reach the log."""
+    log = EngagementLog(str(tmp_path), fsync="never")
+    writer = AsyncLogWriter(log, batch_size=10, flush_interval=0.05)
+    for i in range(25):
+        assert writer.submit({"query": f"q{i}"})
+
+    assert writer.flush(timeout=5)
+    stats = writer.stats()
+    assert stats["written"] == 25
+    assert stats["batches"] >= 3
+    assert stats["queue_depth"] == 0
+    writer.close()
+    assert [e["query"] for e in log] == [f"q{i}" for i in range(25)]
+
+
+def test_full_queue_drops_entries():
+    """A full queue drops entries instead of blocking the request."""
+    log = BlockingLog()
+    writer = AsyncLogWriter(log, max_queue=2, batch_size=1, flush_interval=0.01)
+    results = [writer.submit({"query": i}) for i in range(10)]
+
+    assert not all(results)
+    assert writer.stats()["dropped"] == results.count(False)
+    log.release.set()
+    writer.close()
+
+
+def test_backpressure_wait_is_counted():
+    log = BlockingLog()
+    writer = AsyncLogWriter(log, max_queue=1, batch_size=1, block_timeout=0.01)
+    for i in range(5):
+        writer.submit({"query": i})
+
+    assert writer.stats()["backpressure_waits"] > 0
+    log.release.set()
+    writer.close()
+
+
+def test_close_flushes_pending_entries():
+    log = BlockingLog()
+    log.release.set()
+    writer = AsyncLogWriter(log, batch_size=1000, flush_interval=60)
+    for i in range(50):
+        writer.submit({"query": i})
+    writer.close()
+
+    assert sum(len(batch) for batch in log.batches) == 50
+
+
+def test_synchronous_mode_writes_immediately(tmp_path):
+    log = EngagementLog(str(tmp_path))
+    writer = AsyncLogWriter(log, synchronous=True)
+    writer.submit({"query": "q"})
+
+    assert [e["query"] for e in log] == ["q"]
+    assert writer.stats()["written"] == 1
+
+
+def test_written_batches_reach_indexes(tmp_path):
+    class FailingIndex:
+        def append_many(self, entries):
+            raise OSError("disk full")
+
+    log, index = EngagementLog(str(tmp_path)), BlockingLog()
+    index.release.set()
+    writer = AsyncLogWriter(log, synchronous=True, indexes=[index, FailingIndex()])
+    writer.submit_many([{"query": "a"}, {"query": "b"}])
+
+    assert index.batches == [[{"query": "a"}, {"query": "b"}]]
+    assert [e["query"] for e in log] == ["a", "b"]
+    assert writer.stats()["index_errors"] == 1
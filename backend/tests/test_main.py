@@ -0,0 +1,396 @@
+import gzip
+import json
+import threading
+import time
+
+import pytest
+
+import main
+from engagement_log import EngagementLog
+from history_store import HistoryStore
+from log_writer import AsyncLogWriter
+from response_cache import MemoryCache
+from semantic_cache import SemanticCache
+from single_flight import SingleFlight
+from relevance import RelevanceModel
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Flask test client logging into a temporary directory."""
+    log = EngagementLog(str(tmp_path / "log"))
+    history = HistoryStore(str(tmp_path / "history.sqlite3"), log=log)
+    monkeypatch.setattr(main, "engagement_log", log)
+    monkeypatch.setattr(main, "history_store", history)
+    monkeypatch.setattr(main, "log_writer", AsyncLogWriter(log, synchronous=True, indexes=[history]))
+    monkeypatch.setattr(main, "response_cache", MemoryCache())
+    monkeypatch.setattr(main, "semantic_cache", SemanticCache(threshold=0.5))
+    monkeypatch.setattr(main, "relevance_model", RelevanceModel())
+    monkeypatch.setattr(main, "single_flight", SingleFlight())
+    main.app.config["TESTING"] = True
+    with main.app.test_client() as test_client:
+        yield test_client
+
+
+def test_generate_insights_logs_interaction(client):
+    response = client.post("/generate-insights",
+                           json={"query": "Analyze our market", "analysis_type": "competitive"})
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["status"] == "success"
+    assert data["cached"] is False
+    assert [e["query"] for e in main.engagement_log] == ["Analyze our market"]
+
+
+def test_repeated_query_is_cached(client, monkeypatch):
+    calls = []
+    generate = main.generate_insights
+    monkeypatch.setattr(main, "generate_insights",
+                        lambda query, analysis_type: calls.append(query) or generate(query, analysis_type))
+
+    client.post("/generate-insights", json={"query": "Growth ideas?", "analysis_type": "general"})
+    second = client.post("/generate-insights", json={"query": "growth ideas", "analysis_type": "general"})
+    client.post("/generate-insights",
+                json={"query": "growth ideas", "analysis_type": "general", "bypass_cache": True})
+
+    assert second.get_json()["cached"] is True
+    assert len(calls) == 2
+    assert main.response_cache.stats()["hits"] == 1
+
+
+def test_paraphrased_query_hits_semantic_cache(client):
+    client.post("/generate-insights",
+                json={"query": "What are our growth opportunities?", "analysis_type": "general"})
+    response = client.post("/generate-insights",
+                           json={"query": "key growth opportunities for our business",
+                                 "analysis_type": "general"})
+
+    data = response.get_json()
+    assert data["cached"] is True
+    assert data["matched_query"] == "What are our growth opportunities?"
+
+
+def test_invalid_requests(client):
+    assert client.post("/generate-insights", json={"query": ""}).status_code == 400
+    assert client.post("/generate-insights",
+                       json={"query": "q", "analysis_type": "unknown"}).status_code == 400
+
+
+def test_score_batch_matches_single_scores(client):
+    main.relevance_model.fit(["growth opportunities in new markets", "competitor pricing", "AI trends"])
+    items = [
+        {"query": "growth opportunities", "analysis_type": "general",
+         "response": {"summary": "new markets", "key_points": ["growth"], "recommendations": ["x"]}},
+        {"query": "competitor pricing", "analysis_type": "competitive",
+         "response": {"market_position": "leader", "competitor_analysis": ["pricing"]}},
+        {"query": "broken", "analysis_type": "trend", "response": {}},
+    ]
+
+    brs, rcs = main.score_batch(items)
+
+    for i, item in enumerate(items):
+        assert abs(brs[i] - main.calculate_business_relevance(item["query"], item["response"])) < 0.01
+        assert rcs[i] == main.calculate_response_consistency(item["response"], item["analysis_type"])
+
+
+def test_score_batch_endpoint(client):
+    response = client.post("/score-batch", json={"items": [
+        {"query": "growth", "analysis_type": "general", "response": {"summary": "growth plan"}},
+    ]})
+
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data["count"] == 1
+    assert data["RCS"] == [20]
+    assert client.post("/score-batch", json={"items": []}).status_code == 400
+
+
+def test_stream_endpoint_emits_sections_then_scores(client):
+    response = client.post("/generate-insights/stream",
+                           json={"query": "Emerging trends?", "analysis_type": "trend"})
+
+    events = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert response.mimetype == "application/x-ndjson"
+    assert [e["section"] for e in events[:-1]] == \
+        ["current_trends", "predictions", "opportunities", "risks", "measures"]
+    assert events[-1]["event"] == "complete"
+    assert events[-1]["RCS"] == 100
+    assert [e["query"] for e in main.engagement_log] == ["Emerging trends?"]
+
+
+def test_stream_endpoint_reports_midstream_failure(client, monkeypatch):
+    import query_engine
+    from llm_backends import FakeBackend
+
+    class BrokenStream(FakeBackend):
+        def stream(self, prompt, model=None, max_output_tokens=None, response_schema=None):
+            chunks = list(super().stream(prompt, model, max_output_tokens, response_schema))
+
+            def generate_chunks():
+                yield from chunks[:len(chunks) // 2]
+                raise ConnectionError("connection reset")
+            return generate_chunks()
+
+    monkeypatch.setattr(query_engine, "_backend", BrokenStream())
+    response = client.post("/generate-insights/stream",
+                           json={"query": "Emerging trends?", "analysis_type": "trend"})
+
+    events = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    sections = [e["section"] for e in events[:-1]]
+    assert sections and all(e["event"] == "section" for e in events[:-1])
+    assert events[-1]["event"] == "error"
+    assert events[-1]["partial"] is True
+    assert events[-1]["sections"] == sections
+    assert list(main.engagement_log) == []
+    assert main.response_cache.lookup("Emerging trends?", "trend")[0] is None
+
+
+def test_batch_keeps_order_and_reports_item_errors(client):
+    response = client.post("/generate-insights-batch", json={"items": [
+        {"query": "Market growth?", "analysis_type": "general"},
+        {"query": "", "analysis_type": "general"},
+        {"query": "Competitor moves", "analysis_type": "competitive"},
+        {"query": "Next year", "analysis_type": "forecast"},
+    ]})
+
+    data = response.get_json()
+    assert response.status_code == 200
+    assert [r["status"] for r in data["results"]] == ["success", "error", "success", "error"]
+    assert data["failed"] == 2
+    assert data["results"][2]["RCS"] == 100
+    assert [e["query"] for e in main.engagement_log] == ["Market growth?", "Competitor moves"]
+
+
+def test_batch_bounds_concurrency_and_times_out(client, monkeypatch):
+    lock = threading.Lock()
+    active, peak = [0], [0]
+    generate = main.generate_insights
+
+    def slow_generate(query, analysis_type):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(1 if query == "slow" else 0.05)
+        with lock:
+            active[0] -= 1
+        return generate(query, analysis_type)
+
+    monkeypatch.setattr(main, "generate_insights", slow_generate)
+    items = [{"query": "slow"}] + [{"query": f"question {i}"} for i in range(8)]
+    results = main.generate_insights_batch(items, max_concurrency=3, item_timeout=0.5)
+
+    assert results[0] == {"query": "slow", "analysis_type": "general", "status": "error", "error": "Timed out"}
+    assert all(r["status"] == "success" for r in results[1:])
+    assert peak[0] <= 3
+
+
+def test_batch_rejects_invalid_limits(client):
+    items = [{"query": "Market growth?"}]
+    for limits in ({"max_concurrency": "many"}, {"max_concurrency": 0}, {"max_concurrency": -2},
+                   {"timeout": "soon"}, {"timeout": -1}, {"timeout": 0}, {"timeout": None}):
+        response = client.post("/generate-insights-batch", json={"items": items, **limits})
+        assert response.status_code == 400, limits
+    assert list(main.engagement_log) == []
+
+
+def test_batch_logs_repeated_items_separately(client):
+    items = [{"query": "Market growth?"}] * 3
+    data = client.post("/generate-insights-batch", json={"items": items}).get_json()
+
+    assert data["failed"] == 0
+    entries = list(main.engagement_log)
+    assert len(entries) == 3 and len({e["timestamp"] for e in entries}) == 3
+    assert len(main.history_store) == 3
+
+
+def test_stale_answer_served_while_gemini_unavailable(client, monkeypatch):
+    first = client.post("/generate-insights", json={"query": "Market growth?", "analysis_type": "general"})
+    monkeypatch.setattr(main, "generate_insights",
+                        lambda query, analysis_type: {"error": "quota exceeded", "unavailable": True})
+
+    stale = client.post("/generate-insights",
+                        json={"query": "Market growth?", "analysis_type": "general", "bypass_cache": True})
+    missing = client.post("/generate-insights", json={"query": "Pricing", "analysis_type": "trend"})
+
+    assert stale.status_code == 200
+    assert stale.get_json()["stale"] is True
+    assert stale.get_json()["insights"] == first.get_json()["insights"]
+    assert missing.status_code == 503
+
+
+def test_metrics_endpoint_exposes_stages_and_cache_lookups(client):
+    client.post("/generate-insights", json={"query": "Pricing power", "analysis_type": "trend"})
+    client.post("/generate-insights", json={"query": "pricing power", "analysis_type": "trend"})
+    client.post("/generate-insights", json={"query": ""})
+
+    response = client.get("/metrics")
+    text = response.get_data(as_text=True)
+
+    assert response.content_type.startswith("text/plain")
+    for stage in ("cache", "generate", "llm", "parse", "score", "log"):
+        assert f'insights_stage_seconds_count{{stage="{stage}",analysis_type="trend"}}' in text
+    assert 'insights_cache_lookups_total{analysis_type="trend",result="hit"}' in text
+    assert 'insights_llm_tokens_total{analysis_type="trend",tier="simple",kind="actual"}' in text
+    assert 'insights_errors_total{endpoint="/generate-insights",kind="bad_request"}' in text
+    assert "insights_response_cache_hits 1" in text
+
+
+def test_request_metrics_label_unknown_paths_as_unmatched(client):
+    for i in range(3):
+        assert client.get(f"/no-such-page-{i}").status_code == 404
+    client.get("/analysis-types")
+
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'insights_request_seconds_count{endpoint="unmatched",analysis_type="",status="404"} 3' in text
+    assert 'endpoint="/analysis-types"' in text
+    assert "no-such-page" not in text
+
+
+def test_server_timing_header(client, monkeypatch):
+    assert "Server-Timing" not in client.post("/generate-insights", json={"query": "Growth"}).headers
+
+    monkeypatch.setattr(main, "SERVER_TIMING", True)
+    response = client.post("/generate-insights", json={"query": "Churn drivers"})
+    stages = [part.split(";")[0] for part in response.headers["Server-Timing"].split(", ")]
+
+    assert stages == ["cache", "generate", "llm", "parse", "cache_store", "score", "log", "total"]
+    stream = client.post("/generate-insights/stream", json={"query": "Churn drivers"})
+    complete = json.loads(stream.get_data(as_text=True).splitlines()[-1])
+    assert set(complete["server_timing"]) == {"cache", "score", "log", "total"}
+
+
+def test_history_and_stats_endpoints(client):
+    for query, analysis_type in [("Retail trends", "trend"), ("Pricing strategy", "general"),
+                                 ("AI adoption trends", "trend")]:
+        client.post("/generate-insights", json={"query": query, "analysis_type": analysis_type})
+
+    first = client.get("/history?analysis_type=trend&limit=1").get_json()
+    second = client.get(f"/history?analysis_type=trend&limit=1&cursor={first['next_cursor']}").get_json()
+    stats = client.get("/stats?analysis_type=trend").get_json()
+
+    assert [item["query"] for item in first["items"] + second["items"]] == \
+        ["AI adoption trends", "Retail trends"]
+    assert second["next_cursor"] is None
+    assert stats["count"] == 2 and sum(stats["RCS"]["histogram"].values()) == 2
+    assert client.get("/history?min_rcs=101").get_json()["items"] == []
+    for bad in ("limit=0", "analysis_type=x", "since=yesterday", "cursor=bogus", "max_brs=high"):
+        assert client.get(f"/history?{bad}").status_code == 400
+
+
+def test_all_analysis_types_run_concurrently_and_log_together(client, monkeypatch):
+    generate = main.generate_insights
+
+    def slow_generate(query, analysis_type):
+        time.sleep(0.3)
+        return generate(query, analysis_type)
+    monkeypatch.setattr(main, "generate_insights", slow_generate)
+
+    started = time.monotonic()
+    data = client.post("/generate-insights", json={"query": "Expand into Europe", "analysis_type": "all"}).get_json()
+    elapsed = time.monotonic() - started
+
+    assert elapsed < 0.8
+    assert data["analysis_type"] == ["competitive", "trend", "general"] and data["failed"] == 0
+    assert all(result["RCS"] == 100 for result in data["results"].values())
+    assert {e["analysis_type"] for e in main.engagement_log} == {"competitive", "trend", "general"}
+    assert len({e["timestamp"] for e in main.engagement_log}) == 3
+
+    listed = client.post("/generate-insights",
+                         json={"query": "Expand into Europe", "analysis_type": ["trend", "trend"]}).get_json()
+    assert list(listed["results"]) == ["trend"] and listed["results"]["trend"]["cached"] is True
+    assert client.post("/generate-insights", json={"query": "q", "analysis_type": []}).status_code == 400
+    assert client.post("/generate-insights", json={"query": "q", "analysis_type": ["x"]}).status_code == 400
+
+
+def test_expired_answer_is_served_stale_and_refreshed(client, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(main, "response_cache", MemoryCache(ttl=10, clock=lambda: clock[0]))
+    client.post("/generate-insights", json={"query": "Churn drivers", "analysis_type": "general"})
+    calls = []
+    generate = main.generate_insights
+    monkeypatch.setattr(main, "generate_insights",
+                        lambda query, analysis_type: calls.append(query) or generate(query, analysis_type))
+
+    clock[0] += 60
+    stale = client.post("/generate-insights", json={"query": "Churn drivers", "analysis_type": "general"})
+    assert main.cache_warmer.wait(5)
+    fresh = client.post("/generate-insights", json={"query": "Churn drivers", "analysis_type": "general"})
+
+    assert (stale.get_json()["cached"], stale.get_json()["stale"]) == (True, True)
+    assert (fresh.get_json()["cached"], fresh.get_json()["stale"]) == (True, False)
+    assert calls == ["Churn drivers"]
+    assert len(list(main.engagement_log)) == 3
+
+
+def test_expired_paraphrase_answer_is_served_stale_and_refreshed(client, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(main, "response_cache", MemoryCache(ttl=10, clock=lambda: clock[0]))
+    monkeypatch.setattr(main, "semantic_cache", SemanticCache(threshold=0.5, ttl=10, clock=lambda: clock[0]))
+    monkeypatch.setattr(main, "RESPONSE_CACHE_MAX_STALE", 100)
+    client.post("/generate-insights", json={"query": "Churn drivers", "analysis_type": "general"})
+    calls = []
+    generate = main.generate_insights
+    monkeypatch.setattr(main, "generate_insights",
+                        lambda query, analysis_type: calls.append(query) or generate(query, analysis_type))
+
+    # The exact answer is too old to serve, the paraphrase index still has it
+    clock[0] += 60
+    main.response_cache.clear()
+    stale = client.post("/generate-insights", json={"query": "Churn drivers?", "analysis_type": "general"})
+    assert main.cache_warmer.wait(5)
+    fresh = client.post("/generate-insights", json={"query": "churn drivers", "analysis_type": "general"})
+
+    assert (stale.get_json()["cached"], stale.get_json()["stale"]) == (True, True)
+    assert (fresh.get_json()["cached"], fresh.get_json()["stale"]) == (True, False)
+    assert calls == ["Churn drivers"]
+
+    clock[0] += 200
+    main.response_cache.clear()
+    expired = client.post("/generate-insights", json={"query": "Churn drivers?", "analysis_type": "general"})
+    assert expired.get_json()["cached"] is False
+
+
+def test_hot_queries_combine_history_and_examples(client, monkeypatch):
+    for _ in range(2):
+        client.post("/generate-insights", json={"query": "Pricing power", "analysis_type": "trend"})
+    monkeypatch.setattr(main, "load_example_queries",
+                        lambda: {"trend": ["pricing power", "AI adoption"], "general": ["Margins"]})
+
+    assert main.hot_queries() == [("Pricing power", "trend"), ("AI adoption", "trend"), ("Margins", "general")]
+
+
+def test_large_responses_are_compressed(client, monkeypatch):
+    monkeypatch.setattr(main, "COMPRESS_MIN_BYTES", 200)
+    body = {"query": "Where is retail heading?", "analysis_type": "trend"}
+
+    plain = client.post("/generate-insights", json=body)
+    compressed = client.post("/generate-insights", json=body, headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in plain.headers
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["Vary"]
+    assert json.loads(gzip.decompress(compressed.data))["insights"] == plain.get_json()["insights"]
+
+
+def test_analysis_types_conditional_get(client):
+    first = client.get("/analysis-types")
+    etag = first.headers["ETag"]
+
+    assert etag.startswith('W/"')
+    assert first.headers["Cache-Control"] == f"public, max-age={main.ANALYSIS_TYPES_MAX_AGE}"
+    second = client.get("/analysis-types", headers={"If-None-Match": etag})
+    assert second.status_code == 304 and second.data == b""
+
+    assert client.get("/history", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_errors_do_not_expose_tracebacks(client, monkeypatch):
+    def fail(*args):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(main, "lookup_cached_insights", fail)
+    response = client.post("/generate-insights", json={"query": "Growth ideas", "analysis_type": "general"})
+
+    assert response.status_code == 500
+    assert response.get_json() == {"error": "An error occurred: boom"}
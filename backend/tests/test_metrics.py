@@ -0,0 +1,59 @@
+from backend.metrics import MetricsRegistry, RequestTimings, end_request, span, start_request, STAGE_SECONDS
+
+
+def test_counter_and_histogram_render_prometheus_text():
+    registry = MetricsRegistry()
+    requests = registry.counter("app_requests_total", "Requests.", ("path",))
+    latency = registry.histogram("app_latency_seconds", "Latency.", ("path",), buckets=(0.1, 1.0))
+    requests.inc(path="/a")
+    requests.inc(2, path='/b"q')
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value, path="/a")
+
+    text = registry.render()
+
+    assert "# TYPE app_requests_total counter" in text
+    assert 'app_requests_total{path="/a"} 1' in text
+    assert 'app_requests_total{path="/b\\"q"} 2' in text
+    assert 'app_latency_seconds_bucket{path="/a",le="0.1"} 1' in text
+    assert 'app_latency_seconds_bucket{path="/a",le="1.0"} 2' in text
+    assert 'app_latency_seconds_bucket{path="/a",le="+Inf"} 3' in text
+    assert 'app_latency_seconds_count{path="/a"} 3' in text
+    assert 'app_latency_seconds_sum{path="/a"} 5.55' in text
+
+
+def test_collectors_render_as_gauges_and_failures_are_skipped():
+    registry = MetricsRegistry()
+    registry.register_collector(lambda: [("queue_depth", "Queued.", 3, {"queue": "log"})])
+    registry.register_collector(lambda: 1 / 0)
+
+    text = registry.render()
+
+    assert "# TYPE queue_depth gauge" in text
+    assert 'queue_depth{queue="log"} 3' in text
+
+
+def test_spans_feed_histograms_and_request_timings():
+    before = STAGE_SECONDS.count(stage="unit", analysis_type="general")
+    timings = start_request()
+    try:
+        with span("unit", "general"):
+            pass
+        with span("unit", "general"):
+            pass
+    finally:
+        end_request()
+    with span("unit", "general"):
+        pass
+
+    assert STAGE_SECONDS.count(stage="unit", analysis_type="general") == before + 3
+    assert list(timings.as_dict()) == ["unit", "total"]
+    assert timings.header().startswith("unit;dur=")
+
+
+def test_request_timings_accumulate_repeated_stages():
+    timings = RequestTimings()
+    timings.add("score", 0.001)
+    timings.add("score", 0.002)
+
+    assert timings.as_dict()["score"] == 3.0
@@ -0,0 +1,59 @@
+from backend.engagement_log import EngagementLog
+from backend.query_clusters import cluster_queries, main
+
+TOPICS = {
+    "pricing": ["How should we set pricing for our subscription plans?",
+                "What pricing strategy fits our subscription product?",
+                "Should subscription pricing be tiered?"],
+    "hiring": ["How do we hire senior engineers faster?",
+               "What hiring channels work for engineers?",
+               "How can we improve engineer hiring?"],
+    "logistics": ["How can we cut shipping costs in logistics?",
+                  "Which logistics partners reduce shipping delays?",
+                  "How do we optimize warehouse logistics and shipping?"],
+}
+
+
+def _entries():
+    entries = []
+    for repeat in range(20):
+        for brs, (topic, queries) in zip((40, 60, 80), TOPICS.items()):
+            entries.append({"query": queries[repeat % len(queries)], "BRS": brs, "RCS": brs / 10,
+                            "analysis_type": "general"})
+    return entries
+
+
+def test_clusters_group_topics_with_scores():
+    entries = _entries()
+    result = cluster_queries(lambda: iter(entries), n_clusters=3, chunk_size=7, representatives=2)
+
+    assert result["entries"] == len(entries)
+    assert sorted(c["count"] for c in result["clusters"]) == [20, 20, 20]
+    by_brs = {c["mean_BRS"]: c for c in result["clusters"]}
+    assert set(by_brs) == {40, 60, 80}
+    assert by_brs[40]["mean_RCS"] == 4
+    assert set(by_brs[80]["representative_queries"]) <= set(TOPICS["logistics"])
+    assert len(by_brs[80]["representative_queries"]) == 2
+    assert "logistics" in by_brs[80]["top_terms"] or "shipping" in by_brs[80]["top_terms"]
+
+
+def test_fewer_queries_than_clusters_and_missing_scores():
+    entries = [{"query": "pricing plans"}, {"query": ""}, {"query": "hiring engineers", "BRS": 50}]
+    result = cluster_queries(lambda: iter(entries), n_clusters=10)
+
+    assert result["entries"] == 2
+    assert len(result["clusters"]) == 2
+    assert {c["mean_BRS"] for c in result["clusters"]} == {None, 50}
+    assert cluster_queries(lambda: iter([]))["clusters"] == []
+
+
+def test_cli_reads_log_without_responses(tmp_path, capsys):
+    log = EngagementLog(str(tmp_path / "log"))
+    log.append_many(dict(e, response={"summary": "s" * 100, "key_points": []}) for e in _entries())
+    log.close()
+    output = tmp_path / "clusters.json"
+
+    main([str(tmp_path / "log"), "--clusters", "3", "--output", str(output)])
+
+    assert "60 queries in 3 clusters" in capsys.readouterr().out
+    assert output.exists()
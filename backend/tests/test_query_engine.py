@@ -5,7 +5,7 @@ import os
 # Add the parent directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from backend.query_engine import generate_insights, format_response
+from backend.query_engine import generate_insights, format_response, extract_section, SectionStreamParser
 
 def test_format_response_general():
     """Test formatting of general analysis response."""
@@ -159,4 +159,178 @@ def test_generate_insights_trend():
     assert "predictions" in result
     assert "opportunities" in result
     assert "risks" in result
-    assert "measures" in result 
\ No newline at end of file
+    assert "measures" in result 
+
+
+def test_format_response_header_variants():
+    """Bold, numbered, markdown and inline headers are all recognized."""
+    test_response = """
+    Here is my analysis of your question.
+    ---
+    **1. 📊 Business Insights (Potential Areas for Growth)**
+    Growth lies in new markets.
+
+    The summary continues after a blank line.
+
+    ## 🔑 Key Strategic Points
+    *   **Alignment:** Fits the mission
+    *   **Resources:** Budget is available
+
+    **Actionable Recommendations:**
+    1. Run a SWOT analysis
+    2. Survey customers
+
+    📈 Implementation Timeline: Phase 1 starts now
+    - Phase 2 follows
+
+    ### Expected Outcomes:
+    • Higher revenue
+    """
+
+    result = format_response(test_response, "general")
+
+    assert result["summary"] == "Growth lies in new markets.\nThe summary continues after a blank line."
+    assert result["key_points"] == ["**Alignment:** Fits the mission", "**Resources:** Budget is available"]
+    assert result["recommendations"] == ["Run a SWOT analysis", "Survey customers"]
+    assert result["timeline"] == ["Phase 1 starts now", "Phase 2 follows"]
+    assert result["outcomes"] == ["Higher revenue"]
+
+
+def test_format_response_missing_sections():
+    """Absent sections come back empty instead of swallowing their neighbours."""
+    result = format_response("⚠️ Risk Factors:\n- Inflation\n", "trend")
+
+    assert result["risks"] == ["Inflation"]
+    assert result["current_trends"] == []
+    assert format_response("anything", None) == {}
+
+
+def test_extract_section():
+    text = "📊 Market Position Analysis:\nLeader in niche.\n\n⚠️ Potential Threats:\n- New entrants"
+
+    assert extract_section(text, "Market Position Analysis") == "Leader in niche."
+    assert extract_section(text, "Potential Threats") == "- New entrants"
+    assert extract_section(text, "Unknown Section") == ""
+
+
+def test_section_stream_parser():
+    """Sections are reported as soon as the next header closes them."""
+    parser = SectionStreamParser("competitive")
+    chunks = ["📊 Market Position Analysis:\nLeader ", "in niche.\n🔍 Competitor Str",
+              "engths and Weaknesses:\n- Slow\n- Pricey\n💡 Strategic Differentiators:\n- Speed"]
+
+    closed = [parser.feed(chunk) for chunk in chunks]
+
+    assert closed[0] == []
+    assert closed[1] == []
+    assert closed[2] == [("market_position", "Leader in niche."),
+                         ("competitor_analysis", ["Slow", "Pricey"])]
+    assert parser.close() == [("differentiators", ["Speed"])]
+    assert parser.result() == format_response("".join(chunks), "competitive")
+
+
+def test_generate_insights_reports_unavailable_backend(monkeypatch):
+    """Injected quota errors are retried, then reported as unavailable."""
+    from backend import query_engine
+    from backend.llm_backends import FakeBackend
+    from backend.rate_limit import GeminiGuard
+
+    monkeypatch.setattr(query_engine, "gemini_guard", GeminiGuard(base_delay=0, max_retries=2))
+    monkeypatch.setattr(query_engine, "_backend", FakeBackend(error_rate=1.0, error_code=429))
+
+    result = query_engine.generate_insights("Market growth", "general")
+
+    assert result["unavailable"] is True
+    assert query_engine.gemini_guard.stats()["retries"] == 2
+
+
+def test_plan_prompt_routes_simple_queries_and_caps_output(monkeypatch):
+    from backend import query_engine
+
+    simple = query_engine.plan_prompt("Who are our competitors?", "competitive")
+    detailed = query_engine.plan_prompt(
+        "How should we reposition our premium subscription tier against low-cost entrants "
+        "in Europe, and which channels should we prioritize next year?", "general")
+
+    assert (simple.tier, simple.model) == ("simple", query_engine.SIMPLE_MODEL_NAME)
+    assert (detailed.tier, detailed.model) == ("standard", query_engine.MODEL_NAME)
+    assert simple.max_output_tokens == query_engine.MAX_OUTPUT_TOKENS["competitive"]
+    assert detailed.estimated_tokens <= len(detailed.prompt) // 4 + detailed.max_output_tokens
+    assert "at most 3 bullet points" in detailed.prompt
+
+    monkeypatch.setattr(query_engine, "SIMPLE_MODEL_NAME", "")
+    assert query_engine.plan_prompt("Who are our competitors?", "competitive").tier == "standard"
+
+
+def test_generate_insights_records_estimated_and_actual_tokens():
+    from backend import query_engine
+    from backend.metrics import LLM_TOKENS
+
+    labels = {"analysis_type": "trend", "tier": "simple"}
+    before = {kind: LLM_TOKENS.value(kind=kind, **labels)
+              for kind in ("estimated", "output_cap", "actual", "actual_output")}
+
+    query_engine.generate_insights("Where is retail heading?", "trend")
+
+    after = {kind: LLM_TOKENS.value(kind=kind, **labels) - before[kind] for kind in before}
+    assert after["output_cap"] == query_engine.MAX_OUTPUT_TOKENS["trend"]
+    assert after["estimated"] > 0 and after["actual"] > 0
+    assert 0 < after["actual_output"] <= after["output_cap"]
+
+
+def test_parse_structured_validates_and_shapes_sections():
+    from backend.query_engine import parse_structured
+
+    text = ('```json\n{"market_position": ["Leader in niche.", "Growing"], '
+            '"competitor_analysis": ["- Slow", "2. Pricey", ""], "threats": null, "extra": 1}\n```')
+    result = parse_structured(text, "competitive")
+
+    assert result == {
+        "market_position": "Leader in niche.\nGrowing",
+        "competitor_analysis": ["Slow", "Pricey"],
+        "differentiators": [],
+        "opportunities": [],
+        "threats": [],
+    }
+    assert parse_structured("Market Position Analysis:\nLeader", "competitive") is None
+    assert parse_structured('{"market_position": "truncated', "competitive") is None
+    assert parse_structured('{"summary": "wrong type"}', "competitive") is None
+
+
+def test_generate_insights_uses_structured_output_and_falls_back(monkeypatch):
+    from backend import query_engine
+    from backend.llm_backends import Completion, FakeBackend
+    from backend.metrics import RESPONSE_FORMATS, RESPONSE_SECTIONS
+
+    before = {fmt: RESPONSE_FORMATS.value(analysis_type="trend", format=fmt)
+              for fmt in ("json", "text_fallback")}
+    empty_before = RESPONSE_SECTIONS.value(analysis_type="trend", filled="false")
+
+    result = query_engine.generate_insights("Where is retail heading?", "trend")
+
+    assert list(result) == [key for key, _ in query_engine.SECTION_HEADERS["trend"]]
+    assert all(result.values())
+    assert RESPONSE_FORMATS.value(analysis_type="trend", format="json") == before["json"] + 1
+    assert RESPONSE_SECTIONS.value(analysis_type="trend", filled="false") == empty_before
+
+    class HeaderBackend(FakeBackend):
+        def generate(self, prompt, model=None, max_output_tokens=None, response_schema=None):
+            assert response_schema == query_engine.RESPONSE_SCHEMAS["trend"]
+            return Completion("Current Market Trends:\n- AI adoption\nRisk Factors:\n- Regulation")
+
+    monkeypatch.setattr(query_engine, "_backend", HeaderBackend())
+    result = query_engine.generate_insights("Where is retail heading?", "trend")
+
+    assert result["current_trends"] == ["AI adoption"] and result["risks"] == ["Regulation"]
+    assert RESPONSE_FORMATS.value(analysis_type="trend", format="text_fallback") == before["text_fallback"] + 1
+
+
+def test_structured_output_can_be_disabled(monkeypatch):
+    from backend import query_engine
+
+    monkeypatch.setattr(query_engine, "STRUCTURED_OUTPUT", False)
+    plan = query_engine.plan_prompt("Where is retail heading?", "trend")
+
+    assert plan.response_schema is None
+    assert "Current Market Trends:" in plan.prompt
+    assert all(query_engine.generate_insights("Where is retail heading?", "trend").values())
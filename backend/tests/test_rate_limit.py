@@ -0,0 +1,229 @@
+import asyncio
+
+import pytest
+
+from backend.rate_limit import (AdaptiveConcurrencyLimiter, CircuitBreaker, CircuitOpenError,
+                                GeminiGuard, TokenBucket, is_client_error, is_retryable)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class QuotaError(Exception):
+    code = 429
+
+
+class InvalidArgument(Exception):
+    code = 400
+
+
+def test_token_bucket_paces_after_burst():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock=clock)
+
+    assert all(bucket.reserve() == 0 for _ in range(60))
+    assert bucket.reserve() == pytest.approx(1.0)
+    clock.now += 2
+    assert bucket.reserve() == 0
+
+
+def test_token_bucket_adjust_refunds_overestimate():
+    bucket = TokenBucket(1000, clock=FakeClock())
+    bucket.reserve(800)
+    bucket.adjust(500)
+
+    assert bucket.available() == 700
+
+
+def test_aimd_limit_grows_and_halves():
+    limiter = AdaptiveConcurrencyLimiter(initial=4, max_limit=8)
+    for _ in range(4):
+        assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+
+    for _ in range(4):
+        limiter.release(success=True)
+    assert limiter.limit == 4
+    assert limiter.try_acquire()
+    limiter.release(success=True)
+    assert limiter.limit == 5
+
+    limiter.acquire()
+    limiter.release(success=False, overload=True)
+    assert limiter.limit == 2
+
+
+def test_circuit_breaker_opens_and_half_opens():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    clock.now += 10
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 10
+    breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_guard_retries_retryable_errors():
+    guard = GeminiGuard(base_delay=0)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise QuotaError("quota exceeded")
+        return "ok"
+
+    assert guard.call(flaky) == "ok"
+    stats = guard.stats()
+    assert stats["retries"] == 2
+    assert stats["in_flight"] == 0
+    assert stats["concurrency_limit"] < 8
+
+
+def test_guard_does_not_retry_other_errors():
+    guard = GeminiGuard(base_delay=0)
+    attempts = []
+
+    def broken():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        guard.call(broken)
+    assert len(attempts) == 1
+    assert not is_retryable(ValueError())
+
+
+def test_guard_fails_fast_while_circuit_open():
+    guard = GeminiGuard(base_delay=0, max_retries=0, failure_threshold=2)
+
+    def failing():
+        raise QuotaError("quota exceeded")
+
+    for _ in range(2):
+        with pytest.raises(QuotaError):
+            guard.call(failing)
+    with pytest.raises(CircuitOpenError):
+        guard.call(lambda: "never called")
+    assert guard.stats()["rejected"] == 1
+
+
+def test_guard_async_corrects_token_estimate():
+    guard = GeminiGuard(tokens_per_minute=10000)
+
+    async def call():
+        return "ok"
+
+    result = asyncio.run(guard.call_async(call, estimated_tokens=2000, used_tokens=lambda _: 500))
+
+    assert result == "ok"
+    assert guard.tokens.available() == pytest.approx(9500, abs=5)
+
+
+def test_guard_client_errors_do_not_open_circuit():
+    guard = GeminiGuard(base_delay=0, failure_threshold=1)
+
+    def invalid():
+        raise InvalidArgument("prompt too long")
+
+    for _ in range(3):
+        with pytest.raises(InvalidArgument):
+            guard.call(invalid)
+    assert is_client_error(InvalidArgument()) and not is_client_error(QuotaError())
+    assert guard.stats()["circuit"] == "closed"
+    assert guard.stats()["retries"] == 0
+
+
+def test_guard_releases_slot_when_interrupted():
+    guard = GeminiGuard()
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def cancel_call():
+        task = asyncio.create_task(guard.call_async(hang))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    with pytest.raises(KeyboardInterrupt):
+        guard.call(interrupted)
+    asyncio.run(cancel_call())
+    assert guard.stats()["in_flight"] == 0
+
+
+def test_async_waiters_get_slots_in_arrival_order():
+    limiter = AdaptiveConcurrencyLimiter(initial=1, max_limit=1)
+    order = []
+
+    async def waiter(name):
+        await limiter.acquire_async()
+        order.append(name)
+
+    async def run():
+        await limiter.acquire_async()
+        tasks = [asyncio.create_task(waiter(name)) for name in "abc"]
+        await asyncio.sleep(0.01)
+        cancelled = asyncio.create_task(waiter("cancelled"))
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        assert not limiter.try_acquire()
+        for _ in range(4):
+            limiter.release(success=True)
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == ["a", "b", "c"]
+    assert limiter.in_flight == 0
+
+
+def test_guard_refunds_tokens_of_failed_and_unsent_calls():
+    guard = GeminiGuard(requests_per_minute=60, tokens_per_minute=10000, base_delay=0, max_retries=2,
+                        failure_threshold=3)
+
+    def failing():
+        raise QuotaError("quota exceeded")
+
+    with pytest.raises(QuotaError):
+        guard.call(failing, estimated_tokens=3000)
+    # Three attempts were sent: their requests stay charged, their tokens do not
+    assert guard.tokens.available() == pytest.approx(10000, abs=5)
+    assert guard.requests.available() == pytest.approx(57, abs=0.1)
+
+    with pytest.raises(CircuitOpenError):
+        guard.call(lambda: "never called", estimated_tokens=3000)
+    assert guard.requests.available() == pytest.approx(57, abs=0.1)
+
+    async def cancel_while_waiting_for_a_slot():
+        guard.breaker.record_success()
+        limiter = guard.concurrency
+        while limiter.try_acquire():
+            pass
+        task = asyncio.create_task(guard.call_async(lambda: asyncio.sleep(0), estimated_tokens=3000))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_while_waiting_for_a_slot())
+    assert guard.tokens.available() == pytest.approx(10000, abs=5)
+    assert guard.requests.available() == pytest.approx(57, abs=0.1)
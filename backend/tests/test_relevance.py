@@ -0,0 +1,91 @@
+import time
+
+from backend.relevance import RelevanceModel, load_or_bootstrap, response_text
+
+
+def _entries():
+    return [
+        {"query": "What are the key growth opportunities for our business?",
+         "response": {"summary": "Expand into new markets and grow revenue.",
+                      "key_points": ["Market development", "Product innovation"]}},
+        {"query": "Analyze our competitive position in the e-commerce market",
+         "response": {"market_position": "Mid-tier online retailer.",
+                      "competitor_analysis": ["Amazon leads on logistics"]}},
+        {"query": "What are the emerging trends in the technology sector?",
+         "response": {"current_trends": ["Generative AI adoption"],
+                      "predictions": ["Cloud spending keeps growing"]}},
+    ]
+
+
+def test_response_text_per_analysis_type():
+    general, competitive, trend = (e["response"] for e in _entries())
+
+    assert "Product innovation" in response_text(general)
+    assert "Amazon" in response_text(competitive)
+    assert "Cloud spending" in response_text(trend)
+    assert response_text({"summary": "Sample summary", "key_points": "Sample key points"}) == \
+        "Sample summary Sample key points"
+
+
+def test_bootstrap_and_score():
+    model = RelevanceModel()
+    assert model.bootstrap(_entries())
+
+    related = model.score("growth opportunities in new markets", "Expand into new markets and grow revenue")
+    unrelated = model.score("growth opportunities in new markets", "Cloud spending keeps growing")
+    assert related > unrelated
+    assert 0 <= unrelated <= 100
+
+
+def test_unfitted_model_scores_pair():
+    assert RelevanceModel().score("market growth", "market growth") == 100.0
+
+
+def test_load_or_bootstrap_persists(tmp_path):
+    path = str(tmp_path / "model.pkl")
+    fitted = load_or_bootstrap(path, _entries)
+    assert fitted.fitted
+
+    reloaded = load_or_bootstrap(path, lambda: [])
+    assert reloaded.fitted
+    text = "Expand into new markets"
+    assert reloaded.score("new markets", text) == fitted.score("new markets", text)
+
+
+def test_lazy_load_or_bootstrap_defers_until_first_use(tmp_path):
+    calls = []
+
+    def entries():
+        calls.append(1)
+        return _entries()
+
+    model = load_or_bootstrap(str(tmp_path / "model.pkl"), entries, lazy=True)
+    assert not calls and not model.fitted
+
+    assert model.score("new markets", "Expand into new markets") > 0
+    assert model.fitted and len(calls) == 1
+
+
+def test_background_refit(tmp_path):
+    model = RelevanceModel(path=str(tmp_path / "model.pkl"), entries_source=_entries,
+                           refit_interval=0, min_new_documents=2)
+    model.observe()
+
+    deadline = time.monotonic() + 5
+    while not (tmp_path / "model.pkl").exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert model.fitted
+    assert (tmp_path / "model.pkl").exists()
+
+
+def test_score_many_matches_single_scores():
+    model = RelevanceModel()
+    model.bootstrap(_entries())
+    queries = [e["query"] for e in _entries()]
+    texts = [response_text(e["response"]) for e in _entries()]
+
+    scores = model.score_many(queries, texts)
+
+    assert scores.shape == (3,)
+    for query, text, score in zip(queries, texts, scores):
+        assert abs(model.score(query, text) - score) < 0.01
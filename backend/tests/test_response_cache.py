@@ -0,0 +1,104 @@
+from backend.response_cache import MemoryCache, SQLiteCache, cache_key, create_response_cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_key_normalization():
+    """Case, whitespace and trailing punctuation do not change the key."""
+    assert cache_key("What are our  growth opportunities?", "general") == \
+        cache_key("  what are our growth opportunities ", "general")
+    assert cache_key("growth", "general") != cache_key("growth", "trend")
+
+
+def test_memory_cache_hit_and_miss():
+    cache = MemoryCache()
+    assert cache.get("query", "general") is None
+    cache.set("query", "general", {"summary": "cached"})
+
+    assert cache.get("Query?", "general") == {"summary": "cached"}
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_memory_cache_lru_eviction():
+    cache = MemoryCache(max_entries=2)
+    cache.set("a", "general", {"summary": "a"})
+    cache.set("b", "general", {"summary": "b"})
+    cache.get("a", "general")
+    cache.set("c", "general", {"summary": "c"})
+
+    assert cache.get("b", "general") is None
+    assert cache.get("a", "general") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_memory_cache_ttl():
+    clock = FakeClock()
+    cache = MemoryCache(ttl=10, clock=clock)
+    cache.set("a", "general", {"summary": "a"})
+    clock.now += 11
+
+    assert cache.get("a", "general") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_sqlite_cache_persists(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SQLiteCache(path)
+    cache.set("a", "trend", {"current_trends": ["AI"]})
+    cache.close()
+
+    reopened = create_response_cache("sqlite", path=path)
+    assert reopened.get("a", "trend") == {"current_trends": ["AI"]}
+
+
+def test_sqlite_cache_eviction_and_ttl(tmp_path):
+    clock = FakeClock()
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), max_entries=2, ttl=10, clock=clock)
+    cache.set("a", "general", {"summary": "a"})
+    clock.now += 1
+    cache.set("b", "general", {"summary": "b"})
+    clock.now += 1
+    cache.get("a", "general")
+    clock.now += 1
+    cache.set("c", "general", {"summary": "c"})
+
+    assert len(cache) == 2
+    assert cache.get("b", "general") is None
+    clock.now += 20
+    assert cache.get("a", "general") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_expired_entries_served_when_stale_allowed():
+    clock = FakeClock()
+    cache = MemoryCache(ttl=10, clock=clock)
+    cache.set("a", "general", {"summary": "a"})
+    clock.now += 11
+
+    assert cache.get("a", "general") is None
+    assert cache.get("a", "general", allow_stale=True) == {"summary": "a"}
+    assert cache.stats()["stale_hits"] == 1
+
+
+def test_lookup_reports_staleness_within_max_stale(tmp_path):
+    for cache in (MemoryCache(ttl=10, clock=FakeClock()),
+                  SQLiteCache(str(tmp_path / "cache.sqlite3"), ttl=10, clock=FakeClock())):
+        cache.set("a", "general", {"summary": "a"})
+        assert cache.lookup("a", "general", max_stale=60) == ({"summary": "a"}, False)
+        assert cache.expires_in("a", "general") == 10 and cache.expires_in("b", "general") is None
+
+        cache.clock.now += 30
+        assert cache.lookup("a", "general", max_stale=60) == ({"summary": "a"}, True)
+        assert cache.lookup("a", "general", max_stale=5) == (None, False)
+        assert cache.expires_in("a", "general") == -20
+        stats = cache.stats()
+        assert (stats["hits"], stats["stale_hits"], stats["expirations"]) == (1, 1, 1)
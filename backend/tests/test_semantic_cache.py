@@ -0,0 +1,93 @@
+import math
+
+import pytest
+
+from backend.semantic_cache import SemanticCache
+
+
+def test_paraphrase_is_found():
+    cache = SemanticCache(threshold=0.5)
+    cache.add("What are our growth opportunities?", "general", {"summary": "growth"})
+    cache.add("How can we improve operational efficiency?", "general", {"summary": "efficiency"})
+
+    match = cache.lookup("key growth opportunities for our business", "general")
+
+    assert match["response"] == {"summary": "growth"}
+    assert match["query"] == "What are our growth opportunities?"
+    assert 0.5 <= match["similarity"] <= 1
+
+
+def test_analysis_types_are_separate():
+    cache = SemanticCache(threshold=0.5)
+    cache.add("emerging industry trends", "trend", {"current_trends": []})
+
+    assert cache.lookup("emerging industry trends", "general") is None
+    assert cache.lookup("emerging industry trends", "trend") is not None
+
+
+def test_unrelated_query_misses():
+    cache = SemanticCache(threshold=0.7)
+    cache.add("What are our growth opportunities?", "general", {"summary": "growth"})
+
+    assert cache.lookup("analyze competitor pricing", "general") is None
+    assert cache.stats() == {"hits": 0, "misses": 1, "stale_hits": 0, "evictions": 0, "expirations": 0,
+                             "size": 1}
+
+
+def test_least_recently_used_is_evicted():
+    cache = SemanticCache(threshold=0.9, max_entries=2)
+    cache.add("market share", "general", {"summary": "a"})
+    cache.add("customer retention", "general", {"summary": "b"})
+    cache.lookup("market share", "general")
+    cache.add("pricing strategy", "general", {"summary": "c"})
+
+    assert cache.lookup("customer retention", "general") is None
+    assert cache.lookup("market share", "general") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_answers_expire_after_ttl_and_max_stale():
+    now = [1000.0]
+    cache = SemanticCache(threshold=0.5, ttl=60, clock=lambda: now[0])
+    cache.add("What are our growth opportunities?", "general", {"summary": "old"})
+
+    assert cache.lookup("growth opportunities", "general", max_stale=100)["stale"] is False
+    now[0] += 90
+    assert cache.lookup("growth opportunities", "general") is None
+    assert cache.lookup("growth opportunities", "general", max_stale=100)["stale"] is True
+    assert cache.lookup("growth opportunities", "general", max_stale=float("inf")) is not None
+
+    cache.add("what are our growth opportunities", "general", {"summary": "new"})
+    match = cache.lookup("growth opportunities", "general")
+    assert match["response"] == {"summary": "new"} and match["stale"] is False
+    assert len(cache) == 1
+
+    now[0] += 200
+    assert cache.lookup("growth opportunities", "general", max_stale=100) is None
+    assert cache.stats()["expirations"] == 2
+
+
+def test_repeated_unseen_word_counts_as_one_term():
+    cache = SemanticCache(threshold=0.1)
+    cache.add("pricing strategy", "general", {"summary": "pricing"})
+
+    counts = cache._term_counts("pricing strategy zyzzyva zyzzyva zyzzyva", grow=False)
+    match = cache.lookup("pricing strategy zyzzyva zyzzyva zyzzyva", "general")
+
+    assert sorted(counts.values()) == [1, 1, 3]
+    # Two shared terms of weight idf(seen), one unseen term of tf 3
+    seen, unseen = math.log(2 / 2) + 1, (1 + math.log(3)) * (math.log(2) + 1)
+    assert match["similarity"] == pytest.approx(
+        2 * seen / math.sqrt(2 * seen ** 2 + unseen ** 2) / math.sqrt(2), abs=1e-4)
+
+
+def test_evicted_queries_take_their_terms_along():
+    cache = SemanticCache(threshold=0.9, max_entries=2)
+    cache.add("market share", "trend", {"summary": "kept"})
+    for i in range(50):
+        cache.add(f"question{i} answer{i}", "general", {"summary": str(i)})
+
+    assert len(cache._vocabulary) == 2 + 4
+    assert set(cache._partitions["general"].doc_freq) == \
+        {cache._vocabulary[term] for term in ("question48", "answer48", "question49", "answer49")}
+    assert cache.lookup("market share", "trend")["response"] == {"summary": "kept"}
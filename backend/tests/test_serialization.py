@@ -0,0 +1,61 @@
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+import serialization
+
+
+@pytest.fixture(params=["fast", "stdlib"])
+def encoder(request, monkeypatch):
+    """Run each test with orjson (if installed) and with the stdlib fallback."""
+    if request.param == "stdlib":
+        monkeypatch.setattr(serialization, "orjson", None)
+    return serialization
+
+
+def test_dumps_is_compact_utf8_and_handles_numpy(encoder):
+    payload = {"query": "Marché à Zürich", "BRS": np.float64(72.5), "count": np.int64(3),
+               "scores": np.array([1.0, 2.5])}
+    data = encoder.dumps(payload)
+
+    assert isinstance(data, bytes)
+    assert b": " not in data and "Zürich".encode("utf-8") in data
+    assert encoder.loads(data) == {"query": "Marché à Zürich", "BRS": 72.5, "count": 3, "scores": [1.0, 2.5]}
+    assert encoder.loads(data.decode("utf-8")) == json.loads(data)
+    with pytest.raises(ValueError):
+        encoder.loads(b'{"truncated": ')
+
+
+def test_negotiate_encoding():
+    preferred = serialization.ENCODINGS[0]
+
+    assert serialization.negotiate_encoding(None) is None
+    assert serialization.negotiate_encoding("identity") is None
+    assert serialization.negotiate_encoding("gzip, deflate") == "gzip"
+    assert serialization.negotiate_encoding("gzip;q=0, deflate") is None
+    assert serialization.negotiate_encoding("*") == preferred
+    assert serialization.negotiate_encoding("br;q=0.5, gzip;q=0.8") == "gzip"
+    assert serialization.negotiate_encoding("gzip, br") == preferred
+
+
+def test_compress_round_trip():
+    data = serialization.dumps({"summary": "Expand into new markets. " * 200})
+    compressed = serialization.compress(data, "gzip")
+
+    assert len(compressed) < len(data) // 5
+    assert gzip.decompress(compressed) == data
+    with pytest.raises(ValueError):
+        serialization.compress(data, "deflate")
+
+
+def test_etag_matching():
+    tag = serialization.etag(b'{"analysis_types": []}')
+
+    assert tag.startswith('W/"')
+    assert serialization.etag_matches(tag, tag)
+    assert serialization.etag_matches(f'"other", {tag[2:]}', tag)
+    assert serialization.etag_matches("*", tag)
+    assert not serialization.etag_matches('"other"', tag)
+    assert not serialization.etag_matches(None, tag)
@@ -0,0 +1,126 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from backend.single_flight import SingleFlight
+
+
+def _slow_call(directory, counter_path, results):
+    def compute():
+        with open(counter_path, "a") as f:
+            f.write("x")
+        time.sleep(1)
+        return {"summary": "shared"}
+    results.put(SingleFlight(directory).do("general:growth", compute))
+
+
+def test_concurrent_threads_share_one_call():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {"summary": "answer"}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", compute)))
+               for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{"summary": "answer"}] * 10
+    assert flight.stats() == {"calls": 10, "executed": 1, "coalesced": 9, "coalesced_remote": 0,
+                              "lock_timeouts": 0}
+
+
+def test_errors_are_shared_and_not_cached():
+    flight = SingleFlight()
+
+    def fail():
+        raise RuntimeError("quota exceeded")
+
+    with pytest.raises(RuntimeError):
+        flight.do("key", fail)
+    assert flight.do("key", lambda: "recovered") == "recovered"
+
+
+def test_async_calls_are_coalesced():
+    flight = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def run():
+        return await asyncio.gather(*(flight.do_async("key", compute) for _ in range(50)))
+
+    assert asyncio.run(run()) == ["answer"] * 50
+    assert len(calls) == 1
+    assert flight.stats()["coalesced"] == 49
+
+
+def test_processes_share_one_call(tmp_path):
+    counter = tmp_path / "calls"
+    counter.write_text("")
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_slow_call,
+                                       args=(str(tmp_path / "flight"), str(counter), results))
+               for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert [results.get(timeout=5) for _ in workers] == [{"summary": "shared"}] * 3
+    assert counter.read_text() == "x"
+
+
+def test_cancelled_follower_leaves_key_unlocked(tmp_path):
+    directory = str(tmp_path / "flight")
+    leader, follower = SingleFlight(directory), SingleFlight(directory)
+    fd = leader._files.try_lock("key")
+
+    async def compute():
+        return "answer"
+
+    async def cancel_waiting_follower():
+        task = asyncio.create_task(follower.do_async("key", compute))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_waiting_follower())
+    leader._files.unlock(fd)
+
+    acquired = leader._files.try_lock("key")
+    assert acquired is not None
+    leader._files.unlock(acquired)
+
+
+def test_followers_stop_waiting_for_a_hung_leader(tmp_path):
+    directory = str(tmp_path / "flight")
+    fd = SingleFlight(directory)._files.try_lock("key")
+    follower = SingleFlight(directory, lock_timeout=0.2)
+
+    async def compute():
+        return "async answer"
+
+    started = time.monotonic()
+    assert follower.do("key", lambda: "answer") == "answer"
+    assert asyncio.run(follower.do_async("key", compute)) == "async answer"
+    assert time.monotonic() - started < 2
+    assert follower.stats()["lock_timeouts"] == 2
+    SingleFlight(directory)._files.unlock(fd)
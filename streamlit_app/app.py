@@ -1,10 +1,12 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import os
 import pandas as pd
 from datetime import datetime
 import plotly.graph_objects as go
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 # Configure the page
 st.set_page_config(
@@ -32,6 +34,146 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
+# Backend location and request timeouts (seconds to connect, and to wait for
+# the next bytes of a response)
+BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000").rstrip("/")
+CONNECT_TIMEOUT = float(os.getenv("BACKEND_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("BACKEND_READ_TIMEOUT", "120"))
+
+# Example queries per analysis type, also warmed into the backend's cache
+EXAMPLE_QUERIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "example_queries.json")
+
+# Used while the backend cannot list its analysis types
+DEFAULT_ANALYSIS_TYPES = [
+    {"id": "general", "name": "General Business Analysis"},
+    {"id": "competitive", "name": "Competitive Analysis"},
+    {"id": "trend", "name": "Trend Analysis"}
+]
+
+# Section keys and titles shown for each analysis type, in display order
+SECTION_TITLES = {
+    "competitive": [
+        ("market_position", "📊 Market Position Analysis"),
+        ("competitor_analysis", "🔍 Competitor Analysis"),
+        ("differentiators", "💡 Strategic Differentiators"),
+        ("opportunities", "🎯 Market Opportunities"),
+        ("threats", "⚠️ Potential Threats")
+    ],
+    "trend": [
+        ("current_trends", "📈 Current Market Trends"),
+        ("predictions", "🔮 Future Predictions"),
+        ("opportunities", "🎯 Growth Opportunities"),
+        ("risks", "⚠️ Risk Factors"),
+        ("measures", "💡 Proactive Measures")
+    ],
+    "general": [
+        ("summary", "📊 Business Insights"),
+        ("key_points", "🔑 Key Strategic Points"),
+        ("recommendations", "✅ Recommendations"),
+        ("timeline", "📈 Implementation Timeline"),
+        ("outcomes", "📊 Expected Outcomes")
+    ]
+}
+
+
+def render_section(title: str, content: Any):
+    """Render one insights section; list sections are shown as bullet points."""
+    st.subheader(title)
+    if isinstance(content, list):
+        for point in content:
+            st.write(f"• {point}")
+    else:
+        st.write(content)
+
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """Keep-alive HTTP session shared by every rerun and browser session."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=int(os.getenv("BACKEND_POOL_SIZE", "10")))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def fetch_analysis_types() -> List[Dict[str, Any]]:
+    """Analysis types offered by the backend; failures are not cached and retried on the next rerun."""
+    response = get_session().get(f"{BACKEND_URL}/analysis-types", timeout=(CONNECT_TIMEOUT, 10))
+    response.raise_for_status()
+    return response.json()["analysis_types"]
+
+
+@st.cache_data
+def load_example_queries() -> Dict[str, List[str]]:
+    with open(EXAMPLE_QUERIES_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def get_analysis_types() -> List[Dict[str, Any]]:
+    try:
+        return fetch_analysis_types()
+    except Exception:
+        return DEFAULT_ANALYSIS_TYPES
+
+
+def render_scores(data: Dict[str, Any]):
+    """Render the scores and, when the backend runs with SERVER_TIMING, the stage timings."""
+    st.markdown("---")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Business Relevance Score", f"{data['BRS']}%")
+    with col2:
+        st.metric("Response Consistency Score", f"{data['RCS']}%")
+
+    if data.get("server_timing"):
+        with st.expander("Server timing"):
+            st.table([{"Stage": stage, "ms": ms}
+                      for stage, ms in data["server_timing"].items()])
+
+
+def stream_result(query: str, analysis_type: str) -> Optional[Dict[str, Any]]:
+    """
+    Stream an answer, showing each section as soon as it is ready.
+
+    Returns:
+        Optional[Dict[str, Any]]: The final "complete" event, or None on failure
+    """
+    response = get_session().post(
+        f"{BACKEND_URL}/generate-insights/stream",
+        json={"query": query, "analysis_type": analysis_type},
+        stream=True,
+        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+    )
+    with response:
+        if response.status_code != 200:
+            st.error(f"Error: {response.json().get('error', 'Unknown error')}")
+            return None
+
+        placeholders = {key: st.empty() for key, _ in SECTION_TITLES[analysis_type]}
+        titles = dict(SECTION_TITLES[analysis_type])
+        data = None
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            event = json.loads(line)
+            if event["event"] == "section" and event["section"] in placeholders:
+                with placeholders[event["section"]].container():
+                    render_section(titles[event["section"]], event["content"])
+            elif event["event"] == "complete":
+                data = event
+            elif event["event"] == "error":
+                if event.get("partial"):
+                    st.warning("The answer above is incomplete: the stream was interrupted.")
+                st.error(f"Error: {event['error']}")
+        return data
+
+
+# Answers already shown in this browser session, keyed on (query, analysis type),
+# so reruns redraw them instead of asking the backend again
+if "results" not in st.session_state:
+    st.session_state.results = {}
+
 # Title and description
 st.title("📊 AI Business Insights Assistant")
 st.markdown("""
@@ -44,14 +186,14 @@ st.markdown("""
 # Sidebar for analysis type selection
 with st.sidebar:
     st.header("Analysis Type")
+    analysis_names = {item["id"]: item["name"] for item in get_analysis_types()
+                      if item["id"] in SECTION_TITLES} or \
+        {item["id"]: item["name"] for item in DEFAULT_ANALYSIS_TYPES}
     analysis_type = st.selectbox(
         "Select the type of analysis",
-        ["general", "competitive", "trend"],
-        format_func=lambda x: {
-            "general": "General Business Analysis",
-            "competitive": "Competitive Analysis",
-            "trend": "Trend Analysis"
-        }[x]
+        list(analysis_names),
+        index=list(analysis_names).index("general") if "general" in analysis_names else 0,
+        format_func=lambda x: analysis_names[x]
     )
     
     st.markdown("---")
@@ -77,119 +219,42 @@ with col1:
         height=100
     )
     
+    result_key = (query.strip(), analysis_type)
+    streamed = False
     if st.button("Generate Insights", type="primary"):
-        if not query:
+        if not query.strip():
             st.error("Please enter a query")
-        else:
-            with st.spinner("Generating insights..."):
-                try:
-                    # Call the backend API
-                    response = requests.post(
-                        "http://localhost:8000/generate-insights",
-                        json={"query": query, "analysis_type": analysis_type}
-                    )
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        
-                        # Display insights based on analysis type
-                        if analysis_type == "competitive":
-                            st.subheader("📊 Market Position Analysis")
-                            st.write(data["insights"]["market_position"])
-                            
-                            st.subheader("🔍 Competitor Analysis")
-                            for point in data["insights"]["competitor_analysis"]:
-                                st.write(f"• {point}")
-                            
-                            st.subheader("💡 Strategic Differentiators")
-                            for point in data["insights"]["differentiators"]:
-                                st.write(f"• {point}")
-                            
-                            st.subheader("🎯 Market Opportunities")
-                            for point in data["insights"]["opportunities"]:
-                                st.write(f"• {point}")
-                            
-                            st.subheader("⚠️ Potential Threats")
-                            for point in data["insights"]["threats"]:
-                                st.write(f"• {point}")
-                                
-                        elif analysis_type == "trend":
-                            st.subheader("📈 Current Market Trends")
-                            for trend in data["insights"]["current_trends"]:
-                                st.write(f"• {trend}")
-                            
-                            st.subheader("🔮 Future Predictions")
-                            for prediction in data["insights"]["predictions"]:
-                                st.write(f"• {prediction}")
-                            
-                            st.subheader("🎯 Growth Opportunities")
-                            for opportunity in data["insights"]["opportunities"]:
-                                st.write(f"• {opportunity}")
-                            
-                            st.subheader("⚠️ Risk Factors")
-                            for risk in data["insights"]["risks"]:
-                                st.write(f"• {risk}")
-                            
-                            st.subheader("💡 Proactive Measures")
-                            for measure in data["insights"]["measures"]:
-                                st.write(f"• {measure}")
-                                
-                        else:  # general analysis
-                            st.subheader("📊 Business Insights")
-                            st.write(data["insights"]["summary"])
-                            
-                            st.subheader("🔑 Key Strategic Points")
-                            for point in data["insights"]["key_points"]:
-                                st.write(f"• {point}")
-                            
-                            st.subheader("✅ Recommendations")
-                            for rec in data["insights"]["recommendations"]:
-                                st.write(f"• {rec}")
-                            
-                            st.subheader("📈 Implementation Timeline")
-                            for step in data["insights"]["timeline"]:
-                                st.write(f"• {step}")
-                            
-                            st.subheader("📊 Expected Outcomes")
-                            for outcome in data["insights"]["outcomes"]:
-                                st.write(f"• {outcome}")
-                        
-                        # Display metrics
-                        st.markdown("---")
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            st.metric("Business Relevance Score", f"{data['BRS']}%")
-                        with col2:
-                            st.metric("Response Consistency Score", f"{data['RCS']}%")
-                            
-                    else:
-                        st.error(f"Error: {response.json().get('error', 'Unknown error')}")
-                        
-                except Exception as e:
-                    st.error(f"An error occurred: {str(e)}")
+        elif result_key not in st.session_state.results:
+            status = st.empty()
+            status.info("Generating insights...")
+            streamed = True
+            try:
+                data = stream_result(*result_key)
+                status.empty()
+                if data is not None:
+                    st.session_state.results[result_key] = data
+                    render_scores(data)
+            except requests.Timeout:
+                status.empty()
+                st.error("The backend did not answer in time, please try again")
+            except Exception as e:
+                status.empty()
+                st.error(f"An error occurred: {str(e)}")
+
+    # Redraw an answer given earlier in this session
+    if not streamed and result_key in st.session_state.results:
+        data = st.session_state.results[result_key]
+        for key, title in SECTION_TITLES[analysis_type]:
+            if key in data["insights"]:
+                render_section(title, data["insights"][key])
+        render_scores(data)
 
 with col2:
     # Display example queries based on analysis type
     st.subheader("Example Queries")
-    examples = {
-        "general": [
-            "What are the key growth opportunities for our business?",
-            "How can we improve our operational efficiency?",
-            "What strategic initiatives should we prioritize?"
-        ],
-        "competitive": [
-            "Analyze our competitive position in the market",
-            "What are our main competitors' strengths and weaknesses?",
-            "How can we differentiate ourselves from competitors?"
-        ],
-        "trend": [
-            "What are the emerging trends in our industry?",
-            "How will market conditions evolve in the next year?",
-            "What technological trends should we prepare for?"
-        ]
-    }
+    examples = load_example_queries()
     
-    for example in examples[analysis_type]:
+    for example in examples.get(analysis_type, []):
         if st.button(example, key=example):
             st.text_area("Enter your business query", value=example, key="query_input")
 